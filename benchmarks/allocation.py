@@ -0,0 +1,87 @@
+"""Cheapest-first budget allocation: the old inline loop vs `plan_orders`.
+
+The loop is the rule `_create_market_orders` used to apply while walking the
+ads one at a time, calling `_get_order_amount` and checking the budget for
+each ad. Both are timed on synthetic books of 10k+ ads, and their plans are
+checked to be identical.
+
+    python -m benchmarks.allocation [10000 50000 ...]
+"""
+import random
+import sys
+import time
+from src.apis.binance_api_call import BinanceApiCall
+from src.apis.order_allocator import plan_orders
+from src.db.ad_row import AdRow
+
+# (name, budget, max orders). The leftover of the first case stays below
+# every ad's minimum, so all remaining ads must be checked.
+SCENARIOS = (
+    ("leftover below minimums", 50000, 10),
+    ("first ad takes budget", 900, 10),
+    ("many small orders", 10 ** 9, 5000),
+)
+
+
+def make_ads(count, seed=7):
+    rng = random.Random(seed)
+    ads = []
+    for i in range(count):
+        price = round(rng.uniform(80, 95), 2)
+        ads.append(AdRow(
+            advNo=str(10 ** 18 + i),
+            price=price,
+            surplusAmount=round(rng.uniform(1, 500), 2),
+            minSingleTransAmount=rng.choice((500, 1000, 2000)),
+            maxSingleTransAmount=rng.choice((5000, 20000, 100000)),
+            market="USDT/INR/BUY",
+        ))
+    # The ad book hands candidates over cheapest first
+    ads.sort(key=lambda ad: ad.price)
+    return ads
+
+
+def loop_allocation(api: BinanceApiCall, ads, budget, max_orders):
+    """The per-ad loop, assuming every order fills."""
+    remaining = budget
+    orders = []
+    for adv in ads:
+        if len(orders) >= max_orders or remaining <= 0:
+            break
+        total_amount = api._get_order_amount(adv.price, adv.maxSingleTransAmount, adv.minSingleTransAmount, adv.surplusAmount)
+        if total_amount > remaining:
+            if remaining > adv.minSingleTransAmount:
+                total_amount = remaining
+            else:
+                continue
+        orders.append((adv, total_amount))
+        remaining -= total_amount
+    return orders
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(sizes):
+    api = BinanceApiCall(base_url=None)
+    for count in sizes:
+        ads = make_ads(count)
+        for name, budget, max_orders in SCENARIOS:
+            loop_seconds, expected = best_of(lambda: loop_allocation(api, ads, budget, max_orders))
+            plan_seconds, (planned, _) = best_of(lambda: plan_orders(ads, budget, max_orders, presorted=True))
+            assert [(adv.advNo, round(amount, 6)) for adv, amount in expected] == \
+                [(adv.advNo, round(amount, 6)) for adv, amount in planned]
+            print(
+                f"{count:>7} ads, {name:24s} loop {loop_seconds * 1000:8.2f}ms   "
+                f"plan_orders {plan_seconds * 1000:8.2f}ms   ({loop_seconds / plan_seconds:5.1f}x, {len(planned)} orders)"
+            )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10000, 50000, 100000])
@@ -0,0 +1,346 @@
+"""Local stand-in for the two Binance C2C endpoints the bot calls.
+
+Serves `/sapi/v1/c2c/ads/search` from a scripted order book that churns over
+time, and `/sapi/v1/c2c/orderMatch/placeOrder` with configurable latency,
+jitter, 83999-style failures and 429 rate-limit responses. With a weight
+limit, requests over it get 429 with Retry-After, and a client that keeps
+sending before Retry-After has passed gets 418 (banned). With an outage
+schedule both endpoints answer 503 for `outage_seconds` out of every
+`outage_every`. Point the bot at it
+with `BINANCE_API_URL=http://127.0.0.1:8088`.
+
+    python -m benchmarks.binance_stub [--port 8088] [--churn 5] [--error-rate 0.1] ...
+
+Requests are not authenticated; the signature is ignored.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+SEARCH_ADS_ENDPOINT = "/sapi/v1/c2c/ads/search"
+PLACE_ORDER_ENDPOINT = "/sapi/v1/c2c/orderMatch/placeOrder"
+# Request weight Binance charges per search and per order, reported like the real API
+SEARCH_WEIGHT = 1
+ORDER_WEIGHT = 1
+
+
+class BinanceStub:
+    """In-process fake Binance C2C API with a churning book of ads.
+
+    Every `churn_interval` seconds `churn` ads are replaced by new ones; about
+    `cheap_share` of those are priced at or below `cheap_price`, the rest
+    above it. The time each ad was published is kept so a benchmark can
+    measure publish-to-order latency from the server's point of view.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        ads=200,
+        churn=5,
+        churn_interval=0.5,
+        cheap_price=85,
+        cheap_share=0.2,
+        latency=0.02,
+        jitter=0.01,
+        error_rate=0.1,
+        error_code="83999",
+        search_rate=20,
+        weight_limit=0,
+        ban_seconds=10,
+        outage_every=0,
+        outage_seconds=0,
+        seed=None,
+    ):
+        self.host = host
+        self.port = port
+        self.churn = churn
+        self.churn_interval = churn_interval
+        self.cheap_price = cheap_price
+        self.cheap_share = cheap_share
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.search_rate = search_rate
+        # Request weight per minute before answering 429 (0 = unlimited)
+        self.weight_limit = weight_limit
+        self.ban_seconds = ban_seconds
+        # time.monotonic() until which a 429 asked clients to wait, and until which they are banned
+        self.retry_after_until = 0.0
+        self.banned_until = 0.0
+        # Both endpoints answer 503 for outage_seconds out of every outage_every (0 = never)
+        self.outage_every = outage_every
+        self.outage_seconds = outage_seconds
+        self.started_at = time.monotonic()
+        self.random = random.Random(seed)
+        self._adv_numbers = itertools.count(10 ** 18)
+
+        # advNo -> ad payload, and advNo -> time.monotonic() it was published
+        self.book = {}
+        self.published_at = {}
+        for _ in range(ads):
+            self._publish()
+
+        self._search_window = []
+        self._weight_window = []
+        self.server = None
+        self.churn_task = None
+        self.connections = set()
+        self.stats = {"searches": 0, "rate_limited": 0, "weight_limited": 0, "banned": 0, "unavailable": 0, "orders": 0, "filled": 0, "failed": 0}
+        # Seconds from an ad being published to its first order request
+        self.order_latencies = []
+        self._ordered = set()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _publish(self):
+        adv_no = str(next(self._adv_numbers))
+        if self.random.random() < self.cheap_share:
+            price = round(self.random.uniform(self.cheap_price - 3, self.cheap_price), 2)
+        else:
+            price = round(self.random.uniform(self.cheap_price + 0.5, self.cheap_price + 10), 2)
+        max_amount = self.random.choice((1000, 5000, 20000, 100000))
+        self.book[adv_no] = {
+            "adv": {
+                "advNo": adv_no,
+                "tradeType": "SELL",
+                "asset": "USDT",
+                "fiatUnit": "INR",
+                "price": str(price),
+                "surplusAmount": str(round(max_amount / price * self.random.uniform(1, 3), 2)),
+                "minSingleTransAmount": str(self.random.choice((100, 500, 1000))),
+                "maxSingleTransAmount": str(max_amount),
+                "minSingleTransQuantity": "1",
+                "maxSingleTransQuantity": str(round(max_amount / price, 2)),
+            },
+            "advertiser": {"nickName": f"stub-{adv_no[-4:]}", "userNo": adv_no},
+        }
+        self.published_at[adv_no] = time.monotonic()
+
+    def _remove(self, adv_no):
+        self.book.pop(adv_no, None)
+        self.published_at.pop(adv_no, None)
+
+    def churn_once(self):
+        for adv_no in self.random.sample(sorted(self.book), min(self.churn, len(self.book))):
+            self._remove(adv_no)
+        for _ in range(self.churn):
+            self._publish()
+
+    async def _churn(self):
+        while True:
+            await asyncio.sleep(self.churn_interval)
+            self.churn_once()
+
+    def _used_weight(self, weight):
+        """Adds `weight` to the last minute's total, like X-MBX-USED-WEIGHT-1M."""
+        now = time.monotonic()
+        self._weight_window = [(at, w) for at, w in self._weight_window if now - at < 60]
+        self._weight_window.append((now, weight))
+        return sum(w for _, w in self._weight_window)
+
+    def _weight_limited(self):
+        """A 429 or 418 response when the client is over the weight limit or ignoring Retry-After, else None."""
+        now = time.monotonic()
+        if now < self.banned_until or now < self.retry_after_until:
+            self.banned_until = max(self.banned_until, now + self.ban_seconds)
+            self.stats["banned"] += 1
+            retry_after = max(1, round(self.banned_until - now))
+            return 418, {"code": -1003, "msg": "Way too many requests; IP banned."}, {"Retry-After": str(retry_after)}
+        self._weight_window = [(at, w) for at, w in self._weight_window if now - at < 60]
+        if self.weight_limit and sum(w for _, w in self._weight_window) >= self.weight_limit:
+            retry_after = max(1, round(60 - (now - self._weight_window[0][0])))
+            self.retry_after_until = now + retry_after
+            self.stats["weight_limited"] += 1
+            return 429, {"code": -1003, "msg": "Too much request weight used."}, {"Retry-After": str(retry_after)}
+        return None
+
+    def _unavailable(self):
+        """A 503 response during a scheduled outage, else None."""
+        if not self.outage_every or (time.monotonic() - self.started_at) % self.outage_every >= self.outage_seconds:
+            return None
+        self.stats["unavailable"] += 1
+        return 503, {"code": -1001, "msg": "Internal error; unable to process your request. Please try again."}, {}
+
+    def _rate_limited(self):
+        now = time.monotonic()
+        self._search_window = [at for at in self._search_window if now - at < 1]
+        if self.search_rate and len(self._search_window) >= self.search_rate:
+            return True
+        self._search_window.append(now)
+        return False
+
+    def search(self, body):
+        self.stats["searches"] += 1
+        if self._rate_limited():
+            self.stats["rate_limited"] += 1
+            return 429, {"code": -1003, "msg": "Too many requests; please use the websocket for live updates."}, {"Retry-After": "1"}
+
+        page = int(body.get("page") or 1)
+        rows = int(body.get("rows") or 20)
+        ads = sorted(self.book.values(), key=lambda ad: float(ad["adv"]["price"]))
+        data = ads[(page - 1) * rows:page * rows]
+        return 200, {"code": "000000", "message": None, "data": data, "total": len(ads), "success": True}, {}
+
+    def place_order(self, body):
+        self.stats["orders"] += 1
+        adv_no = str(body.get("advOrderNumber"))
+        if adv_no in self.published_at and adv_no not in self._ordered:
+            self._ordered.add(adv_no)
+            self.order_latencies.append(time.monotonic() - self.published_at[adv_no])
+
+        if adv_no not in self.book:
+            self.stats["failed"] += 1
+            return 200, {"code": "83229", "msg": "The ad is no longer available.", "success": False}, {}
+        if self.random.random() < self.error_rate:
+            self.stats["failed"] += 1
+            return 200, {"code": self.error_code, "msg": "Order creation failed, please try again.", "success": False}, {}
+
+        ad = self.book[adv_no]["adv"]
+        self._remove(adv_no)
+        self.stats["filled"] += 1
+        total_price = float(body.get("totalAmount") or 0)
+        price = float(ad["price"])
+        return 200, {
+            "code": "000000",
+            "success": True,
+            "data": {"orderMatch": {
+                "orderNumber": str(next(self._adv_numbers)),
+                "advOrderNumber": adv_no,
+                "asset": ad["asset"],
+                "fiatUnit": ad["fiatUnit"],
+                "price": ad["price"],
+                "amount": f"{total_price / price:.2f}",
+                "totalPrice": f"{total_price:.2f}",
+                "tradeType": body.get("tradeType"),
+                "buyerNickname": "bench",
+                "payType": "BANK",
+            }},
+        }, {}
+
+    async def _handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive, since the bot reuses pooled connections
+        self.connections.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw_body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                path = urlsplit(target).path
+                body = json.loads(raw_body or b"{}")
+
+                await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+                limited = None
+                if path in (SEARCH_ADS_ENDPOINT, PLACE_ORDER_ENDPOINT):
+                    limited = self._unavailable() or self._weight_limited()
+                if limited:
+                    status, payload, extra = limited
+                    weight = 0
+                elif method == "POST" and path == SEARCH_ADS_ENDPOINT:
+                    status, payload, extra = self.search(body)
+                    weight = SEARCH_WEIGHT
+                elif method == "POST" and path == PLACE_ORDER_ENDPOINT:
+                    status, payload, extra = self.place_order(body)
+                    weight = ORDER_WEIGHT
+                else:
+                    status, payload, extra, weight = 404, {"code": -1, "msg": "Not found"}, {}, 0
+
+                response = json.dumps(payload).encode()
+                head = [
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(response)}",
+                    f"X-MBX-USED-WEIGHT-1M: {self._used_weight(weight)}",
+                    *[f"{name}: {value}" for name, value in extra.items()],
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.churn and self.churn_interval:
+            self.churn_task = asyncio.get_running_loop().create_task(self._churn())
+        return self
+
+    async def stop(self):
+        if self.churn_task:
+            self.churn_task.cancel()
+            await asyncio.gather(self.churn_task, return_exceptions=True)
+        if self.server:
+            self.server.close()
+            for connection in list(self.connections):
+                connection.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--ads", type=int, default=200, help="ads in the book")
+    parser.add_argument("--churn", type=int, default=5, help="ads replaced per churn tick")
+    parser.add_argument("--churn-interval", type=float, default=0.5, help="seconds between churn ticks")
+    parser.add_argument("--cheap-price", type=float, default=85, help="price at or below which ads count as cheap")
+    parser.add_argument("--cheap-share", type=float, default=0.2, help="share of new ads that are cheap")
+    parser.add_argument("--latency", type=float, default=0.02, help="base response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="share of orders failing with --error-code")
+    parser.add_argument("--error-code", default="83999")
+    parser.add_argument("--search-rate", type=int, default=20, help="searches per second before answering 429 (0 = unlimited)")
+    parser.add_argument("--weight-limit", type=int, default=0, help="request weight per minute before answering 429 (0 = unlimited)")
+    parser.add_argument("--ban-seconds", type=float, default=10, help="418 ban for requests sent before Retry-After has passed")
+    parser.add_argument("--outage-every", type=float, default=0, help="seconds between 503 outages (0 = none)")
+    parser.add_argument("--outage-seconds", type=float, default=0, help="length of each outage")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def stub_from_arguments(args, host="127.0.0.1", port=0):
+    return BinanceStub(
+        host=host, port=port, ads=args.ads, churn=args.churn, churn_interval=args.churn_interval,
+        cheap_price=args.cheap_price, cheap_share=args.cheap_share, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_code=args.error_code, search_rate=args.search_rate,
+        weight_limit=args.weight_limit, ban_seconds=args.ban_seconds,
+        outage_every=args.outage_every, outage_seconds=args.outage_seconds, seed=args.seed,
+    )
+
+
+async def serve(args):
+    stub = await stub_from_arguments(args, args.host, args.port).start()
+    print(f"Binance stand-in listening on {stub.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    add_stub_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,142 @@
+"""Command round trips of the real bot, over a webhook and over long polling.
+
+Starts `benchmarks.telegram_stub` and `benchmarks.binance_stub` in-process and
+runs `main.py` in a subprocess pointed at both. For each mode the user starts
+their jobs with /start and /run, sends /status `--commands` times while the
+jobs scan and order, then sends /stop. A round trip runs from the stand-in
+delivering the command to the bot's reply reaching it.
+
+    python -m benchmarks.command_latency [--mode webhook polling] [--commands 50] [--churn 20] ...
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from benchmarks.binance_stub import add_stub_arguments, stub_from_arguments
+from benchmarks.telegram_stub import TelegramStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID = 1001
+ADMIN_ID = 1002
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", nargs="+", choices=("webhook", "polling"), default=["webhook", "polling"])
+    parser.add_argument("--commands", type=int, default=50, help="/status round trips per mode")
+    parser.add_argument("--gap", type=float, default=0.1, help="seconds between commands")
+    parser.add_argument("--workers", type=int, default=0, help="WORKER_PROCESSES for the bot")
+    parser.add_argument("--scan-interval", type=float, default=0.2, help="LIST_ADS_SLEEP for the bot")
+    parser.add_argument("--log", default=None, help="append the bot's output to this file")
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def command(telegram, text, match):
+    """Sends `text` and waits for the reply `match` accepts. Returns the round trip in seconds."""
+    sent_at = await telegram.send_command(USER_ID, text)
+    replied_at, _ = await telegram.wait_message(USER_ID, match, sent_at)
+    return replied_at - sent_at
+
+
+async def run_mode(args, mode):
+    binance = await stub_from_arguments(args).start()
+    telegram = await TelegramStub().start()
+    workdir = tempfile.mkdtemp(prefix="command_latency_")
+    os.makedirs(os.path.join(workdir, "db"))
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "PYTHONUNBUFFERED": "1",
+        "TELEGRAM_TOKEN": "123456:stub",
+        "TELEGRAM_API_URL": telegram.url,
+        "BINANCE_API_URL": binance.url,
+        "ALLOWED_USER": str(USER_ID),
+        "NOTIFY_USER_ID": str(ADMIN_ID),
+        "WORKER_PROCESSES": str(args.workers),
+        "METRICS_PORT": "0",
+        "FEED_RECORD_PATH": "",
+        "LIST_ADS_SLEEP": str(args.scan_interval),
+        "POLL_MIN_INTERVAL": str(min(0.05, args.scan_interval)),
+        "CREATE_ORDER_SLEEP": "1",
+        "TELEGRAM_WEBHOOK_URL": f"http://127.0.0.1:{port}/telegram" if mode == "webhook" else "",
+        "WEBHOOK_PORT": str(port),
+    }
+    log = open(args.log, "a") if args.log else open(os.devnull, "w")
+    bot = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), cwd=workdir, env=env, stdout=log, stderr=log,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not (telegram.webhook if mode == "webhook" else telegram.calls["getUpdates"]):
+            if bot.returncode is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"The bot didn't come up in {mode} mode")
+            await asyncio.sleep(0.05)
+
+        await command(telegram, "/start", lambda text: "Welcome" in text)
+        await command(telegram, "/set_config NO_OF_ORDERS 1000000", lambda text: "Updated" in text)
+        await command(telegram, "/set_config TOTAL_AMOUNT_TO_INVEST 1000000000", lambda text: "Updated" in text)
+        await command(telegram, "/run", lambda text: "running in the background" in text)
+        # Let the jobs get going before measuring
+        await asyncio.sleep(1)
+
+        searches, orders = binance.stats["searches"], binance.stats["orders"]
+        started = time.monotonic()
+        latencies = []
+        for _ in range(args.commands):
+            latencies.append(await command(telegram, "/status", lambda text: "Job 1" in text or "taking a break" in text))
+            await asyncio.sleep(args.gap)
+        elapsed = time.monotonic() - started
+        stop_latency = await command(telegram, "/stop", lambda text: "have been stopped" in text)
+    finally:
+        if bot.returncode is None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(bot.wait(), timeout=20)
+            except asyncio.TimeoutError:
+                bot.kill()
+                await bot.wait()
+        log.close()
+        await telegram.stop()
+        await binance.stop()
+
+    print(f"{mode}: allowed_updates={telegram.allowed_updates}, {telegram.calls['getUpdates']} getUpdates calls")
+    print(
+        f"  jobs while measuring: {(binance.stats['searches'] - searches) / elapsed:.1f} searches/s, "
+        f"{(binance.stats['orders'] - orders) / elapsed:.1f} orders/s"
+    )
+    print(
+        f"  /status: n={len(latencies)}  p50={percentile(latencies, 0.5) * 1000:.1f}ms  "
+        f"p95={percentile(latencies, 0.95) * 1000:.1f}ms  p99={percentile(latencies, 0.99) * 1000:.1f}ms  "
+        f"max={max(latencies) * 1000:.1f}ms"
+    )
+    print(f"  /stop:   {stop_latency * 1000:.1f}ms")
+
+
+async def run(args):
+    for mode in args.mode:
+        await run_mode(args, mode)
+
+
+def main(argv=None):
+    asyncio.run(run(parse_arguments(sys.argv[1:] if argv is None else argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""End-to-end benchmark of the real fetch_ads/process_ads loops against the local stand-in.
+
+Starts `benchmarks.binance_stub` in-process, runs a `JobRunner` against it for
+`--duration` seconds with an in-memory database, then reports throughput and
+latency percentiles. Publish-to-order is measured by the stub, from the moment
+an ad appears in its book to the first placeOrder request for it. Detection-to-
+order is the bot's own histogram, from receiving the scan to sending the order.
+
+    python -m benchmarks.e2e_latency [--duration 20] [--scan-interval 0.2] [--churn 10] ...
+"""
+import argparse
+import asyncio
+import os
+import sys
+from benchmarks.binance_stub import add_stub_arguments, stub_from_arguments
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run the jobs")
+    parser.add_argument("--scan-interval", type=float, default=0.2, help="LIST_ADS_SLEEP for the run")
+    parser.add_argument("--min-scan-interval", type=float, default=0.05, help="POLL_MIN_INTERVAL: fastest scans while the book churns")
+    parser.add_argument("--max-scan-interval", type=float, default=5, help="POLL_MAX_INTERVAL: slowest scans near the weight limit")
+    parser.add_argument("--sweep-interval", type=float, default=1, help="CREATE_ORDER_SLEEP for the run")
+    parser.add_argument("--order-interval", type=float, default=0, help="minimum seconds between orders")
+    parser.add_argument("--order-concurrency", type=int, default=1, help="ORDER_CONCURRENCY for the run")
+    parser.add_argument("--users", type=int, default=1, help="runners sharing one MarketScanner (1 = a single runner scanning on its own)")
+    parser.add_argument("--breaker-reset", type=float, default=2, help="BREAKER_RESET_SECONDS: pause before probing a failing endpoint")
+    parser.add_argument("--pages", type=int, default=2, help="search pages per scan")
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class _Message:
+    async def edit_text(self, text, **kwargs):
+        pass
+
+
+class _Chat:
+    """Stands in for `update.message`; counts what the digest would have sent."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.sent += 1
+        return _Message()
+
+
+class _Update:
+    def __init__(self):
+        self.message = _Chat()
+
+
+async def run(args):
+    # Imported here so the settings pick up the environment set in main()
+    from src.apis.binance_api_call import PLACE_ORDER_ENDPOINT
+    from src.apis.market_scanner import MarketScanner
+    from src.db.async_db import AsyncDatabase
+    from src.db.init import Database
+    from src.helpers.bot_config import BotConfig
+    from src.helpers.job_runer import JobRunner
+    from src.helpers.metrics import DETECTION_TO_ORDER_SECONDS, JOB_ITERATION_SECONDS
+    from src.helpers.notify import outbox
+
+    stub = await stub_from_arguments(args).start()
+    scanner = MarketScanner(stub.url, interval=args.scan_interval) if args.users > 1 else None
+    update = _Update()
+    runners = []
+    for user in range(args.users):
+        db = AsyncDatabase(Database(":memory:"))
+        runner = JobRunner(scanner=scanner, name=str(user))
+        runner.binance_api.base_url = stub.url
+        runner.binance_api.dispatcher.set_limit(PLACE_ORDER_ENDPOINT, args.order_interval, burst=args.order_concurrency)
+        runner.set_api_config(BotConfig.from_dict({
+            "API_KEY": f"bench{user}",
+            "SECRET_KEY": "bench",
+            "PAGES": args.pages,
+            "ROWS": 20,
+            "NO_OF_ORDERS": 10 ** 9,
+            "TOTAL_AMOUNT_TO_INVEST": 10 ** 12,
+            "EXTRA_FILTER": {"price": args.cheap_price + 0.01, "minimum_limit": 100, "error_codes": [args.error_code]},
+        }))
+        runner.run_parallel_jobs(db, update, None)
+        runners.append((runner, db))
+
+    await asyncio.sleep(args.duration)
+    for runner, db in runners:
+        await runner.close()
+        await db.close()
+    if scanner:
+        await scanner.close()
+    await stub.stop()
+
+    stats = stub.stats
+    latencies = stub.order_latencies
+    print(f"Ran {args.duration:g}s against {stub.url} (scan every {args.scan_interval:g}s, {args.pages} pages, {args.users} users)")
+    print(
+        f"searches:        {stats['searches']} ({stats['searches'] / args.duration:.1f}/s, {stats['rate_limited']} rate limited, "
+        f"{stats['weight_limited']} over weight, {stats['banned']} banned, {stats['unavailable']} unavailable)"
+    )
+    scheduler = scanner.scheduler if scanner else runners[0][0].scheduler
+    poll = scheduler.stats()
+    print(f"scan interval:   {poll['interval']:.2f}s at the end, {poll['ticks']} scans, change rate {poll['change_rate']:.2f}, used weight {poll['used_weight']}")
+    print(f"orders:          {stats['orders']} ({stats['orders'] / args.duration:.1f}/s), {stats['filled']} filled, {stats['failed']} failed")
+    breakers = {**runners[0][0].binance_api.breaker_stats(), **(scanner.api.breaker_stats() if scanner else {})}
+    print("breakers:        " + ", ".join(f"{name} opened {breaker['opened']}x, {breaker['rejected']} calls refused" for name, breaker in breakers.items()))
+    print(f"chat messages:   {update.message.sent} to the user, {outbox.stats()['pending']} to the admin")
+    print(
+        f"publish->order:  n={len(latencies)}  p50={percentile(latencies, 0.5) * 1000:.1f}ms  "
+        f"p95={percentile(latencies, 0.95) * 1000:.1f}ms  p99={percentile(latencies, 0.99) * 1000:.1f}ms  "
+        f"max={max(latencies, default=float('nan')) * 1000:.1f}ms"
+    )
+    for line in [*DETECTION_TO_ORDER_SECONDS.summary(), *JOB_ITERATION_SECONDS.summary()]:
+        print(line)
+
+
+def main(argv=None):
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    os.environ["LIST_ADS_SLEEP"] = str(args.scan_interval)
+    os.environ["CREATE_ORDER_SLEEP"] = str(args.sweep_interval)
+    os.environ["ORDER_CONCURRENCY"] = str(args.order_concurrency)
+    os.environ["BREAKER_RESET_SECONDS"] = str(args.breaker_reset)
+    os.environ["POLL_MIN_INTERVAL"] = str(args.min_scan_interval)
+    os.environ["POLL_MAX_INTERVAL"] = str(args.max_scan_interval)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Replays a recorded ads feed through the ingest, filter and allocation path.
+
+Record a feed by setting `FEED_RECORD_PATH` while the bot runs, or by running
+`FEED_RECORD_PATH=feed.jsonl.gz python -m benchmarks.e2e_latency` against the
+local stand-in. Then:
+
+    python -m benchmarks.feed_replay feed.jsonl.gz [--speed 0] [--repeat 3] [--price 85]
+
+Every recorded search response goes through `AsyncDatabase.insert_ad` on an
+in-memory database. The changed ads are filtered as `process_ads` does.
+Each market's book is then filtered with `get_filtered_ads`, and orders are allocated within the budget
+as `_create_market_orders` does, without sending anything. `--speed 0` replays
+as fast as possible. `--speed N` keeps the recorded spacing, N times faster.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from src.apis.feed_recorder import read_feed
+from src.apis.order_allocator import plan_orders
+from src.db.ad_book import match_extra_filter
+from src.db.async_db import AsyncDatabase
+from src.db.init import Database
+from src.helpers.bot_config import BotConfig
+
+STAGES = ("insert_ad", "filter_new", "get_filtered_ads", "allocate")
+
+
+def market_key(request):
+    return f"{request.get('asset')}/{request.get('fiat')}/{request.get('tradeType')}"
+
+
+class FeedReplay:
+    """Drives recorded search responses through the bot's hot path and times each stage."""
+
+    def __init__(self, entries, extra_filter, budget, max_orders):
+        self.entries = entries
+        markets = sorted({market_key(request) for _, request, _ in entries})
+        self.config = BotConfig.from_dict({
+            "TOTAL_AMOUNT_TO_INVEST": budget,
+            "NO_OF_ORDERS": max_orders,
+            "EXTRA_FILTER": extra_filter,
+            "MARKETS": [dict(zip(("ASSET", "FIAT", "TRADE_TYPE"), key.split("/"))) for key in markets],
+        })
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counts = {"responses": 0, "ads": 0, "changed": 0, "candidates": 0, "orders": 0}
+
+    async def _replay_entry(self, db: AsyncDatabase, request, response):
+        ads = response.get("data") or []
+        market = market_key(request)
+        spec = next(spec for spec in self.config.markets if spec.key == market)
+        self.counts["responses"] += 1
+        self.counts["ads"] += len(ads)
+
+        start = time.perf_counter()
+        changed_ads = await db.insert_ad(ads, market=market)
+        ingested = time.perf_counter()
+        candidates = [ad for ad in changed_ads if match_extra_filter(ad, spec.extra_filter)]
+        filtered = time.perf_counter()
+        book = db.get_filtered_ads(spec.extra_filter, market=market)
+        swept = time.perf_counter()
+        orders, _ = plan_orders(book, self.config.total_amount_to_invest, self.config.no_of_orders, presorted=True)
+        allocated = time.perf_counter()
+
+        self.seconds["insert_ad"] += ingested - start
+        self.seconds["filter_new"] += filtered - ingested
+        self.seconds["get_filtered_ads"] += swept - filtered
+        self.seconds["allocate"] += allocated - swept
+        self.counts["changed"] += len(changed_ads)
+        self.counts["candidates"] += len(candidates)
+        self.counts["orders"] += len(orders)
+
+    async def run(self, speed=0):
+        """Replays every entry once. Returns the wall-clock seconds taken."""
+        db = AsyncDatabase(Database(":memory:"))
+        started = time.perf_counter()
+        first_at = self.entries[0][0] if self.entries else 0
+        for at, request, response in self.entries:
+            if speed:
+                delay = (at - first_at) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._replay_entry(db, request, response)
+        elapsed = time.perf_counter() - started
+        await db.close()
+        return elapsed
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="gzip log written by FEED_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=0, help="0 = as fast as possible, N = N times real time")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times on fresh databases")
+    parser.add_argument("--price", type=float, default=85, help="EXTRA_FILTER.price")
+    parser.add_argument("--minimum-limit", type=float, default=100, help="EXTRA_FILTER.minimum_limit")
+    parser.add_argument("--budget", type=float, default=10000, help="TOTAL_AMOUNT_TO_INVEST")
+    parser.add_argument("--orders", type=int, default=10, help="NO_OF_ORDERS")
+    return parser.parse_args(argv)
+
+
+async def replay(args):
+    entries = [entry for entry in read_feed(args.path) if isinstance(entry[2], dict)]
+    if not entries:
+        print(f"No search responses in {args.path}")
+        return
+    span = entries[-1][0] - entries[0][0]
+    replayer = FeedReplay(entries, {"price": args.price, "minimum_limit": args.minimum_limit}, args.budget, args.orders)
+
+    elapsed = 0.0
+    for _ in range(args.repeat):
+        elapsed += await replayer.run(speed=args.speed)
+
+    counts = replayer.counts
+    print(f"Replayed {len(entries)} responses ({span:.1f}s of feed) x{args.repeat} in {elapsed:.3f}s ({span * args.repeat / elapsed:.0f}x real time)")
+    print(f"ads:        {counts['ads']} ({counts['ads'] / elapsed:,.0f}/s), {counts['changed']} new or changed, {counts['candidates']} candidates")
+    print(f"orders:     {counts['orders']} allocated")
+    for stage in STAGES:
+        seconds = replayer.seconds[stage]
+        print(f"{stage:16s} {seconds * 1000:9.1f}ms total  {seconds / counts['responses'] * 1e6:8.1f}us/response")
+
+
+if __name__ == "__main__":
+    asyncio.run(replay(parse_arguments(sys.argv[1:])))
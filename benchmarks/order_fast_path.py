@@ -0,0 +1,104 @@
+"""Client-side cost of signing and building a placeOrder request.
+
+Compares the old per-order work (fresh `hmac.new` and a new headers dict)
+with a `RequestSigner` keyed once per API secret. Both variants stop at a
+built `httpx.Request`, so no network time is included. The last line runs
+the whole `_place_order` path against a mock transport.
+
+    python -m benchmarks.order_fast_path [iterations]
+"""
+import asyncio
+import hashlib
+import hmac
+import sys
+import time
+import httpx
+from src.apis.binance_api_call import BinanceApiCall, PLACE_ORDER_ENDPOINT
+from src.apis.request_signer import RequestSigner, encode_body
+from src.helpers.bot_config import BotConfig
+
+BASE_URL = "http://binance.local"
+API_KEY = "k" * 64
+SECRET_KEY = "s" * 64
+ORDER = ("11538747254931369984", "USDT", "BY_AMOUNT", "INR", 85.12, 1250.5, "BUY")
+
+
+def order_request(timestamp):
+    adv_order_number, asset, buy_type, fiat_unit, match_price, total_amount, trade_type = ORDER
+    query_string = f"advOrderNumber={adv_order_number}&asset={asset}&buyType={buy_type}&fiatUnit={fiat_unit}&timestamp={timestamp}"
+    body = {
+        "advOrderNumber": adv_order_number,
+        "asset": asset,
+        "buyType": "BY_MONEY",
+        "fiatUnit": fiat_unit,
+        "matchPrice": match_price,
+        "totalAmount": total_amount,
+        "tradeType": trade_type,
+        "origin": "MAKE_TAKE",
+    }
+    return query_string, body
+
+
+def baseline(client):
+    """The request as `_place_order`/`_send_request` built it before the signer."""
+    query_string, body = order_request(int(time.time() * 1000))
+    signature = hmac.new(SECRET_KEY.encode(), query_string.encode(), hashlib.sha256).hexdigest()
+    headers = {
+        "X-MBX-APIKEY": API_KEY,
+        "Content-Type": "application/json",
+    }
+    url = f"{BASE_URL}{PLACE_ORDER_ENDPOINT}?{query_string}&signature={signature}"
+    return client.build_request("POST", url, headers=headers, json=body)
+
+
+def signed(client, signer):
+    query_string, body = order_request(int(time.time() * 1000))
+    url = f"{BASE_URL}{PLACE_ORDER_ENDPOINT}?{query_string}&signature={signer.sign(query_string)}"
+    return client.build_request("POST", url, headers=signer.headers, content=encode_body(body))
+
+
+def measure(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def measure_place_order(iterations):
+    """Full `_place_order` calls."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"success": True})))
+    api = BinanceApiCall(base_url=BASE_URL, client=client)
+    api.set_config(BotConfig.from_dict({"API_KEY": API_KEY, "SECRET_KEY": SECRET_KEY}))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await api._place_order(*ORDER)
+    cost = (time.perf_counter() - start) / iterations * 1e6
+    await api.close()
+    return cost
+
+
+def main(iterations=20000):
+    client = httpx.Client()
+    signer = RequestSigner(API_KEY, SECRET_KEY)
+
+    # Both variants must put the same bytes on the wire
+    assert baseline(client).content == signed(client, signer).content
+
+    before = measure(lambda: baseline(client), iterations)
+    after = measure(lambda: signed(client, signer), iterations)
+    print(f"build signed request, hmac.new:   {before:8.2f} us/order")
+    print(f"build signed request, signer:     {after:8.2f} us/order ({before / after:.2f}x)")
+
+    query_string, _ = order_request(int(time.time() * 1000))
+    sign_before = measure(lambda: hmac.new(SECRET_KEY.encode(), query_string.encode(), hashlib.sha256).hexdigest(), iterations)
+    sign_after = measure(lambda: signer.sign(query_string), iterations)
+    print(f"signature only, hmac.new:         {sign_before:8.2f} us")
+    print(f"signature only, keyed copy:       {sign_after:8.2f} us ({sign_before / sign_after:.2f}x)")
+
+    print(f"_place_order via mock transport:  {asyncio.run(measure_place_order(iterations // 10)):8.2f} us/order")
+    client.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
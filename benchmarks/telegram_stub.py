@@ -0,0 +1,202 @@
+"""Local stand-in for the Telegram Bot API methods the bot calls.
+
+Answers getMe, setWebhook, deleteWebhook, getUpdates (long polling),
+sendMessage, editMessageText and pinChatMessage under `/bot<token>/`; any
+other method just succeeds. `send_command` delivers a user's message to the
+bot, POSTing it to the registered webhook with its secret token, or queueing
+it for getUpdates when no webhook is set. Messages the bot sends are kept per
+chat for `wait_message`. Point the bot at it with
+`TELEGRAM_API_URL=http://127.0.0.1:8089`.
+
+    python -m benchmarks.telegram_stub [--port 8089]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+import httpx
+
+
+class TelegramStub:
+    """In-process fake Bot API. Records every call and the update types the bot asked for."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = set()
+        self.client = None
+        self.calls = Counter()
+        # url, secret_token and allowed_updates of the registered webhook
+        self.webhook = None
+        self.allowed_updates = None
+        self.pending_updates = []
+        self.updates_arrived = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        # chat id -> [(time.monotonic(), text)] of the messages the bot sent
+        self.messages = {}
+        self.message_arrived = asyncio.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _message(self, chat_id, text):
+        chat_id = int(chat_id)
+        self.messages.setdefault(chat_id, []).append((time.monotonic(), text))
+        self.message_arrived.set()
+        self.message_arrived = asyncio.Event()
+        return {"message_id": next(self._message_ids), "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": text}
+
+    async def call(self, method, params):
+        """The result of one Bot API method call."""
+        self.calls[method] += 1
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot", "can_join_groups": False,
+                    "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method == "setWebhook":
+            self.webhook = {"url": params["url"], "secret_token": params.get("secret_token", ""), "allowed_updates": params.get("allowed_updates")}
+            self.allowed_updates = params.get("allowed_updates")
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            return True
+        if method == "getUpdates":
+            self.allowed_updates = params.get("allowed_updates", self.allowed_updates)
+            offset = int(params.get("offset") or 0)
+            self.pending_updates = [update for update in self.pending_updates if update["update_id"] >= offset]
+            if not self.pending_updates:
+                try:
+                    await asyncio.wait_for(self.updates_arrived.wait(), timeout=float(params.get("timeout") or 0))
+                except asyncio.TimeoutError:
+                    pass
+            self.updates_arrived.clear()
+            return self.pending_updates
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params.get("chat_id"), params.get("text"))
+        return True
+
+    async def send_command(self, user_id, text):
+        """Delivers `text` from `user_id` in a private chat. Returns time.monotonic() at delivery."""
+        command = text.split()[0]
+        update = {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}] if command.startswith("/") else [],
+            },
+        }
+        delivered_at = time.monotonic()
+        if self.webhook:
+            response = await self.client.post(
+                self.webhook["url"], json=update,
+                headers={"X-Telegram-Bot-Api-Secret-Token": self.webhook["secret_token"]},
+            )
+            response.raise_for_status()
+        else:
+            self.pending_updates.append(update)
+            self.updates_arrived.set()
+        return delivered_at
+
+    async def wait_message(self, chat_id, match, since, timeout=30):
+        """The (time, text) of the first message to `chat_id` after `since` that `match(text)` accepts."""
+        deadline = time.monotonic() + timeout
+        while True:
+            for at, text in self.messages.get(chat_id, []):
+                if at >= since and match(text or ""):
+                    return at, text
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No matching message to {chat_id} within {timeout}s")
+            try:
+                await asyncio.wait_for(self.message_arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive, like the Bot API
+        self.connections.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw_body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                target = urlsplit(target)
+                params = dict(parse_qsl(target.query))
+                if headers.get("content-type", "").startswith("application/json"):
+                    params.update(json.loads(raw_body or b"{}"))
+                else:
+                    # python-telegram-bot sends a form with JSON encoded lists and objects
+                    for name, value in parse_qsl(raw_body.decode()):
+                        params[name] = json.loads(value) if value[:1] in ("[", "{") else value
+
+                parts = target.path.strip("/").split("/")
+                if len(parts) == 2 and parts[0].startswith("bot"):
+                    status, payload = 200, {"ok": True, "result": await self.call(parts[1], params)}
+                else:
+                    status, payload = 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+                response = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(response)}\r\n\r\n".encode() + response
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.client = httpx.AsyncClient()
+        return self
+
+    async def stop(self):
+        if self.client:
+            await self.client.aclose()
+        if self.server:
+            self.server.close()
+            for connection in list(self.connections):
+                connection.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+
+
+async def serve(args):
+    stub = await TelegramStub(args.host, args.port).start()
+    print(f"Telegram stand-in listening on {stub.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,57 @@
+"""Per-account hot path spread over worker processes, as `WORKER_PROCESSES` does.
+
+Every account replays the same recorded feed through `FeedReplay` (ingest,
+filter, book lookup, allocation) on its own in-memory
+database. The accounts are split round-robin over 1, 2, ... processes, like
+the supervisor shards users, and the total responses handled per second are
+compared. Scaling needs that many free CPU cores.
+
+    python -m benchmarks.worker_scaling feed.jsonl.gz [--accounts 16] [--processes 1 2 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from benchmarks.feed_replay import FeedReplay
+from src.apis.feed_recorder import read_feed
+
+
+def replay_shard(path, accounts):
+    """Replays the feed once per account in this process. Returns the responses handled."""
+    entries = [entry for entry in read_feed(path) if isinstance(entry[2], dict)]
+
+    async def replay():
+        for _ in range(accounts):
+            replayer = FeedReplay(entries, {"price": 85, "minimum_limit": 100}, 10000, 10)
+            await replayer.run()
+        return accounts * len(entries)
+
+    return asyncio.run(replay())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="gzip log written by FEED_RECORD_PATH")
+    parser.add_argument("--accounts", type=int, default=16)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{multiprocessing.cpu_count()} CPUs, {args.accounts} accounts")
+    baseline = None
+    for processes in args.processes:
+        shards = [len(range(index, args.accounts, processes)) for index in range(processes)]
+        with context.Pool(processes) as pool:
+            # Warm up the workers so imports aren't timed
+            pool.starmap(replay_shard, [(args.path, 0)] * processes)
+            started = time.perf_counter()
+            handled = sum(pool.starmap(replay_shard, [(args.path, accounts) for accounts in shards]))
+            elapsed = time.perf_counter() - started
+        rate = handled / elapsed
+        baseline = baseline or rate
+        print(f"{processes:>2} processes: {handled} responses in {elapsed:.2f}s ({rate:,.0f}/s, {rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
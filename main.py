@@ -1,13 +1,17 @@
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from src.helpers.commands import start, help, about, stop, get_config, set_config, reset, run, status, clean_ads
+from src.helpers.commands import start, help, about, stop, get_config, set_config, reset, run, status, clean_ads, metrics
 from setting import TELEGRAM_TOKEN
 from src.helpers.send_message import send_text_with_custom_keyboard
-from src.db.init import Database
-from setting import ALLOWED_USER
-from src.helpers.job_runer import JobRunner
+from setting import ALLOWED_USERS, BINANCE_API_URL, WORKER_PROCESSES, TELEGRAM_API_URL, TELEGRAM_WEBHOOK_URL
+from src.apis.market_scanner import MarketScanner
+from src.helpers.tenant import Tenant
+from src.helpers.supervisor import Supervisor, forward_command
 from src.helpers.auth import restricted
-from src.helpers.notify import notify_admin
+from src.helpers.notify import notify_admin, outbox
+from src.helpers.metrics import MetricsServer
+from src.helpers.update_processor import PerUserUpdateProcessor
+from src.helpers.webhook import ALLOWED_UPDATES, WebhookListener, run_webhook
 from src.helpers.logger import logger
 import sys
 
@@ -33,29 +37,78 @@ async def reply_hi(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("Hello! How can I help you today? \nFor assistance, type /help.")
 
 
+async def post_init(application: Application) -> None:
+    """Start background maintenance once the event loop is running."""
+    for tenant in application.tenants.values():
+        tenant.ad_compactor.start()
+    await outbox.start(getattr(application, 'db', None))
+    if hasattr(application, 'supervisor'):
+        await application.supervisor.start(application.bot)
+    await application.metrics_server.start()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Release long-lived resources once the bot has stopped."""
+    tenants = getattr(application, 'tenants', {}).values()
+    for tenant in tenants:
+        await tenant.job_runner.close()
+        await tenant.ad_compactor.stop()
+    if hasattr(application, 'supervisor'):
+        await application.supervisor.close()
+    if hasattr(application, 'scanner'):
+        await application.scanner.close()
+    await outbox.close()
+    if hasattr(application, 'metrics_server'):
+        await application.metrics_server.stop()
+    for tenant in tenants:
+        await tenant.db.close()
+
+
 # Main Function to Start the Bot
 def main(token):
     try:
-        application = Application.builder().token(token).build()
-        application.db = Database(f"db/{ALLOWED_USER}.db")
-        application.job_runner = JobRunner()
+        application = (
+            Application.builder().token(token)
+            # TELEGRAM_API_URL can point at a local stand-in, see benchmarks/telegram_stub.py
+            .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+            # A slow command of one user doesn't hold up another's /stop or /status
+            .concurrent_updates(PerUserUpdateProcessor())
+            .post_init(post_init).post_shutdown(post_shutdown)
+            .build()
+        )
+        # One scanner searches the markets of every user's runner
+        application.scanner = MarketScanner(BINANCE_API_URL)
+        if WORKER_PROCESSES:
+            # The tenants live in worker processes; this one keeps Telegram and the scanner
+            application.supervisor = Supervisor(ALLOWED_USERS, WORKER_PROCESSES, application.scanner)
+            application.tenants = {}
+        else:
+            application.tenants = {user_id: Tenant(user_id, application.scanner) for user_id in ALLOWED_USERS}
+            # Admin notifications are kept in the first user's database
+            application.db = application.tenants[ALLOWED_USERS[0]].db
+        application.metrics_server = MetricsServer()
 
         # Add error handler
         application.add_error_handler(error_handler)
 
         # Register command handlers
 
+        # Commands on a user's tenant run in its worker in supervisor mode
+        def tenant_command(handler):
+            return forward_command if WORKER_PROCESSES else handler
+
         # config command
-        application.add_handler(CommandHandler("get_config", get_config))
-        application.add_handler(CommandHandler("set_config", set_config))
-        application.add_handler(CommandHandler("reset", reset))
+        application.add_handler(CommandHandler("get_config", tenant_command(get_config)))
+        application.add_handler(CommandHandler("set_config", tenant_command(set_config)))
+        application.add_handler(CommandHandler("reset", tenant_command(reset)))
 
         # bot control
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("run", run))
-        application.add_handler(CommandHandler("stop", stop))
-        application.add_handler(CommandHandler("status", status))
-        application.add_handler(CommandHandler("clean_ads",clean_ads))
+        application.add_handler(CommandHandler("start", tenant_command(start)))
+        application.add_handler(CommandHandler("run", tenant_command(run)))
+        application.add_handler(CommandHandler("stop", tenant_command(stop)))
+        application.add_handler(CommandHandler("status", tenant_command(status)))
+        application.add_handler(CommandHandler("clean_ads", tenant_command(clean_ads)))
+        application.add_handler(CommandHandler("metrics", metrics))
 
         # Others
         application.add_handler(CommandHandler("help", help))
@@ -67,21 +120,24 @@ def main(token):
 
         # Start the bot
         logger.info("Bot is starting...")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if TELEGRAM_WEBHOOK_URL:
+            run_webhook(application, WebhookListener(application))
+        else:
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
     except Exception as e:
         logger.error(f"Failed to start bot: {e}", exc_info=True)
         sys.exit(1)
     finally:
-        if hasattr(application, 'db'):
-            application.db.close()
-        if hasattr(application, 'job_runner'):
-            application.job_runner.stop()
+        for tenant in getattr(application, 'tenants', {}).values():
+            tenant.job_runner.stop()
 
 if __name__ == "__main__":
     try:
         if not TELEGRAM_TOKEN:
             raise ValueError("TELEGRAM_TOKEN is missing")
+        if not ALLOWED_USERS:
+            raise ValueError("ALLOWED_USER is missing")
         main(token=TELEGRAM_TOKEN)
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
@@ -6,17 +6,88 @@ load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv ('TELEGRAM_TOKEN')
 ALLOWED_USER = os.getenv("ALLOWED_USER","")
+# Comma separated; each user gets their own database, config and order runner
+ALLOWED_USERS = [user.strip() for user in ALLOWED_USER.split(",") if user.strip()]
+# Run the users' order runners in this many worker processes (0 = in the bot process), see src/helpers/supervisor.py
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '0'))
 NOTIFY_USER_ID = os.getenv ('NOTIFY_USER_ID')
-LIST_ADS_SLEEP = int(os.getenv('LIST_ADS_SLEEP', '5'))
-CREATE_ORDER_SLEEP = int(os.getenv('CREATE_ORDER_SLEEP', '9')) 
+LIST_ADS_SLEEP = float(os.getenv('LIST_ADS_SLEEP', '5'))
+CREATE_ORDER_SLEEP = float(os.getenv('CREATE_ORDER_SLEEP', '9'))
+SCAN_CONCURRENCY = int(os.getenv('SCAN_CONCURRENCY', '3'))
+SEARCH_REQUESTS_PER_SECOND = float(os.getenv('SEARCH_REQUESTS_PER_SECOND', '10'))
+# placeOrder calls allowed in flight at once; budget is reserved per call
+ORDER_CONCURRENCY = int(os.getenv('ORDER_CONCURRENCY', '1'))
 BINANCE_API_URL = os.getenv('BINANCE_API_URL')
 
+# Scans run every LIST_ADS_SLEEP seconds, down to POLL_MIN_INTERVAL while the ad
+# book changes fast and up to POLL_MAX_INTERVAL as the used request weight nears
+# BINANCE_WEIGHT_LIMIT per minute, see src/apis/poll_scheduler.py
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '1'))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '60'))
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT', '6000'))
+# Calls to a Binance endpoint stop for BREAKER_RESET_SECONDS (doubling up to
+# BREAKER_MAX_RESET_SECONDS) after BREAKER_FAILURES transient failures in a row.
+# Requests Binance never acted on are tried up to RETRY_ATTEMPTS times with
+# jittered backoff from RETRY_BASE_DELAY to RETRY_MAX_DELAY seconds, see src/apis/circuit_breaker.py
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+BREAKER_MAX_RESET_SECONDS = float(os.getenv('BREAKER_MAX_RESET_SECONDS', '300'))
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.2'))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '2'))
+
+# HTTP client (shared, pooled connection to Binance)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_KEEPALIVE_CONNECTIONS', '5'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+
+# SQLite access from the event loop
+DB_READ_CONNECTIONS = int(os.getenv('DB_READ_CONNECTIONS', '2'))
+DB_WRITE_BATCH = int(os.getenv('DB_WRITE_BATCH', '100'))
+
+# Ads not returned by a scan for ADS_RETENTION_SECONDS are archived by a
+# compactor that runs every ADS_COMPACT_INTERVAL seconds
+ADS_RETENTION_SECONDS = int(os.getenv('ADS_RETENTION_SECONDS', '3600'))
+ADS_COMPACT_INTERVAL = int(os.getenv('ADS_COMPACT_INTERVAL', '300'))
+ADS_VACUUM_PAGES = int(os.getenv('ADS_VACUUM_PAGES', '500'))
+
+# Admin notifications (see src/helpers/outbox.py). Telegram allows about one
+# message per second to a chat and 30 per second overall.
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+NOTIFY_CHAT_RATE = float(os.getenv('NOTIFY_CHAT_RATE', '1'))
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '30'))
+NOTIFY_BATCH_WINDOW = float(os.getenv('NOTIFY_BATCH_WINDOW', '1'))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '8'))
+
+# Receive updates on a webhook instead of long polling: the public URL Telegram
+# posts to, forwarded to WEBHOOK_HOST:WEBHOOK_PORT (empty keeps polling), see src/helpers/webhook.py
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+# Checked against the X-Telegram-Bot-Api-Secret-Token header; a random one per start when empty
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Updates handled at once; each user's still run one at a time
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
+
+# Append every ads search response to this gzip log (empty disables), see benchmarks/feed_replay.py
+FEED_RECORD_PATH = os.getenv('FEED_RECORD_PATH', '')
+
+# Prometheus endpoint at http://METRICS_HOST:METRICS_PORT/metrics; port 0 disables it
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
 DEFAULT_BOT_CONFIG = {
     "ASSET": "USDT",
     "FIAT": "INR",
     "PAGE": 1,
+    "PAGES": 1,
     "ROWS": 20,
     "TRADE_TYPE": "BUY",
+    # Extra markets to scan besides ASSET/FIAT/TRADE_TYPE above, e.g.
+    # [{"ASSET": "BTC", "FIAT": "INR", "TRADE_TYPE": "BUY"}]. Empty means only that one.
+    "MARKETS": [],
     "TOTAL_AMOUNT_TO_INVEST": 10000,
     "NO_OF_ORDERS": 1,
     "EXTRA_FILTER": {
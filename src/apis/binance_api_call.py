@@ -1,50 +1,146 @@
+import asyncio
 import time
-import hmac
-import hashlib
-import requests
-from src.db.init import Database
-from telegram import Update
-from setting import CREATE_ORDER_SLEEP
+from src.db.ad_book import match_extra_filter
+from src.db.async_db import AsyncDatabase
+from src.helpers.cycle_digest import CycleDigest
+from setting import CREATE_ORDER_SLEEP, SCAN_CONCURRENCY, SEARCH_REQUESTS_PER_SECOND, ORDER_CONCURRENCY
 from src.helpers.notify import direct_notify_admin
+from src.apis.http_client import create_http_client
+from src.apis.order_dispatcher import OrderDispatcher
+from src.apis.rate_limiter import TokenBucket
+from src.apis.request_signer import RequestSigner, encode_body
+from src.apis.feed_recorder import FeedRecorder
+from src.apis.order_allocator import order_amount, plan_orders
+from src.apis.budget_ledger import BudgetLedger, Reservation
+from src.apis.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, BinanceUnavailable, RetryPolicy, classify,
+    CLOSED, OPEN, FATAL, RETRYABLE_CODES, UNKNOWN_STATUS_CODES,
+)
+from src.helpers.bot_config import BotConfig, MarketSpec
+from src.helpers.metrics import BINANCE_REQUEST_SECONDS, BINANCE_REQUESTS, DETECTION_TO_ORDER_SECONDS
+
+SEARCH_ADS_ENDPOINT = "/sapi/v1/c2c/ads/search"
+PLACE_ORDER_ENDPOINT = "/sapi/v1/c2c/orderMatch/placeOrder"
+
 
 class BinanceApiCall:
-    def __init__(self, base_url):
+    def __init__(self, base_url, client=None, recorder: FeedRecorder = None):
         """Initialize the bot with API details."""
         self.base_url = base_url
-        self.config = None
-        self.amount_spend = 0
-        self.remaining_amount = 0
-        self.order = 0
-        self.sleep_time = CREATE_ORDER_SLEEP
-
-    def set_config (self, config):
-        #TODO:  need to add validator of the config
-        self.api_key = config.get("API_KEY")
-        self.secret_key = config.get("SECRET_KEY")
-        self.config = config
-        self.amount_spend = 0
-        self.remaining_amount = 0
-        self.order = 0
-
-    def _generate_signature(self, query_string):
-        """Generate HMAC SHA256 signature."""
-        return hmac.new(self.secret_key.encode(), query_string.encode(), hashlib.sha256).hexdigest()
-
-    def _send_request(self, endpoint, query_string, body=None):
-        """Send a POST request to the Binance API."""
-        signature = self._generate_signature(query_string)
-        headers = {
-            "X-MBX-APIKEY": self.api_key,
-            "Content-Type": "application/json",
+        self.client = client or create_http_client()
+        # Optional log of every search response, see FEED_RECORD_PATH
+        self.recorder = recorder
+        self.config: BotConfig = None
+        self.budget = BudgetLedger()
+        # Up to ORDER_CONCURRENCY orders go out at once, then CREATE_ORDER_SLEEP spacing applies
+        self.dispatcher = OrderDispatcher(workers=ORDER_CONCURRENCY)
+        self.dispatcher.set_limit(PLACE_ORDER_ENDPOINT, CREATE_ORDER_SLEEP, burst=ORDER_CONCURRENCY)
+        # Shared by every market scanned by this instance
+        self.scan_semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+        self.search_limiter = TokenBucket(rate=SEARCH_REQUESTS_PER_SECOND, capacity=max(1, SCAN_CONCURRENCY))
+        self.signer: RequestSigner = None
+        # PollScheduler told about every response's used weight and throttling, if any
+        self.scheduler = None
+        # Calls stop while an endpoint is down; the admin hears when it goes down and comes back
+        self.breakers = {
+            SEARCH_ADS_ENDPOINT: CircuitBreaker("ads search", on_change=self._breaker_changed),
+            PLACE_ORDER_ENDPOINT: CircuitBreaker("placeOrder", on_change=self._breaker_changed),
         }
-        url = f"{self.base_url}{endpoint}?{query_string}&signature={signature}"
-        response = requests.post(url, headers=headers, json=body)
-        return response.json()
+        self.retry_policy = RetryPolicy()
+
+    def set_config (self, config: BotConfig):
+        """Start a new run with `config`, resetting the spend and order counters."""
+        self.apply_config(config)
+        self.budget = BudgetLedger(config.total_amount_to_invest, config.no_of_orders)
+
+    def apply_config(self, config: BotConfig):
+        """Swap in a changed config without touching the counters of the current run."""
+        if self.signer is None or (config.api_key, config.secret_key) != (self.api_key, self.secret_key):
+            self.signer = RequestSigner(config.api_key, config.secret_key)
+        self.api_key = config.api_key
+        self.secret_key = config.secret_key
+        self.config = config
+        self.budget.set_limits(config.total_amount_to_invest, config.no_of_orders)
+
+    async def _request(self, endpoint, build_query, content, idempotent=False):
+        """POST to `endpoint` through its circuit breaker, retrying transient failures.
+
+        `build_query()` is called for every attempt, so each gets a fresh
+        timestamp and signature. Raises CircuitOpenError without sending while
+        the breaker is open, and the last error once `retry_policy` gives up.
+        """
+        breaker = self.breakers[endpoint]
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                BINANCE_REQUESTS.inc(endpoint=endpoint, outcome="circuit_open")
+                raise CircuitOpenError(breaker.name, breaker.retry_in)
+            try:
+                response = await self._post(endpoint, build_query(), content)
+            except asyncio.CancelledError:
+                breaker.abandon()
+                raise
+            except Exception as e:
+                kind = classify(e)
+                if kind == FATAL:
+                    breaker.abandon()
+                    raise
+                breaker.record_failure(e)
+                if not self.retry_policy.should_retry(attempt, kind, idempotent):
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt))
+                attempt += 1
+                continue
+            breaker.record_success()
+            return response
 
-    def _search_ads(self, asset, fiat, page, rows, trade_type):
+    def _breaker_changed(self, breaker: CircuitBreaker, old, new, error):
+        """Notify the admin when an endpoint goes down and when it is back, not on every failure."""
+        if old == CLOSED and new == OPEN:
+            direct_notify_admin(f"🔌 Binance {breaker.name} is failing, calls paused for {breaker.retry_in:.0f}s 🔌\n\nERROR: {error}", breaker.stats())
+        elif new == CLOSED:
+            direct_notify_admin(f"✅ Binance {breaker.name} is answering again ✅", breaker.stats())
+
+    def breaker_stats(self, endpoints=None):
+        return {self.breakers[endpoint].name: self.breakers[endpoint].stats() for endpoint in endpoints or self.breakers}
+
+    async def _post(self, endpoint, query_string, content):
+        """Sign `query_string` and POST the already encoded body."""
+        if self.scheduler:
+            await self.scheduler.throttle()
+        url = f"{self.base_url}{endpoint}?{query_string}&signature={self.signer.sign(query_string)}"
+        outcome = "error"
+        try:
+            with BINANCE_REQUEST_SECONDS.time(endpoint=endpoint):
+                response = await self.client.post(url, headers=self.signer.headers, content=content)
+            outcome = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+            if self.scheduler:
+                self.scheduler.observe_response(response.status_code, response.headers)
+            if response.status_code >= 500:
+                raise BinanceUnavailable(endpoint, response.status_code, msg=response.text[:200])
+            payload = response.json()
+            code = str(payload.get("code"))
+            if code in RETRYABLE_CODES or code in UNKNOWN_STATUS_CODES:
+                outcome = f"code_{code}"
+                raise BinanceUnavailable(endpoint, response.status_code, code, payload.get("msg", ""))
+            return payload
+        finally:
+            BINANCE_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+    async def close(self):
+        """Stop the order dispatcher and close the pooled HTTP client."""
+        await self.dispatcher.close()
+        await self.client.aclose()
+        if self.recorder:
+            await asyncio.get_running_loop().run_in_executor(None, self.recorder.stop)
+            self.recorder = None
+
+    async def _search_ads(self, asset, fiat, page, rows, trade_type):
         """Search for ads based on specified criteria."""
-        timestamp = int(time.time() * 1000)
-        query_string = f"asset={asset}&fiat={fiat}&page={page}&rows={rows}&tradeType={trade_type}&timestamp={timestamp}"
+        def query_string():
+            timestamp = int(time.time() * 1000)
+            return f"asset={asset}&fiat={fiat}&page={page}&rows={rows}&tradeType={trade_type}&timestamp={timestamp}"
+
         body = {
             "asset": asset,
             "fiat": fiat,
@@ -52,46 +148,98 @@ class BinanceApiCall:
             "rows": rows,
             "tradeType": trade_type
         }
-        return self._send_request("/sapi/v1/c2c/ads/search", query_string, body)
+        # Searches only read, so they are retried even when Binance may have seen them
+        response = await self._request(SEARCH_ADS_ENDPOINT, query_string, encode_body(body), idempotent=True)
+        if self.recorder:
+            self.recorder.record(body, response)
+        return response
 
-    def _place_order(self, adv_order_number, asset, buy_type, fiat_unit, match_price, total_amount, trade_type):
+    async def _place_order(self, adv_order_number, asset, buy_type, fiat_unit, match_price, total_amount, trade_type):
         """Place an order based on ad details."""
-        timestamp = int(time.time() * 1000)
-        query_string = f"advOrderNumber={adv_order_number}&asset={asset}&buyType={buy_type}&fiatUnit={fiat_unit}&timestamp={timestamp}"
+        def query_string():
+            timestamp = int(time.time() * 1000)
+            return f"advOrderNumber={adv_order_number}&asset={asset}&buyType={buy_type}&fiatUnit={fiat_unit}&timestamp={timestamp}"
+
         body = {
             "advOrderNumber": adv_order_number,
             "asset": asset,
-            "buyType": buy_type,
+            # The query string carries `buy_type`; the body has always said BY_MONEY
+            "buyType": "BY_MONEY",
             "fiatUnit": fiat_unit,
             "matchPrice": match_price,
             "totalAmount": total_amount,
             "tradeType": trade_type,
-            "buyType": "BY_MONEY",
             "origin": "MAKE_TAKE",
         }
-        return self._send_request("/sapi/v1/c2c/orderMatch/placeOrder", query_string, body) 
+        # Only retried when Binance never saw the order, so it can't be placed twice
+        return await self._request(PLACE_ORDER_ENDPOINT, query_string, encode_body(body))
 
-    def search_ads_jobs(self, callback = None):
+    async def _search_ads_page(self, asset, fiat, page, rows, trade_type):
+        """Fetch one page of ads under the shared scan concurrency limit."""
+        async with self.scan_semaphore:
+            await self.search_limiter.acquire()
+            return await self._search_ads(asset, fiat, page, rows, trade_type)
+
+    @staticmethod
+    def _merge_ads(responses):
+        """Merge the ads of several pages into one batch, keeping the first copy of each advNo."""
+        merged = []
+        seen = set()
+        for response in responses:
+            for ad in response.get("data") or []:
+                adv_no = ad.get("adv", {}).get("advNo")
+                if adv_no in seen:
+                    continue
+                seen.add(adv_no)
+                merged.append(ad)
+        return merged
+
+    async def search_markets_jobs(self):
+        """Scan every configured market concurrently. Returns (market, result) pairs."""
+        if not self.config:
+            print('Error: Config not there')
+            return []
+
+        markets = self.config.markets
+        results = await asyncio.gather(*[self.search_ads_jobs(market) for market in markets], return_exceptions=True)
+        return list(zip(markets, results))
+
+    async def search_ads_jobs(self, market: MarketSpec = None, callback = None):
         """Main logic to search ads and place an order."""
 
         if not self.config:
             print('Error: Config not there')
             return
-        
-        CONFIG_ASSET = self.config.get("ASSET", "USDT")
-        CONFIG_FIAT = self.config.get("FIAT", "INR")
-        CONFIG_PAGE = self.config.get("PAGE", 1)
-        CONFIG_ROWS = self.config.get("ROWS", 10)
-        CONFIG_TRADE_TYPE = self.config.get("TRADE_TYPE", "BUY")
-
-        # Q: where need to implement EXTRA_FILTER at the time read ads from db
-        # EXTRA_FILTER = self.config.get("EXTRA_FILTER", {})
-
-        print("Searching for ads...")
-        ads = self._search_ads(CONFIG_ASSET, CONFIG_FIAT, CONFIG_PAGE, CONFIG_ROWS, CONFIG_TRADE_TYPE)
-        if "data" in ads and ads.get("data"):
-            return ads
+
+        market = market or self.config.markets[0]
+        CONFIG_ASSET = market.asset
+        CONFIG_FIAT = market.fiat
+        CONFIG_PAGE = self.config.page
+        CONFIG_PAGES = self.config.pages
+        CONFIG_ROWS = self.config.rows
+        CONFIG_TRADE_TYPE = market.trade_type
+
+        print(f"Searching for ads in {market.key}...")
+        pages = range(CONFIG_PAGE, CONFIG_PAGE + CONFIG_PAGES)
+        results = await asyncio.gather(
+            *[self._search_ads_page(CONFIG_ASSET, CONFIG_FIAT, page, CONFIG_ROWS, CONFIG_TRADE_TYPE) for page in pages],
+            return_exceptions=True
+        )
+        return self.combine_pages(results)
+
+    @staticmethod
+    def combine_pages(results):
+        """One search result from the page responses (or exceptions) of a market."""
+        responses = [result for result in results if isinstance(result, dict)]
+        if not responses:
+            # Every page failed, surface the first failure as before
+            raise results[0]
+
+        merged_ads = BinanceApiCall._merge_ads(responses)
+        if merged_ads:
+            return {**responses[0], "data": merged_ads}
         else:
+            ads = next((response for response in responses if response.get("code") not in (None, "000000")), responses[0])
             print("Something went wrong while fetching ads.")
             print(f"CODE: {ads.get('code', 'N/A')}")
             print(f"ERROR: {ads.get('msg', 'Unknown error occurred.')}")
@@ -102,47 +250,128 @@ class BinanceApiCall:
         
     def _get_order_amount(self, match_price, max_single_trans_amount, min_single_trans_amount, total_surplus_amount):
         """Calculate the maximum possible order amount based on surplus and transaction limits."""
-        min_surplus_amount = min_single_trans_amount / match_price
-        max_surplus_amount = max_single_trans_amount / match_price
+        return order_amount(match_price, max_single_trans_amount, min_single_trans_amount, total_surplus_amount)
 
-        surplus_amount = max(min_surplus_amount, min(max_surplus_amount, total_surplus_amount))
-        max_possible_amount = surplus_amount * match_price
-        return max_possible_amount
+    async def create_orders_jobs(self, db: AsyncDatabase, digest: CycleDigest, callback = None, new_ads = None, detected_at = None):
+        """Iterate through the filtered ads of every market and place orders.
 
-    async def create_orders_jobs(self, db: Database, update: Update , callback = None):
-        """Iterate through the filtered ads and place orders."""
-        ads = db.get_filtered_ads(self.config.get("EXTRA_FILTER"))
+        With `new_ads` (`AdRow`s returned by `Database.insert_ad`) only those ads are
+        evaluated, in memory; otherwise the candidates are read from the database.
+        Skipped and failed ads are reported in one `digest` message per call.
+        `detected_at` is the `time.monotonic()` at which `new_ads` were scanned.
+        """
         if not self.config:
             print('Error: Config not there')
             return
-        
-        CONFIG_ASSET = self.config.get("ASSET", "USDT")
-        CONFIG_FIAT = self.config.get("FIAT", "INR")
-        TOTAL_AMOUNT_TO_INVEST = self.config.get("TOTAL_AMOUNT_TO_INVEST", 0)
-        NO_OF_ORDERS = self.config.get("NO_OF_ORDERS", 1)
-        TRADE_TYPE = self.config.get("TRADE_TYPE", "BUY")
-
-        self.remaining_amount = TOTAL_AMOUNT_TO_INVEST
-
-        for index, adv in enumerate(ads):
-            adv_order_number = adv.get("advNo")
-            match_price = float(adv.get("price", 0))
-            surplus_amount = float(adv.get("surplusAmount", 0))
-            min_single_trans_amount = float(adv.get("minSingleTransAmount", 0))
-            max_single_trans_amount = float(adv.get("maxSingleTransAmount", 0))
-
-            total_amount = self._get_order_amount(match_price, max_single_trans_amount, min_single_trans_amount, surplus_amount)
-            order_message =f"📄 Order Number: {adv_order_number}\n💰 Match Price: {match_price:.2f}\n📦 Surplus Amount: {surplus_amount:.2f}\n🔢 Transaction Limits: {min_single_trans_amount:.2f} - {max_single_trans_amount:.2f}\n💴 Total Amount: {total_amount}\n" 
-
-            if total_amount > self.remaining_amount:
-                if self.remaining_amount > min_single_trans_amount:
-                    total_amount = self.remaining_amount
+
+        # Budget and order count are shared by all markets for the whole run
+        try:
+            for market in self.config.markets:
+                if new_ads is None:
+                    # The ad book returns them cheapest first
+                    ads = db.get_filtered_ads(market.extra_filter, market=market.key)
                 else:
-                    message = f" 🛑 Inappropriate Amount 🛑 \n\n {order_message}"
-                    await update.message.reply_text(message, parse_mode="Markdown")
+                    ads = [ad for ad in new_ads if ad.market == market.key and match_extra_filter(ad, market.extra_filter)]
+                if await self._create_market_orders(db, digest, market, ads, callback, detected_at, presorted=new_ads is None):
+                    break
+        finally:
+            digest.flush()
+
+    async def _create_market_orders(self, db: AsyncDatabase, digest: CycleDigest, market: MarketSpec, ads, callback = None, detected_at = None, presorted = False):
+        """Place orders on the ads of one market. Returns True once the order limit is reached.
+
+        The available budget is allocated to the cheapest ads first (see
+        `plan_orders`) and reserved in the ledger. The planned orders then go
+        out together, at most ORDER_CONCURRENCY at a time. When an order fails
+        its reservation is released and the rest of the ads are planned again.
+        While placeOrder's circuit breaker is open nothing is placed; the ads
+        are picked up again by a later sweep.
+        """
+        tried = set()
+        while True:
+            if self.breakers[PLACE_ORDER_ENDPOINT].blocked:
+                return False
+            candidates = [adv for adv in ads if adv.advNo not in tried]
+            orders, skipped = plan_orders(candidates, self.budget.available, self.budget.orders_available, presorted)
+
+            placements = []
+            for adv, total_amount in orders:
+                reservation = self.budget.reserve(total_amount, adv.minSingleTransAmount)
+                if reservation is None:
+                    # The ledger has less than the plan assumed; the ad stays a candidate
+                    skipped.append(adv)
                     continue
+                tried.add(adv.advNo)
+                placements.append(self._place_reserved_order(db, digest, market, adv, reservation, detected_at))
+            filled = await self._place_together(placements)
+
+            if placements and not all(filled) and not self.budget.exhausted:
+                # Failed orders gave their budget back, the ads passed over may fit now
+                continue
+
+            for adv in skipped:
+                digest.record_skipped(market.key, adv, self._get_order_amount(adv.price, adv.maxSingleTransAmount, adv.minSingleTransAmount, adv.surplusAmount))
+            if self.budget.exhausted:
+                if callback:
+                    callback ()
+                print("Order limit reached. Stopping further orders.")
+                return True
+            return False
+
+    async def _place_together(self, placements):
+        """Runs the placements concurrently. Returns whether each one was filled.
+
+        Once placeOrder's circuit breaker opens, the placements still waiting
+        for their turn in the dispatcher are called off instead of each
+        spending an order token only to be refused.
+        """
+        breaker = self.breakers[PLACE_ORDER_ENDPOINT]
+        tasks = [asyncio.ensure_future(placement) for placement in placements]
+        try:
+            pending = set(tasks)
+            while pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if pending and breaker.blocked:
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.wait(pending)
+                    break
+            return [False if task.cancelled() else task.result() for task in tasks]
+        finally:
+            for task in tasks:
+                task.cancel()
 
-            response_place_order =  self._place_order(
+    async def _place_reserved_order(self, db: AsyncDatabase, digest: CycleDigest, market: MarketSpec, adv, reservation: Reservation, detected_at = None):
+        """Place the order a reservation was made for, then commit or release the reservation."""
+        filled = False
+        try:
+            filled = await self._place_planned_order(db, digest, market, adv, reservation.amount, detected_at)
+        finally:
+            if filled:
+                self.budget.commit(reservation)
+            else:
+                self.budget.release(reservation)
+        return filled
+
+    async def _place_planned_order(self, db: AsyncDatabase, digest: CycleDigest, market: MarketSpec, adv, total_amount, detected_at = None):
+        """Place one order of `total_amount` on `adv` and report the outcome. Returns True if it was filled."""
+        CONFIG_ASSET = market.asset
+        CONFIG_FIAT = market.fiat
+        TRADE_TYPE = market.trade_type
+
+        adv_order_number = adv.advNo
+        match_price = adv.price
+        surplus_amount = adv.surplusAmount
+        min_single_trans_amount = adv.minSingleTransAmount
+        max_single_trans_amount = adv.maxSingleTransAmount
+
+        full_amount = self._get_order_amount(match_price, max_single_trans_amount, min_single_trans_amount, surplus_amount)
+        order_message =f"📄 Order Number: {adv_order_number}\n💰 Match Price: {match_price:.2f}\n📦 Surplus Amount: {surplus_amount:.2f}\n🔢 Transaction Limits: {min_single_trans_amount:.2f} - {max_single_trans_amount:.2f}\n💴 Total Amount: {full_amount}\n" 
+
+        def place_order():
+            if detected_at is not None:
+                DETECTION_TO_ORDER_SECONDS.observe(time.monotonic() - detected_at)
+            return self._place_order(
                 adv_order_number=adv_order_number,
                 asset=CONFIG_ASSET,
                 buy_type="BY_AMOUNT",
@@ -152,66 +381,66 @@ class BinanceApiCall:
                 trade_type=TRADE_TYPE
             )
 
-            if response_place_order.get("success") is True:
-                order_match = response_place_order.get("data",{}).get("orderMatch", {})
-                order_message = f"""
-                    *📝 Order Information:*
-
-                    📋 *Order Number:* `{order_match.get('orderNumber', 'N/A')}`
-                    📋 *Adv Order Number:* `{order_match.get('advOrderNumber', 'N/A')}`
-
-                    ⏳ *Allow Complain Time:* `{order_match.get('allowComplainTime', 'N/A')}`
-                    🧑‍💻 *User Id:* `{order_match.get('userId', 'N/A')}`
-                    👤 *Adv User Id:* `{order_match.get('advUserId', 'N/A')}`
-
-                    🛍️ *Buyer Information:*
-                    - *Nickname:* `{order_match.get('buyerNickname', 'N/A')}`
-                    - *Name:* `{order_match.get('buyerName', 'N/A')}`
-
-                    💰 *Transaction Details:*
-                    - *Amount:* `{order_match.get('amount', 'N/A')} {order_match.get('asset', 'N/A')}`
-                    - *Price:* `{order_match.get('price', 'N/A')} {order_match.get('fiatUnit', 'N/A')}/{order_match.get('asset', 'N/A')}`
-                    - *Total Price:* `{order_match.get('totalPrice', 'N/A')} {order_match.get('fiatUnit', 'N/A')}`
-
-                    💼 *Trade Information:*
-                    - *Trade Type:* `{order_match.get('tradeType', 'N/A')}`
-                    - *Pay Type:* `{order_match.get('payType', 'N/A')}`
-                    """
-                message = f"✅ Order placed successfully ✅ \n\n {order_message}"
-                await update.message.reply_text(message, parse_mode="Markdown")
-            
-                self.order += 1
-                self.amount_spend += total_amount
-                self.remaining_amount -= total_amount
-                direct_notify_admin(message,response_place_order, True)
-                
-            else:
-                error_message = response_place_order.get("msg", "Unknown error occurred.")
-                error_code = response_place_order.get('code', 'N/A')
-                message = f"🛑 Order Fail 🛑 \n\n {order_message} \nERR CODE: {error_code}\nERR MSG: {error_message}"
-                await update.message.reply_text(message, parse_mode="Markdown")
-                db.update_ads_response(adv_no=adv_order_number, response_code=error_code, response_message=error_message)
-
-                req_body = {
-                    "advOrderNumber": adv_order_number,
-                    "asset": CONFIG_ASSET,
-                    "fiatUnit": CONFIG_FIAT,
-                    "matchPrice": match_price,
-                    "totalAmount": total_amount,
-                    "tradeType": TRADE_TYPE,
-                    "buyType": "BY_MONEY",
-                    "origin": "MAKE_TAKE",
-                    "adv": adv
-                }
-
-                direct_notify_admin(message,req_body)
-            
-            if self.order >= NO_OF_ORDERS or self.amount_spend > TOTAL_AMOUNT_TO_INVEST:
-                if callback:
-                    callback ()
-                print("Order limit reached. Stopping further orders.")
-                break
+        # The dispatcher spaces orders by CREATE_ORDER_SLEEP without blocking the loop
+        try:
+            response_place_order = await self.dispatcher.submit(PLACE_ORDER_ENDPOINT, place_order)
+        except CircuitOpenError:
+            # Not sent; the ad stays untried for a later sweep
+            return False
+        except Exception as e:
+            # Retries gave up, or Binance may have acted on the order. Recording
+            # the failure keeps sweeps from sending it again unless its code is
+            # listed in EXTRA_FILTER.error_codes.
+            response_place_order = {"code": getattr(e, "code", None) or type(e).__name__, "msg": str(e)}
+
+        if response_place_order.get("success") is True:
+            order_match = response_place_order.get("data",{}).get("orderMatch", {})
+            order_message = f"""
+                *📝 Order Information:*
+
+                📋 *Order Number:* `{order_match.get('orderNumber', 'N/A')}`
+                📋 *Adv Order Number:* `{order_match.get('advOrderNumber', 'N/A')}`
+
+                ⏳ *Allow Complain Time:* `{order_match.get('allowComplainTime', 'N/A')}`
+                🧑‍💻 *User Id:* `{order_match.get('userId', 'N/A')}`
+                👤 *Adv User Id:* `{order_match.get('advUserId', 'N/A')}`
+
+                🛍️ *Buyer Information:*
+                - *Nickname:* `{order_match.get('buyerNickname', 'N/A')}`
+                - *Name:* `{order_match.get('buyerName', 'N/A')}`
+
+                💰 *Transaction Details:*
+                - *Amount:* `{order_match.get('amount', 'N/A')} {order_match.get('asset', 'N/A')}`
+                - *Price:* `{order_match.get('price', 'N/A')} {order_match.get('fiatUnit', 'N/A')}/{order_match.get('asset', 'N/A')}`
+                - *Total Price:* `{order_match.get('totalPrice', 'N/A')} {order_match.get('fiatUnit', 'N/A')}`
+
+                💼 *Trade Information:*
+                - *Trade Type:* `{order_match.get('tradeType', 'N/A')}`
+                - *Pay Type:* `{order_match.get('payType', 'N/A')}`
+                """
+            message = f"✅ Order placed successfully ✅ \n\n {order_message}"
+            digest.send(message, parse_mode="Markdown")
+        
+            direct_notify_admin(message,response_place_order, True)
+            return True
+
+        error_message = response_place_order.get("msg", "Unknown error occurred.")
+        error_code = response_place_order.get('code', 'N/A')
+        message = f"🛑 Order Fail 🛑 \n\n {order_message} \nERR CODE: {error_code}\nERR MSG: {error_message}"
+        digest.record_failed(market.key, adv, error_code, error_message)
+        await db.update_ads_response(adv_no=adv_order_number, response_code=error_code, response_message=error_message)
+
+        req_body = {
+            "advOrderNumber": adv_order_number,
+            "asset": CONFIG_ASSET,
+            "fiatUnit": CONFIG_FIAT,
+            "matchPrice": match_price,
+            "totalAmount": total_amount,
+            "tradeType": TRADE_TYPE,
+            "buyType": "BY_MONEY",
+            "origin": "MAKE_TAKE",
+            "adv": adv.to_dict()
+        }
 
-            if index < len(ads) - 1:
-                print(f"Waiting for {self.sleep_time} seconds before placing the next order...")
-                time.sleep(self.sleep_time)
+        direct_notify_admin(message,req_body)
+        return False
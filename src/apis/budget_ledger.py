@@ -0,0 +1,87 @@
+class Reservation:
+    """Budget and an order slot held for one placeOrder call until it succeeds or fails."""
+
+    __slots__ = ("amount", "open")
+
+    def __init__(self, amount):
+        self.amount = amount
+        self.open = True
+
+
+class BudgetLedger:
+    """Spend and order count of one run, shared by every order placed concurrently.
+
+    Budget is reserved before a placeOrder call goes out and either committed
+    or released once the response is in, so orders in flight can never add up
+    to more than `total_amount` or `max_orders`. Methods never await, which
+    makes each of them atomic on the event loop.
+    """
+
+    def __init__(self, total_amount=0, max_orders=0):
+        self.total_amount = total_amount
+        self.max_orders = max_orders
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.orders = 0
+        self.pending = 0
+
+    def set_limits(self, total_amount, max_orders):
+        """Applies changed limits to the current run; what is spent stays spent."""
+        self.total_amount = total_amount
+        self.max_orders = max_orders
+
+    @property
+    def available(self):
+        return max(0.0, self.total_amount - self.spent - self.reserved)
+
+    @property
+    def orders_available(self):
+        return max(0, self.max_orders - self.orders - self.pending)
+
+    @property
+    def exhausted(self):
+        return self.orders >= self.max_orders or self.spent >= self.total_amount
+
+    def reserve(self, amount, min_amount=0):
+        """Holds `amount`, or what is left of the budget if that is above `min_amount`.
+
+        Returns a `Reservation`, or None when no order slot or budget is left.
+        """
+        available = self.available
+        if self.orders_available <= 0 or available <= 0:
+            return None
+        if amount > available:
+            if available <= min_amount:
+                return None
+            amount = available
+        self.reserved += amount
+        self.pending += 1
+        return Reservation(amount)
+
+    def _close(self, reservation):
+        if not reservation.open:
+            raise ValueError("Reservation already settled")
+        reservation.open = False
+        self.pending -= 1
+        # Clamp float drift so an idle ledger reports exactly nothing reserved
+        self.reserved = max(0.0, self.reserved - reservation.amount) if self.pending else 0.0
+
+    def commit(self, reservation):
+        """The order went through: the reserved amount is spent."""
+        self._close(reservation)
+        self.spent += reservation.amount
+        self.orders += 1
+
+    def release(self, reservation):
+        """The order failed: its budget and order slot are free again."""
+        self._close(reservation)
+
+    def stats(self):
+        return {
+            "spent": self.spent,
+            "reserved": self.reserved,
+            "total": self.total_amount,
+            "orders": self.orders,
+            "pending": self.pending,
+            "max_orders": self.max_orders,
+        }
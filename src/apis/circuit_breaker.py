@@ -0,0 +1,181 @@
+import random
+import time
+import httpx
+from setting import (
+    BREAKER_FAILURES, BREAKER_RESET_SECONDS, BREAKER_MAX_RESET_SECONDS,
+    RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# How a failed request may be handled, see `classify`
+RETRY = "retry"
+UNKNOWN = "unknown"
+FATAL = "fatal"
+
+# Binance error codes for a server that failed before acting on the request
+# (-1001 disconnected, -1008 overloaded), and for one that may have acted on it
+# (-1006 unexpected response, -1007 backend timeout)
+RETRYABLE_CODES = {"-1001", "-1008"}
+UNKNOWN_STATUS_CODES = {"-1006", "-1007"}
+
+
+class BinanceUnavailable(Exception):
+    """Binance answered with a 5xx or one of the server-side error codes above."""
+
+    def __init__(self, endpoint, status_code, code=None, msg=""):
+        super().__init__(f"{endpoint} answered {status_code} {code or ''} {msg}".strip())
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.code = code
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Binance {name} calls are paused for another {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def classify(error):
+    """RETRY if Binance never acted on the failed request, UNKNOWN if it may have, FATAL if it's not a transient failure."""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return RETRY
+    if isinstance(error, BinanceUnavailable):
+        return RETRY if error.code in RETRYABLE_CODES else UNKNOWN
+    if isinstance(error, httpx.TransportError):
+        # Read timeouts and dropped connections: the request went out
+        return UNKNOWN
+    return FATAL
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter between the attempts of one request.
+
+    Attempt `n` (from 0) is followed by a random pause of up to
+    `base_delay * 2**n`, capped at `max_delay`, so clients that failed
+    together don't come back together. Requests that Binance may have acted
+    on are only repeated when they are `idempotent`.
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def should_retry(self, attempt, kind, idempotent):
+        if attempt + 1 >= self.attempts:
+            return False
+        return kind == RETRY or (kind == UNKNOWN and idempotent)
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint that keeps failing, and probes it again after a pause.
+
+    Closed: calls go through, and `failure_threshold` transient failures in a
+    row open the breaker. Open: `allow` refuses calls for `reset_timeout`
+    seconds, jittered and doubled after every failed probe up to
+    `max_reset_timeout`. Half-open: one probe call goes through; its success
+    closes the breaker and its failure opens it again. Any answer from
+    Binance that isn't a server failure (including business errors and 429s)
+    counts as a success, since the endpoint is up.
+
+    `on_change(breaker, old_state, new_state, error)` is called on every
+    transition.
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=BREAKER_FAILURES,
+        reset_timeout=BREAKER_RESET_SECONDS,
+        max_reset_timeout=BREAKER_MAX_RESET_SECONDS,
+        on_change=None,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.on_change = on_change
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        # Failed probes since the breaker last closed
+        self.reopens = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def blocked(self):
+        """True while open and not yet due for a probe."""
+        return self.state == OPEN and self.clock() < self.open_until
+
+    @property
+    def retry_in(self):
+        return max(0.0, self.open_until - self.clock()) if self.state == OPEN else 0.0
+
+    def allow(self):
+        """Whether a call may go out now. A True in half-open makes the caller the probe."""
+        if self.blocked:
+            self.rejected += 1
+            return False
+        if self.state == OPEN:
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probing:
+                self.rejected += 1
+                return False
+            self.probing = True
+        return True
+
+    def abandon(self):
+        """The call `allow` let through ended without an answer either way, e.g. it was cancelled."""
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != CLOSED:
+            self.reopens = 0
+            self._set(CLOSED)
+
+    def record_failure(self, error=None):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN:
+            self.reopens += 1
+            self._open(error)
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open(error)
+
+    def _open(self, error):
+        timeout = min(self.max_reset_timeout, self.reset_timeout * 2 ** self.reopens)
+        # Between half and all of the timeout, so instances don't probe in step
+        self.open_until = self.clock() + timeout * random.uniform(0.5, 1)
+        self.opened += 1
+        self._set(OPEN, error)
+
+    def _set(self, state, error=None):
+        old, self.state = self.state, state
+        print(f"Binance {self.name} circuit {old} -> {state}" + (f": {error}" if error else ""))
+        if self.on_change:
+            self.on_change(self, old, state, error)
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": self.retry_in,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
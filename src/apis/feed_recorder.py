@@ -0,0 +1,70 @@
+import gzip
+import json
+import queue
+import threading
+import time
+import zlib
+
+# Seconds between flushes, so a crash loses at most this much of the feed
+FLUSH_INTERVAL = 5
+
+
+class FeedRecorder(threading.Thread):
+    """Appends every search response to a gzip-compressed JSON-lines log.
+
+    Each line is `{"t": unix time, "request": search body, "response": API
+    response}`. `record` only queues the entry; compression and disk writes
+    happen on this thread. Every start appends a new gzip member, which
+    `gzip.open` reads back as one stream, so the log is never rewritten.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        super().__init__(name="feed-recorder", daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.entries = queue.SimpleQueue()
+        self.recorded = 0
+
+    def record(self, request, response, at=None):
+        self.entries.put((time.time() if at is None else at, request, response))
+
+    def run(self):
+        with gzip.open(self.path, "ab") as log:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    entry = self.entries.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    entry = ()
+                if entry is None:
+                    break
+                if entry:
+                    at, request, response = entry
+                    log.write(json.dumps({"t": at, "request": request, "response": response}).encode() + b"\n")
+                    self.recorded += 1
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    # A sync flush ends the compressed block so what was written so far can be read back
+                    log.flush(zlib.Z_SYNC_FLUSH)
+                    last_flush = time.monotonic()
+
+    def stop(self):
+        """Writes what is queued and closes the log."""
+        self.entries.put(None)
+        self.join()
+
+
+def read_feed(path):
+    """Yields `(t, request, response)` from a log written by `FeedRecorder`, oldest first.
+
+    A log cut short by a crash is read up to its last complete line.
+    """
+    with gzip.open(path, "rb") as log:
+        try:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    return
+                yield entry["t"], entry["request"], entry["response"]
+        except (EOFError, zlib.error):
+            return
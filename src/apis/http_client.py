@@ -0,0 +1,25 @@
+import httpx
+from setting import HTTP_POOL_SIZE, HTTP_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT
+
+
+def create_http_client(
+    pool_size=HTTP_POOL_SIZE,
+    keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    timeout=HTTP_TIMEOUT,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+):
+    """Create a long-lived async HTTP client with a keep-alive connection pool.
+
+    The client is meant to be created once and shared by every request to the
+    same host, so TCP and TLS handshakes are paid only when the pool grows.
+    """
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
@@ -0,0 +1,232 @@
+import asyncio
+import time
+import weakref
+from setting import LIST_ADS_SLEEP, FEED_RECORD_PATH
+from src.apis.binance_api_call import BinanceApiCall
+from src.apis.feed_recorder import FeedRecorder
+from src.apis.poll_scheduler import PollScheduler
+
+# Binance codes for a request refused over its key or signature: bad
+# signature (-1022), malformed key (-2014), unknown key, IP or permission (-2015)
+AUTH_ERROR_CODES = {"-1022", "-2014", "-2015"}
+
+
+class ScanFanout:
+    """Hands the pages of each scan to the runners subscribed to them.
+
+    A runner subscribes with its `BinanceApiCall`; its config decides which
+    markets and pages it needs. It gets `(scanned_at, [(market, result)])` in
+    its queue, in the shape `BinanceApiCall.search_markets_jobs` returns. Only
+    the latest scan is kept for a runner that falls behind; the ad book diff
+    makes older scans redundant. `forward` subscribers get the raw pages
+    instead, to pass them on to another process. Runners fed by the fanout
+    share its `scheduler`, so a 429/418 on any of their requests holds back
+    the others from the same IP.
+    """
+
+    def __init__(self):
+        # name -> (BinanceApiCall of the runner, its queue or forward function)
+        self.subscribers = {}
+        self.scheduler = PollScheduler()
+
+    def subscribe(self, name, api: BinanceApiCall):
+        """Adds a runner. Returns the queue its scans arrive in."""
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers[name] = (api, queue)
+        return queue
+
+    def forward(self, name, api, send):
+        """Adds a subscriber whose pages go to `send(scanned_at, pages)`, once per scan per `send`."""
+        self.subscribers[name] = (api, send)
+
+    def unsubscribe(self, name):
+        self.subscribers.pop(name, None)
+
+    def wanted_pages(self):
+        """Configs of the subscribers and the page requests they need, as (requests, wanted, subscribers).
+
+        `requests` maps each distinct (asset, fiat, trade type, page, rows) to
+        an index; `wanted` is the number of page requests without sharing.
+        """
+        # Configs are read once, so a change during the scan applies from the next one
+        subscribers = [(api, api.config, target) for api, target in list(self.subscribers.values()) if api.config]
+        requests = {}
+        wanted = 0
+        for _, config, _ in subscribers:
+            for key in self._page_keys(config):
+                requests.setdefault(key, len(requests))
+                wanted += 1
+        return requests, wanted, subscribers
+
+    @staticmethod
+    def _page_keys(config):
+        for market in config.markets:
+            for page in range(config.page, config.page + config.pages):
+                yield (market.asset, market.fiat, market.trade_type, page, config.rows)
+
+    def publish(self, scanned_at, pages, subscribers=None):
+        """Hands `pages` ({page key: response or exception}) to every subscriber.
+
+        A market with pages missing from the scan, e.g. because the
+        subscriber's config changed after the scan was planned, is left out
+        until a scan covers it.
+        """
+        if subscribers is None:
+            subscribers = [(api, api.config, target) for api, target in list(self.subscribers.values()) if api.config]
+        forwards = {}
+        for _, config, target in subscribers:
+            if not isinstance(target, asyncio.Queue):
+                forwards.setdefault(target, set()).update(self._page_keys(config))
+                continue
+            try:
+                market_results = []
+                for market in config.markets:
+                    results = [
+                        pages.get((market.asset, market.fiat, market.trade_type, page, config.rows))
+                        for page in range(config.page, config.page + config.pages)
+                    ]
+                    if None in results:
+                        continue
+                    try:
+                        market_results.append((market, BinanceApiCall.combine_pages(results)))
+                    except Exception as e:
+                        market_results.append((market, e))
+                if not market_results:
+                    continue
+                if target.full():
+                    target.get_nowait()
+                target.put_nowait((scanned_at, market_results))
+            except Exception as e:
+                # One subscriber must not keep the scan from the others
+                print(f"An error occurred while publishing a scan: {e}")
+        for send, keys in forwards.items():
+            try:
+                send(scanned_at, {key: pages[key] for key in keys if key in pages})
+            except Exception as e:
+                print(f"An error occurred while forwarding a scan: {e}")
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers)}
+
+
+class MarketScanner(ScanFanout):
+    """Searches the ads of every subscriber's markets once per scan and fans the results out.
+
+    Runners watching the same market share one search request per (market,
+    page, rows), so adding a user who trades the same market adds no request
+    weight. The searches go through the scanner's own client and rate limits.
+    They are signed with the subscribers' keys in turn, one account per scan,
+    so no single account is charged the weight of all. A key Binance refuses
+    is passed over, and the scan is retried with the next one, until that
+    subscriber's config changes. Scanning runs while anyone is subscribed,
+    paced by a `PollScheduler` that follows how many of the scanned ads
+    changed since the previous scan.
+    """
+
+    def __init__(self, base_url, interval=LIST_ADS_SLEEP, client=None):
+        super().__init__()
+        recorder = None
+        if FEED_RECORD_PATH:
+            recorder = FeedRecorder(FEED_RECORD_PATH)
+            recorder.start()
+        self.api = BinanceApiCall(base_url=base_url, client=client, recorder=recorder)
+        self.scheduler = PollScheduler(base=interval)
+        self.api.scheduler = self.scheduler
+        # (advNo, price, surplus) of every ad in the previous scan
+        self.last_ads = set()
+        self.task = None
+        self.scans = 0
+        self.requests = 0
+        self.requests_saved = 0
+        # Signers whose key Binance refused; a config change brings a new signer
+        self.refused_signers = weakref.WeakSet()
+
+    def subscribe(self, name, api: BinanceApiCall):
+        queue = super().subscribe(name, api)
+        self._start()
+        return queue
+
+    def forward(self, name, api, send):
+        super().forward(name, api, send)
+        self._start()
+
+    def _start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def unsubscribe(self, name):
+        """Removes a subscriber; scanning stops with the last one."""
+        super().unsubscribe(name)
+        if not self.subscribers and self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while self.subscribers:
+            await self.scheduler.wait()
+            try:
+                await self.scan()
+            except Exception as e:
+                print(f"An error occurred while scanning markets: {e}")
+
+    async def scan(self):
+        """Runs one scan for every subscriber with a config."""
+        requests, wanted, subscribers = self.wanted_pages()
+        if not subscribers:
+            return
+
+        signers = self._signers(subscribers)
+        if not signers:
+            print("No subscriber has working API keys to sign searches with")
+            return
+        print(f"Scanning {len(requests)} pages for {len(subscribers)} runners...")
+        for signer in signers:
+            self.api.signer = signer
+            results = await asyncio.gather(
+                *[self.api._search_ads_page(asset, fiat, page, rows, trade_type) for asset, fiat, trade_type, page, rows in requests],
+                return_exceptions=True
+            )
+            self.requests += len(requests)
+            if not any(isinstance(result, dict) and str(result.get("code")) in AUTH_ERROR_CODES for result in results):
+                break
+            print(f"Binance refused the API key ...{signer.headers['X-MBX-APIKEY'][-4:]} for searches, trying the next subscriber")
+            self.refused_signers.add(signer)
+        self.scans += 1
+        self.requests_saved += wanted - len(requests)
+        ads = {
+            (ad.get("adv", {}).get("advNo"), ad.get("adv", {}).get("price"), ad.get("adv", {}).get("surplusAmount"))
+            for result in results if isinstance(result, dict) for ad in result.get("data") or []
+        }
+        self.scheduler.observe_changes(len(ads - self.last_ads), len(ads))
+        self.last_ads = ads
+        self.publish(time.monotonic(), dict(zip(requests, results)), subscribers)
+
+    def _signers(self, subscribers):
+        """Signers of the subscribers with API keys, once per key, starting with a different one every scan."""
+        signers = {}
+        for api, config, _ in subscribers:
+            if config.api_key and config.secret_key and api.signer is not None and api.signer not in self.refused_signers:
+                signers.setdefault(config.api_key, api.signer)
+        signers = list(signers.values())
+        if not signers:
+            return []
+        start = self.scans % len(signers)
+        return signers[start:] + signers[:start]
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "scans": self.scans,
+            "requests": self.requests,
+            "requests_saved": self.requests_saved,
+            "poll": self.scheduler.stats(),
+            "breakers": self.api.breaker_stats(),
+        }
+
+    async def close(self):
+        """Stop scanning and release the scanner's HTTP client."""
+        self.subscribers.clear()
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.api.close()
@@ -0,0 +1,55 @@
+from operator import attrgetter
+
+_price = attrgetter("price")
+
+
+def order_amount(match_price, max_single_trans_amount, min_single_trans_amount, total_surplus_amount):
+    """Largest fill of an ad in fiat, within its surplus and transaction limits."""
+    min_surplus_amount = min_single_trans_amount / match_price
+    max_surplus_amount = max_single_trans_amount / match_price
+
+    surplus_amount = max(min_surplus_amount, min(max_surplus_amount, total_surplus_amount))
+    return surplus_amount * match_price
+
+
+def _fit_to_budget(amount, min_amount, remaining):
+    """What to order on an ad whose full fill is `amount` with `remaining` budget left, or None to pass it over."""
+    if amount <= remaining:
+        return amount
+    if remaining > min_amount:
+        return remaining
+    return None
+
+
+def plan_orders(ads, budget, max_orders, presorted=False):
+    """Cheapest-first allocation of `budget` over `ads` with at most `max_orders` orders.
+
+    Ads are taken in ascending price for their full fill amount while the
+    budget lasts. An ad that no longer fits is passed over, unless the budget
+    left is above its minimum, in which case it gets the rest of the budget and
+    allocation ends. Pass `presorted=True` for ads already in ascending price,
+    such as ad book results.
+
+    Returns `(orders, skipped)`: `(ad, amount)` pairs in the order to place
+    them, and the ads passed over for lack of budget before allocation ended.
+    """
+    if not presorted:
+        ads = sorted(ads, key=_price)
+
+    planned = []
+    skipped = []
+    remaining = budget
+    for ad in ads:
+        if len(planned) >= max_orders or remaining <= 0:
+            break
+        amount = _fit_to_budget(
+            order_amount(ad.price, ad.maxSingleTransAmount, ad.minSingleTransAmount, ad.surplusAmount),
+            ad.minSingleTransAmount,
+            remaining,
+        )
+        if amount is None:
+            skipped.append(ad)
+            continue
+        planned.append((ad, amount))
+        remaining -= amount
+    return planned, skipped
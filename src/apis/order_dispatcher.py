@@ -0,0 +1,100 @@
+import asyncio
+import time
+from src.apis.rate_limiter import TokenBucket
+
+
+class OrderDispatcher:
+    """Queue outgoing Binance calls and release them under a token bucket per endpoint.
+
+    Callers submit a coroutine factory rather than a coroutine so the request
+    (and its timestamp/signature) is only built once its token has been granted.
+    """
+
+    def __init__(self, min_interval=0, burst=1, workers=1):
+        self.min_interval = min_interval
+        self.burst = burst
+        self.workers = workers
+        self.buckets = {}
+        self.queue = asyncio.Queue()
+        self._worker_tasks = []
+        self._in_flight = 0
+        self._dispatched = 0
+        self._total_wait = 0.0
+        self._last_wait = 0.0
+        self._max_wait = 0.0
+
+    def set_limit(self, endpoint, min_interval, burst=1):
+        """Override the minimum spacing between calls to a single endpoint."""
+        self.buckets[endpoint] = TokenBucket.from_interval(min_interval, burst)
+
+    def _bucket(self, endpoint):
+        if endpoint not in self.buckets:
+            self.buckets[endpoint] = TokenBucket.from_interval(self.min_interval, self.burst)
+        return self.buckets[endpoint]
+
+    def _ensure_workers(self):
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(loop.create_task(self._worker()))
+
+    async def submit(self, endpoint, request_factory):
+        """Queue `request_factory()` for `endpoint` and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((endpoint, request_factory, future, time.monotonic()))
+        self._ensure_workers()
+        return await future
+
+    async def _worker(self):
+        while True:
+            endpoint, request_factory, future, queued_at = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+
+                await self._bucket(endpoint).acquire()
+                # The caller may have given up (e.g. /stop) while we waited for the token
+                if future.cancelled():
+                    continue
+                wait = time.monotonic() - queued_at
+                self._dispatched += 1
+                self._total_wait += wait
+                self._last_wait = wait
+                self._max_wait = max(self._max_wait, wait)
+
+                self._in_flight += 1
+                try:
+                    result = await request_factory()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self._in_flight -= 1
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        """Queue depth and wait time figures used to tune throughput."""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "in_flight": self._in_flight,
+            "dispatched": self._dispatched,
+            "last_wait": self._last_wait,
+            "avg_wait": self._total_wait / self._dispatched if self._dispatched else 0.0,
+            "max_wait": self._max_wait,
+        }
+
+    async def close(self):
+        """Cancel the worker tasks; queued calls are cancelled with them."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        while not self.queue.empty():
+            _, _, future, _ = self.queue.get_nowait()
+            future.cancel()
+            self.queue.task_done()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from setting import LIST_ADS_SLEEP, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, BINANCE_WEIGHT_LIMIT
+
+# Share of the scanned ads changing per scan at which the interval reaches its minimum
+FAST_CHANGE_RATE = 0.2
+# Weight of the latest scan in the smoothed change rate
+CHANGE_SMOOTHING = 0.3
+# Used weight share from which scans slow down, reaching the maximum interval at the limit
+WEIGHT_SOFT_LIMIT = 0.6
+# Pauses when a 429/418 comes without Retry-After; doubled for every throttle in a row
+THROTTLE_BACKOFF = 5
+BAN_BACKOFF = 120
+
+# Binance reports the used request weight of the current minute in one of these
+WEIGHT_HEADERS = ("x-mbx-used-weight-1m", "x-sapi-used-ip-weight-1m")
+
+
+class PollScheduler:
+    """Fixed-rate ticks for the scan loop, with the rate adapted to the market and to Binance's limits.
+
+    `wait` returns at `interval` steps on the monotonic clock, measured from
+    when the previous tick was due, so the work done between ticks doesn't
+    stretch the period. A loop that falls more than a whole interval behind
+    skips the missed ticks instead of bursting. The interval is:
+
+    - `base` (LIST_ADS_SLEEP) when the ad book is quiet, shrinking towards
+      `min_interval` as more of the scanned ads change per scan;
+    - pushed up towards `max_interval` as the used weight reported in the
+      response headers nears `weight_limit`;
+    - paused for Retry-After (or a doubling backoff) on 429, and on 418,
+      which means the IP is banned, after which scans stay at `max_interval`
+      until the headers show room again.
+    """
+
+    def __init__(
+        self,
+        base=LIST_ADS_SLEEP,
+        min_interval=POLL_MIN_INTERVAL,
+        max_interval=POLL_MAX_INTERVAL,
+        weight_limit=BINANCE_WEIGHT_LIMIT,
+        clock=time.monotonic,
+    ):
+        self.base = base
+        self.min_interval = min(min_interval, base)
+        self.max_interval = max(max_interval, base)
+        self.weight_limit = weight_limit
+        self.clock = clock
+        self.change_rate = 0.0
+        self.used_weight = 0
+        self.weight_share = 0.0
+        self.last_due = None
+        self.throttled_until = 0.0
+        self.throttles = 0
+        self.ticks = 0
+        self.skipped = 0
+        # Called with the pause whenever a response of ours throttles us, to share it with other processes
+        self.on_throttle = None
+
+    @property
+    def interval(self):
+        fast = min(1.0, self.change_rate / FAST_CHANGE_RATE)
+        interval = self.base - (self.base - self.min_interval) * fast
+        if self.weight_share > WEIGHT_SOFT_LIMIT:
+            pressure = min(1.0, (self.weight_share - WEIGHT_SOFT_LIMIT) / (1 - WEIGHT_SOFT_LIMIT))
+            interval = max(interval, self.base + (self.max_interval - self.base) * pressure)
+        return interval
+
+    async def wait(self):
+        """Sleeps until the next tick is due."""
+        now = self.clock()
+        due = now if self.last_due is None else self.last_due + self.interval
+        if due < now - self.interval:
+            self.skipped += 1
+            due = now
+        due = max(due, self.throttled_until)
+        if due > now:
+            await asyncio.sleep(due - now)
+        self.last_due = due
+        self.ticks += 1
+
+    async def throttle(self):
+        """Waits out a 429/418 pause; every request should, or the ban gets longer."""
+        delay = self.throttled_until - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def observe_changes(self, changed, scanned):
+        """Feeds in how many of the `scanned` ads were new or changed."""
+        if scanned:
+            self.change_rate += CHANGE_SMOOTHING * (changed / scanned - self.change_rate)
+
+    def observe_response(self, status_code, headers):
+        """Feeds in the status and headers of any Binance response."""
+        used = [int(headers[name]) for name in WEIGHT_HEADERS if headers.get(name, "").isdigit()]
+        if used:
+            self.used_weight = max(used)
+            self.weight_share = self.used_weight / self.weight_limit if self.weight_limit else 0.0
+        if status_code not in (418, 429):
+            if status_code < 400:
+                self.throttles = 0
+            return
+
+        self.throttles += 1
+        retry_after = headers.get("retry-after", "")
+        if retry_after.isdigit():
+            pause = int(retry_after)
+        else:
+            pause = (BAN_BACKOFF if status_code == 418 else THROTTLE_BACKOFF) * 2 ** (self.throttles - 1)
+        self.pause(pause)
+        print(f"Binance answered {status_code}; pausing requests for {pause}s")
+        if self.on_throttle:
+            self.on_throttle(pause)
+
+    def pause(self, seconds):
+        """Holds every request for `seconds`, e.g. when another process was throttled on the same IP."""
+        self.throttled_until = max(self.throttled_until, self.clock() + seconds)
+        # Stay slow after a throttle until the headers show room again
+        self.weight_share = max(self.weight_share, 1.0)
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "change_rate": self.change_rate,
+            "used_weight": self.used_weight,
+            "throttled_for": max(0.0, self.throttled_until - self.clock()),
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,135 @@
+import bisect
+
+
+class AdFilter:
+    """Parsed EXTRA_FILTER: price and limit bounds plus the error codes worth retrying."""
+
+    __slots__ = ("price", "minimum_limit", "error_codes")
+
+    def __init__(self, price=None, minimum_limit=None, error_codes=None):
+        self.price = price
+        self.minimum_limit = minimum_limit
+        # None, or the set of apiResponseCode values an ad may still carry
+        self.error_codes = error_codes
+
+    @classmethod
+    def from_dict(cls, extra_filter):
+        """Validates an EXTRA_FILTER dict. Raises ValueError on bad values."""
+        extra_filter = extra_filter or {}
+
+        def number(key):
+            value = extra_filter.get(key)
+            if value is None:
+                return None
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+
+        error_codes = extra_filter.get("error_codes")
+        if error_codes:
+            if isinstance(error_codes, str):
+                error_codes = [error_codes]
+            elif not isinstance(error_codes, list):
+                raise ValueError("error_codes must be string or list")
+            error_codes = frozenset(str(code) for code in error_codes)
+        else:
+            error_codes = None
+
+        return cls(price=number("price"), minimum_limit=number("minimum_limit"), error_codes=error_codes)
+
+    @classmethod
+    def of(cls, extra_filter):
+        """Accepts an AdFilter or an EXTRA_FILTER dict."""
+        return extra_filter if isinstance(extra_filter, cls) else cls.from_dict(extra_filter)
+
+    def to_dict(self):
+        extra_filter = {}
+        if self.price is not None:
+            extra_filter["price"] = self.price
+        if self.minimum_limit is not None:
+            extra_filter["minimum_limit"] = self.minimum_limit
+        if self.error_codes is not None:
+            extra_filter["error_codes"] = sorted(self.error_codes)
+        return extra_filter
+
+
+def match_extra_filter(ad, extra_filter):
+    """In-memory twin of the `get_filtered_ads` WHERE clause for a single `AdRow`."""
+    extra_filter = AdFilter.of(extra_filter)
+    if extra_filter.price is not None and not ad.price < extra_filter.price:
+        return False
+    if extra_filter.minimum_limit is not None and not ad.maxSingleTransAmount >= extra_filter.minimum_limit:
+        return False
+    error_codes = extra_filter.error_codes
+    if error_codes is not None and ad.apiResponseCode is not None and ad.apiResponseCode not in error_codes:
+        return False
+    return True
+
+
+class AdBook:
+    """In-memory copy of the ads table as `AdRow`s keyed by advNo and ordered by price."""
+
+    def __init__(self):
+        self.ads = {}
+        # Sorted (price, advNo) pairs, cheapest first
+        self._by_price = []
+
+    def __len__(self):
+        return len(self.ads)
+
+    def __contains__(self, adv_no):
+        return adv_no in self.ads
+
+    def get(self, adv_no):
+        return self.ads.get(adv_no)
+
+    def upsert(self, ad):
+        """Adds an ad row or replaces the stored version of it."""
+        adv_no = ad.advNo
+        self.remove(adv_no)
+        self.ads[adv_no] = ad
+        bisect.insort(self._by_price, (ad.price, adv_no))
+
+    def remove(self, adv_no):
+        """Drops an ad from the book. Returns the removed row, if any."""
+        ad = self.ads.pop(adv_no, None)
+        if ad is not None:
+            index = bisect.bisect_left(self._by_price, (ad.price, adv_no))
+            del self._by_price[index]
+        return ad
+
+    def set_response(self, adv_no, response_code, response_message):
+        """Records the last placeOrder response of an ad."""
+        ad = self.ads.get(adv_no)
+        if ad is not None:
+            # Stored as TEXT in SQLite, so compare as strings here too
+            ad.apiResponseCode = str(response_code) if response_code is not None else None
+            ad.apiResponseMessage = response_message
+
+    def clear(self):
+        self.ads.clear()
+        self._by_price.clear()
+
+    def filter(self, extra_filter, market=None):
+        """Ads matching `extra_filter` (and `market` when given), cheapest first."""
+        extra_filter = AdFilter.of(extra_filter)
+        end = len(self._by_price)
+        if extra_filter.price is not None:
+            # Everything before (price,) is strictly cheaper than the limit
+            end = bisect.bisect_left(self._by_price, (extra_filter.price,))
+
+        minimum_limit = extra_filter.minimum_limit
+        error_codes = extra_filter.error_codes
+
+        ads = []
+        for _, adv_no in self._by_price[:end]:
+            ad = self.ads[adv_no]
+            if market is not None and ad.market != market:
+                continue
+            if minimum_limit is not None and not ad.maxSingleTransAmount >= minimum_limit:
+                continue
+            if error_codes is not None and ad.apiResponseCode is not None and ad.apiResponseCode not in error_codes:
+                continue
+            ads.append(ad)
+        return ads
@@ -0,0 +1,45 @@
+import asyncio
+from setting import ADS_RETENTION_SECONDS, ADS_COMPACT_INTERVAL, ADS_VACUUM_PAGES
+from src.db.async_db import AsyncDatabase
+
+
+class AdCompactor:
+    """Background task that keeps the ads table bounded on long-running deployments.
+
+    Every `interval` seconds it persists last-seen times, moves ads not seen for
+    `retention` seconds to ads_archive and runs an incremental vacuum.
+    """
+
+    def __init__(self, db: AsyncDatabase, retention=ADS_RETENTION_SECONDS, interval=ADS_COMPACT_INTERVAL, vacuum_pages=ADS_VACUUM_PAGES):
+        self.db = db
+        self.retention = retention
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.task = None
+        self.last_expired = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"An error occurred while compacting ads: {e}")
+
+    async def compact(self, retention=None):
+        """Runs one compaction now. Returns the number of expired ads."""
+        retention = self.retention if retention is None else retention
+        self.last_expired = await self.db.expire_ads(retention, vacuum_pages=self.vacuum_pages)
+        if self.last_expired:
+            print(f"Archived {self.last_expired} ads not seen in the last {retention} seconds.")
+        return self.last_expired
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -0,0 +1,52 @@
+import json
+
+
+class AdRow:
+    """One ad of the ads table with just the columns the order path reads.
+
+    The raw `data` payload is kept as it arrived (a dict from the scan, or the
+    JSON text when read back from SQLite) and only decoded when accessed.
+    """
+
+    __slots__ = (
+        "advNo", "price", "surplusAmount", "minSingleTransAmount", "maxSingleTransAmount",
+        "tradeType", "market", "apiResponseCode", "apiResponseMessage", "_data", "_raw",
+    )
+
+    # Columns to SELECT when building rows from SQLite, in constructor order
+    COLUMNS = (
+        "advNo", "price", "surplusAmount", "minSingleTransAmount", "maxSingleTransAmount",
+        "tradeType", "market", "apiResponseCode", "apiResponseMessage",
+    )
+
+    def __init__(self, advNo, price, surplusAmount, minSingleTransAmount, maxSingleTransAmount,
+                 tradeType=None, market=None, apiResponseCode=None, apiResponseMessage=None, data=None, raw=None):
+        self.advNo = advNo
+        self.price = price
+        self.surplusAmount = surplusAmount
+        self.minSingleTransAmount = minSingleTransAmount
+        self.maxSingleTransAmount = maxSingleTransAmount
+        self.tradeType = tradeType
+        self.market = market
+        self.apiResponseCode = apiResponseCode
+        self.apiResponseMessage = apiResponseMessage
+        self._data = data
+        self._raw = raw
+
+    @property
+    def data(self):
+        """The full ad payload, decoded from JSON on first access."""
+        if self._data is None and self._raw is not None:
+            self._data = json.loads(self._raw)
+            self._raw = None
+        return self._data
+
+    def __repr__(self):
+        return f"AdRow(advNo={self.advNo!r}, price={self.price!r}, market={self.market!r})"
+
+    def to_dict(self, include_data=False):
+        """Plain dict of the row, e.g. for JSON in notifications."""
+        row = {column: getattr(self, column) for column in self.COLUMNS}
+        if include_data:
+            row["data"] = self.data
+        return row
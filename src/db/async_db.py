@@ -0,0 +1,212 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from setting import DB_READ_CONNECTIONS, DB_WRITE_BATCH
+from src.db.init import Database
+from src.helpers.metrics import INSERT_AD_SECONDS, ADS_CHANGED, FILTER_ADS_SECONDS
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class DatabaseWriter(threading.Thread):
+    """Single thread that owns the write connection and commits queued jobs in batches."""
+
+    def __init__(self, conn, batch_size=DB_WRITE_BATCH):
+        super().__init__(name="db-writer", daemon=True)
+        self.conn = conn
+        self.batch_size = batch_size
+        self.jobs = queue.Queue()
+
+    def submit(self, fn, *args):
+        """Queues `fn(*args)` for the writer thread. Returns an asyncio future."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.jobs.put((fn, args, loop, future))
+        return future
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.jobs.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            results = []
+            for job in batch:
+                if job is None:
+                    running = False
+                    continue
+                fn, args, loop, future = job
+                try:
+                    results.append((loop, future, fn(*args), None))
+                except Exception as e:
+                    results.append((loop, future, None, e))
+
+            # One commit for the whole batch
+            try:
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                results = [(loop, future, None, e) for loop, future, _, _ in results]
+
+            for loop, future, result, error in results:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    def stop(self):
+        self.jobs.put(None)
+        self.join()
+
+
+class AsyncDatabase:
+    """Awaitable facade over `Database` for use from the event loop.
+
+    The database runs in WAL mode. Every write goes to one writer thread that
+    commits in batches, reads go to a small pool of read-only connections, and
+    the in-memory ad book is only ever touched from the event loop thread.
+    """
+
+    def __init__(self, db: Database, read_connections=DB_READ_CONNECTIONS, batch_size=DB_WRITE_BATCH):
+        self.db = db
+        self.db.conn.execute("PRAGMA journal_mode=WAL")
+        self.db.conn.execute("PRAGMA synchronous=NORMAL")
+        self.db.conn.commit()
+
+        self.writer = DatabaseWriter(db.conn, batch_size)
+        self.writer.start()
+        self._pending_writes = set()
+
+        # An in-memory database can't be opened twice, so its reads go to the writer
+        self._local = threading.local()
+        self._reader_conns = []
+        self.readers = None
+        if db.db_name != ":memory:" and read_connections > 0:
+            self.readers = ThreadPoolExecutor(max_workers=read_connections, thread_name_prefix="db-reader")
+
+    def _reader_cursor(self):
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(f"file:{self.db.db_name}?mode=ro", uri=True, check_same_thread=False)
+            self._reader_conns.append(self._local.conn)
+        return self._local.conn.cursor()
+
+    async def _read(self, fn, *args):
+        """Runs `fn(cursor, *args)` on a read-only connection."""
+        if self.readers is None:
+            return await self.writer.submit(lambda: fn(self.db.conn.cursor(), *args))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, lambda: fn(self._reader_cursor(), *args))
+
+    def _write_behind(self, fn, *args, on_error=None):
+        """Queues a write without waiting for it; `flush` waits for all of them."""
+        future = self.writer.submit(fn, *args)
+        self._pending_writes.add(future)
+
+        def done(future):
+            self._pending_writes.discard(future)
+            if not future.cancelled() and future.exception() is not None:
+                print(f"An error occurred while writing to the database: {future.exception()}")
+                if on_error:
+                    on_error()
+
+        future.add_done_callback(done)
+        return future
+
+    async def flush(self):
+        """Waits until every queued write has been committed."""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    # Users
+
+    async def get_user(self, user_id):
+        return await self._read(Database.read_user, user_id)
+
+    async def insert_user(self, user_id, first_name, last_name, extra_info=None):
+        await self.writer.submit(self.db.insert_user, user_id, first_name, last_name, extra_info)
+
+    async def insert_or_update_user(self, user_id, first_name, last_name, extra_info=None):
+        await self.writer.submit(self.db.insert_or_update_user, user_id, first_name, last_name, extra_info)
+
+    async def update_bot_config(self, user_id, bot_config):
+        await self.writer.submit(self.db.update_bot_config, user_id, bot_config)
+
+    # Ads
+
+    async def insert_ad(self, ads, market=None):
+        """Updates the ad book right away and persists the changed ads behind it."""
+        with INSERT_AD_SECONDS.time():
+            changed_ads, ads_data = self.db.stage_ads(ads, market)
+        ADS_CHANGED.inc(len(changed_ads))
+        if ads_data:
+            adv_nos = [row[0] for row in ads_data]
+            self._write_behind(self.db.write_ads, ads_data, on_error=lambda: self.db.forget_digests(adv_nos))
+        return changed_ads
+
+    async def update_ads_response(self, adv_no, response_code, response_message):
+        self.db.ad_book.set_response(adv_no, response_code, response_message)
+        self._write_behind(self.db.write_ads_response, adv_no, response_code, response_message)
+
+    async def delete_all_ads(self):
+        self.db.ad_digests.clear()
+        self.db.ad_book.clear()
+        self.db.last_seen.clear()
+        self.db.take_last_seen()
+        await self.writer.submit(self.db.write_delete_all_ads)
+        print("All ads have been deleted.")
+
+    async def expire_ads(self, max_age, vacuum_pages=0):
+        """Drops stale ads from memory now, then archives them and vacuums on the writer thread."""
+        expired = self.db.stage_expired_ads(max_age)
+        last_seen = self.db.take_last_seen()
+
+        def write():
+            self.db.write_last_seen(last_seen)
+            self.db.write_expired_ads(expired)
+            self.db.conn.commit()
+            self.db.incremental_vacuum(vacuum_pages)
+
+        await self.writer.submit(write)
+        return len(expired)
+
+    # Notifications
+
+    async def get_notifications(self):
+        return await self._read(Database.read_notifications)
+
+    def queue_notification(self, notification):
+        self._write_behind(
+            self.db.write_notification, notification.id, notification.chat_id, notification.text,
+            notification.need_pin, notification.attempts, notification.created_at
+        )
+
+    def update_notification_attempts(self, notification_ids, attempts):
+        self._write_behind(self.db.write_notification_attempts, notification_ids, attempts)
+
+    def delete_notifications(self, notification_ids):
+        self._write_behind(self.db.write_delete_notifications, notification_ids)
+
+    def get_filtered_ads(self, extra_filter, market=None):
+        """Answered from the in-memory ad book, so there is nothing to wait for."""
+        with FILTER_ADS_SECONDS.time():
+            return self.db.get_filtered_ads(extra_filter, market=market)
+
+    async def close(self):
+        """Flushes pending writes, stops the writer thread and closes every connection."""
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(None, self.writer.stop)
+        if self.readers is not None:
+            self.readers.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self.db.close()
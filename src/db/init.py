@@ -1,5 +1,16 @@
 import sqlite3
 import json
+import hashlib
+import time
+from src.db.ad_book import AdBook
+from src.db.ad_row import AdRow
+from src.db.migrations import migrate
+
+
+def ad_digest(data, market=None):
+    """Compact content digest of a serialized ad and the market it was scanned from."""
+    return hashlib.blake2b(f"{market}|{data}".encode(), digest_size=8).hexdigest()
+
 
 class Database:
     def __init__(self, db_name="bot_data.db"):
@@ -10,33 +21,31 @@ class Database:
         self.initialize_db()
 
     def initialize_db(self):
-        """Creates a table if it doesn't already exist."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                first_name TEXT,
-                last_name TEXT,
-                bot_config TEXT  -- Column for storing JSON data
-            )
-        """)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ads (
-                advNo TEXT  PRIMARY KEY,             
-                price REAL NOT NULL,                
-                surplusAmount REAL NOT NULL,         
-                minSingleTransAmount REAL NOT NULL,  
-                maxSingleTransAmount REAL NOT NULL,   
-                tradeType TEXT NOT NULL,             
-                minSingleTransQuantity REAL NOT NULL,  
-                maxSingleTransQuantity REAL NOT NULL,
-                apiResponseCode TEXT,
-                apiResponseMessage TEXT,
-                data TEXT,  -- Column for storing JSON data
-                createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- auto set on insert
-                updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-         """)
-        self.conn.commit()
+        """Brings the schema up to date and loads the in-memory state."""
+        migrate(self.conn)
+
+        # advNo -> content digest of the stored version of each ad
+        self.cursor.execute("SELECT advNo, dataHash FROM ads WHERE dataHash IS NOT NULL")
+        self.ad_digests = dict(self.cursor.fetchall())
+
+        # Filter queries are answered from memory; SQLite is the write-behind store
+        self.ad_book = AdBook()
+        self.load_ad_book()
+
+        # advNo -> unix time the ad was last returned by a scan. Unchanged ads
+        # are only touched here; `write_last_seen` flushes them in batches.
+        self.cursor.execute("SELECT advNo, lastSeenAt FROM ads")
+        now = time.time()
+        self.last_seen = {adv_no: last_seen or now for adv_no, last_seen in self.cursor.fetchall()}
+        self._seen_since_flush = {}
+
+    def load_ad_book(self):
+        """Rebuilds the in-memory ad book from the ads table."""
+        self.ad_book.clear()
+        # The data payload is left in SQLite; the order path doesn't read it
+        self.cursor.execute(f"SELECT {', '.join(AdRow.COLUMNS)} FROM ads")
+        for row in self.cursor.fetchall():
+            self.ad_book.upsert(AdRow(*row))
 
     def insert_user(self, user_id, first_name, last_name, extra_info=None):
         """Inserts a new user into the users table along with JSON data."""
@@ -75,10 +84,15 @@ class Database:
 
     def get_user(self, user_id):
         """Fetches a user and their JSON data from the users table."""
-        self.cursor.execute('''
+        return self.read_user(self.cursor, user_id)
+
+    @staticmethod
+    def read_user(cursor, user_id):
+        """Fetches a user with the given cursor, so read-only connections can share it."""
+        cursor.execute('''
             SELECT id, first_name, last_name, bot_config FROM users WHERE id = ?
         ''', (user_id,))
-        row = self.cursor.fetchone()
+        row = cursor.fetchone()
         if row:
             user_data = {
                 'id': row[0],
@@ -89,109 +103,133 @@ class Database:
             return user_data
         return None
     
-    def insert_ad(self, ads):
-        """Insert a single ad record into the database."""
-        try:
-            ads_data = []
-            for ad in ads:
-                adv = ad.get('adv', {})
-        
-                # Extract relevant fields
-                adv_no = adv.get('advNo')
-                price = float(adv.get('price', 0))
-                surplus_amount = float(adv.get('surplusAmount', 0))
-                min_single_trans_amount = float(adv.get('minSingleTransAmount', 0))
-                max_single_trans_amount = float(adv.get('maxSingleTransAmount', 0))
-                trade_type = adv.get('tradeType')
-                min_single_trans_quantity = float(adv.get('minSingleTransQuantity', 0))
-                max_single_trans_quantity = float(adv.get('maxSingleTransQuantity', 0))
-                api_response_code = None  # Placeholder for API response code
-                api_response_message = None  # Placeholder for API response message
-                data = json.dumps(ad)  # Serialize the entire ad as JSON
-
-                # Add to the list of data to insert
-                ads_data.append((
-                    adv_no, price, surplus_amount, min_single_trans_amount, max_single_trans_amount,
-                    trade_type, min_single_trans_quantity, max_single_trans_quantity, data
-                ))
-
-            self.cursor.executemany("""
-                INSERT INTO ads (
-                    advNo, price, surplusAmount, minSingleTransAmount, maxSingleTransAmount,
-                    tradeType, minSingleTransQuantity, maxSingleTransQuantity, data
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(advNo)
-                DO UPDATE SET
-                    price = CASE 
-                            WHEN ads.data != excluded.data THEN excluded.price
-                            ELSE ads.price
-                            END,
-                    surplusAmount = CASE 
-                                    WHEN ads.data != excluded.data THEN excluded.surplusAmount
-                                    ELSE ads.surplusAmount
-                                    END,
-                    minSingleTransAmount = CASE 
-                                        WHEN ads.data != excluded.data THEN excluded.minSingleTransAmount
-                                        ELSE ads.minSingleTransAmount
-                                        END,
-                    maxSingleTransAmount = CASE 
-                                        WHEN ads.data != excluded.data THEN excluded.maxSingleTransAmount
-                                        ELSE ads.maxSingleTransAmount
-                                        END,
-                    tradeType = CASE 
-                                WHEN ads.data != excluded.data THEN excluded.tradeType
-                                ELSE ads.tradeType
-                                END,
-                    minSingleTransQuantity = CASE 
-                                            WHEN ads.data != excluded.data THEN excluded.minSingleTransQuantity
-                                            ELSE ads.minSingleTransQuantity
-                                            END,
-                    maxSingleTransQuantity = CASE 
-                                            WHEN ads.data != excluded.data THEN excluded.maxSingleTransQuantity
-                                            ELSE ads.maxSingleTransQuantity
-                                            END,
-                    data = CASE 
-                            WHEN ads.data != excluded.data THEN excluded.data
-                            ELSE ads.data
-                            END,
-                    apiResponseCode = CASE 
-                                    WHEN ads.data != excluded.data THEN NULL
-                                    ELSE ads.apiResponseCode
-                                    END,
-                    apiResponseMessage = CASE 
-                                        WHEN ads.data != excluded.data THEN NULL
-                                        ELSE ads.apiResponseMessage
-                                        END,
-                    updatedAt = CURRENT_TIMESTAMP  -- Update timestamp when any field changes
-                """, ads_data)
+    def insert_ad(self, ads, market=None):
+        """Insert a batch of ad records scanned from `market` into the database.
 
+        Ads whose content digest matches the one stored for their advNo are
+        skipped before reaching SQLite; only new or changed ads are written.
+        Returns the new or changed ads as `AdRow`s.
+        """
+        changed_ads, ads_data = self.stage_ads(ads, market)
+        if not ads_data:
+            return []
+
+        try:
+            self.write_ads(ads_data)
             self.conn.commit()
+            return changed_ads
         except sqlite3.Error as e:
             print(f"An error occurred while inserting ads: {e}")
+            self.forget_digests([row[0] for row in ads_data])
+            return []
+
+    def stage_ads(self, ads, market=None):
+        """In-memory half of `insert_ad`: drops unchanged ads and updates the ad book.
+
+        Returns the changed ad rows and the parameters `write_ads` needs to persist them.
+        """
+        ads_data = []
+        changed_ads = []
+        now = time.time()
+        for ad in ads:
+            adv = ad.get('adv', {})
+            adv_no = adv.get('advNo')
+            self.last_seen[adv_no] = now
+            data = json.dumps(ad, separators=(',', ':'))  # Serialize the entire ad as JSON
+            digest = ad_digest(data, market)
+            if self.ad_digests.get(adv_no) == digest:
+                self._seen_since_flush[adv_no] = now
+                continue
+        
+            # Extract relevant fields
+            price = float(adv.get('price', 0))
+            surplus_amount = float(adv.get('surplusAmount', 0))
+            min_single_trans_amount = float(adv.get('minSingleTransAmount', 0))
+            max_single_trans_amount = float(adv.get('maxSingleTransAmount', 0))
+            trade_type = adv.get('tradeType')
+            min_single_trans_quantity = float(adv.get('minSingleTransQuantity', 0))
+            max_single_trans_quantity = float(adv.get('maxSingleTransQuantity', 0))
+
+            self.ad_digests[adv_no] = digest
+            self._seen_since_flush.pop(adv_no, None)
+            changed_ad = AdRow(
+                adv_no, price, surplus_amount, min_single_trans_amount, max_single_trans_amount,
+                tradeType=trade_type, market=market, data=ad
+            )
+            self.ad_book.upsert(changed_ad)
+            changed_ads.append(changed_ad)
+
+            # Add to the list of data to insert
+            ads_data.append((
+                adv_no, price, surplus_amount, min_single_trans_amount, max_single_trans_amount,
+                trade_type, min_single_trans_quantity, max_single_trans_quantity, data, digest, market, now
+            ))
+
+        return changed_ads, ads_data
+
+    def forget_digests(self, adv_nos):
+        """Makes the next `insert_ad` write these ads again, e.g. after a failed write."""
+        for adv_no in adv_nos:
+            self.ad_digests.pop(adv_no, None)
+
+    def write_ads(self, ads_data):
+        """SQLite half of `insert_ad`. Does not commit."""
+        # Only changed rows get here, so every column is overwritten and a
+        # previous API response no longer applies to the new version of the ad
+        self.cursor.executemany("""
+            INSERT INTO ads (
+                advNo, price, surplusAmount, minSingleTransAmount, maxSingleTransAmount,
+                tradeType, minSingleTransQuantity, maxSingleTransQuantity, data, dataHash, market, lastSeenAt
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(advNo)
+            DO UPDATE SET
+                price = excluded.price,
+                surplusAmount = excluded.surplusAmount,
+                minSingleTransAmount = excluded.minSingleTransAmount,
+                maxSingleTransAmount = excluded.maxSingleTransAmount,
+                tradeType = excluded.tradeType,
+                minSingleTransQuantity = excluded.minSingleTransQuantity,
+                maxSingleTransQuantity = excluded.maxSingleTransQuantity,
+                data = excluded.data,
+                dataHash = excluded.dataHash,
+                market = excluded.market,
+                lastSeenAt = excluded.lastSeenAt,
+                apiResponseCode = NULL,
+                apiResponseMessage = NULL,
+                updatedAt = CURRENT_TIMESTAMP
+            """, ads_data)
     
     def update_ads_response(self, adv_no, response_code, response_message):
         """Update the API response for a specific ad in the database."""
+        self.ad_book.set_response(adv_no, response_code, response_message)
         try:
-            # Execute the update query for the given advNo
-            self.cursor.execute("""
-                UPDATE ads
-                SET apiResponseCode = ?,
-                    apiResponseMessage = ?,
-                    updatedAt = CURRENT_TIMESTAMP
-                WHERE advNo = ?
-            """, (response_code, response_message, adv_no))
+            self.write_ads_response(adv_no, response_code, response_message)
             
             # Commit the changes to the database
             self.conn.commit()
         except sqlite3.Error as e:
             print(f"An error occurred while updating ad response: {e}")
 
+    def write_ads_response(self, adv_no, response_code, response_message):
+        """SQLite half of `update_ads_response`. Does not commit."""
+        # Execute the update query for the given advNo
+        self.cursor.execute("""
+            UPDATE ads
+            SET apiResponseCode = ?,
+                apiResponseMessage = ?,
+                updatedAt = CURRENT_TIMESTAMP
+            WHERE advNo = ?
+        """, (response_code, response_message, adv_no))
+
     def delete_all_ads(self):
         """Delete all ads from the database."""
+        self.ad_digests.clear()
+        self.ad_book.clear()
+        self.last_seen.clear()
+        self._seen_since_flush.clear()
         try:
-            # Execute the delete query
-            self.cursor.execute("DELETE FROM ads")
+            self.write_delete_all_ads()
             
             # Commit the changes to the database
             self.conn.commit()
@@ -200,54 +238,102 @@ class Database:
         except sqlite3.Error as e:
             print(f"An error occurred while deleting ads: {e}")
 
+    def write_delete_all_ads(self):
+        """SQLite half of `delete_all_ads`. Does not commit."""
+        # Execute the delete query
+        self.cursor.execute("DELETE FROM ads")
 
-    def get_filtered_ads(self, extra_filter):
-        # Construct the SQL query with dynamic filtering
-        query = "SELECT * FROM ads WHERE 1=1"
-        params = []
+    def expire_ads(self, max_age, vacuum_pages=0):
+        """Archive and delete ads not seen by a scan for `max_age` seconds.
 
-        # Add filters to the query
-        if extra_filter.get("price") is not None:
-            query += " AND price < ?"
-            params.append(extra_filter["price"])
-        if extra_filter.get("minimum_limit") is not None:
-            query += " AND maxSingleTransAmount >= ?"
-            params.append(extra_filter["minimum_limit"])
+        Also persists pending last-seen times and gives up to `vacuum_pages`
+        free pages back to the file system. Returns the number of expired ads.
+        """
+        expired = self.stage_expired_ads(max_age)
+        last_seen = self.take_last_seen()
+        try:
+            self.write_last_seen(last_seen)
+            self.write_expired_ads(expired)
+            self.conn.commit()
+            self.incremental_vacuum(vacuum_pages)
+        except sqlite3.Error as e:
+            print(f"An error occurred while expiring ads: {e}")
+        return len(expired)
 
-        # if extra_filter.get("maximum_limit") is not None:
-        #     query += " AND minSingleTransAmount <= ?"
-        #     params.append(extra_filter["maximum_limit"])
-        
-        if extra_filter.get("error_codes"):
-            error_codes = extra_filter["error_codes"]
-            if isinstance(error_codes, str):
-                error_codes = [error_codes]
-            elif not isinstance(error_codes, list):
-                raise ValueError("error_codes must be string or list")
-                
-            placeholders = ','.join('?' * len(error_codes))
-            query += f" AND (apiResponseCode IN ({placeholders}) OR apiResponseCode IS NULL)"
-            params.extend(error_codes)
-
-        query += " ORDER BY createdAt DESC"
-
-        # Execute the query
-        self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
-
-        # Get column names
-        column_names = [description[0] for description in self.cursor.description]
-
-        # Convert rows to dictionaries
-        ads = []
-        for row in rows:
-            ad = dict(zip(column_names, row))
-            # Deserialize the JSON data column
-            if 'data' in ad and ad['data']:
-                ad['data'] = json.loads(ad['data'])
-            ads.append(ad)
-
-        return ads
+    def stage_expired_ads(self, max_age):
+        """In-memory half of `expire_ads`: drops stale ads from the ad book. Returns their advNos."""
+        cutoff = time.time() - max_age
+        expired = [adv_no for adv_no, last_seen in self.last_seen.items() if last_seen < cutoff]
+        for adv_no in expired:
+            self.last_seen.pop(adv_no, None)
+            self._seen_since_flush.pop(adv_no, None)
+            self.ad_digests.pop(adv_no, None)
+            self.ad_book.remove(adv_no)
+        return expired
+
+    def take_last_seen(self):
+        """Returns and resets the last-seen times not yet written to SQLite."""
+        last_seen, self._seen_since_flush = self._seen_since_flush, {}
+        return last_seen
+
+    def write_last_seen(self, last_seen):
+        """Persists last-seen times of unchanged ads. Does not commit."""
+        self.cursor.executemany(
+            "UPDATE ads SET lastSeenAt = ? WHERE advNo = ?",
+            [(seen_at, adv_no) for adv_no, seen_at in last_seen.items()]
+        )
+
+    def write_expired_ads(self, adv_nos):
+        """Moves the given ads to ads_archive. Does not commit."""
+        archived_at = time.time()
+        columns = (
+            "advNo, price, surplusAmount, minSingleTransAmount, maxSingleTransAmount, tradeType, "
+            "minSingleTransQuantity, maxSingleTransQuantity, apiResponseCode, apiResponseMessage, "
+            "data, market, createdAt, updatedAt, lastSeenAt"
+        )
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(adv_nos), 500):
+            chunk = adv_nos[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            self.cursor.execute(
+                f"INSERT INTO ads_archive ({columns}, archivedAt) SELECT {columns}, ? FROM ads WHERE advNo IN ({placeholders})",
+                [archived_at, *chunk]
+            )
+            self.cursor.execute(f"DELETE FROM ads WHERE advNo IN ({placeholders})", chunk)
+
+    def incremental_vacuum(self, pages):
+        """Releases up to `pages` free pages of the database file."""
+        if pages > 0:
+            self.cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+            self.cursor.fetchall()
+
+    def write_notification(self, notification_id, chat_id, text, need_pin, attempts, created_at):
+        """Stores an undelivered notification. Does not commit."""
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO notifications (id, chatId, text, needPin, attempts, createdAt) VALUES (?, ?, ?, ?, ?, ?)",
+            (notification_id, str(chat_id), text, int(need_pin), attempts, created_at)
+        )
+
+    def write_notification_attempts(self, notification_ids, attempts):
+        """Records failed delivery attempts. Does not commit."""
+        self.cursor.executemany(
+            "UPDATE notifications SET attempts = ? WHERE id = ?",
+            [(attempts, notification_id) for notification_id in notification_ids]
+        )
+
+    def write_delete_notifications(self, notification_ids):
+        """Forgets delivered or dropped notifications. Does not commit."""
+        self.cursor.executemany("DELETE FROM notifications WHERE id = ?", [(notification_id,) for notification_id in notification_ids])
+
+    @staticmethod
+    def read_notifications(cursor):
+        """Undelivered notifications, oldest first."""
+        cursor.execute("SELECT id, chatId, text, needPin, attempts, createdAt FROM notifications ORDER BY createdAt")
+        return cursor.fetchall()
+
+    def get_filtered_ads(self, extra_filter, market=None):
+        """Ads matching `extra_filter`, cheapest first, answered from the in-memory ad book."""
+        return self.ad_book.filter(extra_filter, market=market)
     
 
     def insert_order_response(self, order_response):
@@ -273,37 +359,6 @@ class Database:
         ))
         self.connection.commit()
 
-    def list_ads_with_filters(self, **filters):
-        query = "SELECT * FROM ads WHERE 1=1"
-        params = []
-
-        # Apply filters
-        if "price_max" in filters:
-            query += " AND price <= ?"
-            params.append(filters["price_max"])
-
-        # Execute query
-        query += " ORDER BY timestamp DESC"
-        self.cursor.execute(query, params)
-        ads = self.cursor.fetchall()
-        return [
-            {
-                "id": row[0],
-                "adv_order_number": row[1],
-                "price": row[2],
-                "surplus_amount": row[3],
-                "min_single_trans_amount": row[4],
-                "max_single_trans_amount": row[5],
-                "nick_name": row[6],
-                "user_no": row[7],
-                "trade_methods": row[8],
-                "timestamp": row[9]
-            }
-            for row in ads
-        ]
-    
-
-
     def close(self):
         """Closes the database connection."""
         self.conn.close()
@@ -0,0 +1,121 @@
+import sqlite3
+
+
+def add_column(cursor, table, column, definition):
+    """Adds a column unless a table created by a newer schema already has it."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def initial_schema(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            bot_config TEXT  -- Column for storing JSON data
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ads (
+            advNo TEXT  PRIMARY KEY,             
+            price REAL NOT NULL,                
+            surplusAmount REAL NOT NULL,         
+            minSingleTransAmount REAL NOT NULL,  
+            maxSingleTransAmount REAL NOT NULL,   
+            tradeType TEXT NOT NULL,             
+            minSingleTransQuantity REAL NOT NULL,  
+            maxSingleTransQuantity REAL NOT NULL,
+            apiResponseCode TEXT,
+            apiResponseMessage TEXT,
+            data TEXT,  -- Column for storing JSON data
+            createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- auto set on insert
+            updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def ads_market_and_digest(cursor):
+    add_column(cursor, "ads", "market", "TEXT")  # ASSET/FIAT/TRADE_TYPE the ad was scanned from
+    add_column(cursor, "ads", "dataHash", "TEXT")  # ad_digest of data, used to skip unchanged ads
+
+
+def ads_last_seen_and_archive(cursor):
+    add_column(cursor, "ads", "lastSeenAt", "REAL")  # unix time the ad was last returned by a scan
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ads_last_seen ON ads (lastSeenAt)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ads_archive (
+            advNo TEXT NOT NULL,
+            price REAL NOT NULL,
+            surplusAmount REAL NOT NULL,
+            minSingleTransAmount REAL NOT NULL,
+            maxSingleTransAmount REAL NOT NULL,
+            tradeType TEXT NOT NULL,
+            minSingleTransQuantity REAL NOT NULL,
+            maxSingleTransQuantity REAL NOT NULL,
+            apiResponseCode TEXT,
+            apiResponseMessage TEXT,
+            data TEXT,
+            market TEXT,
+            createdAt TIMESTAMP,
+            updatedAt TIMESTAMP,
+            lastSeenAt REAL,
+            archivedAt REAL NOT NULL
+        )
+    """)
+
+
+def incremental_auto_vacuum(cursor):
+    # Lets the compactor give free pages back with `PRAGMA incremental_vacuum`.
+    # Changing auto_vacuum on an existing file only takes effect after a VACUUM.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("VACUUM")
+
+
+def notifications_outbox(cursor):
+    # Admin notifications waiting to be delivered, so they survive a restart
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id TEXT PRIMARY KEY,
+            chatId TEXT NOT NULL,
+            text TEXT NOT NULL,
+            needPin INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            createdAt REAL NOT NULL
+        )
+    """)
+
+
+# (version, description, step) in the order they are applied. Never edit a
+# released step; add a new one instead. The applied version is kept in
+# SQLite's `PRAGMA user_version`.
+MIGRATIONS = [
+    (1, "initial schema", initial_schema),
+    (2, "ads market and content digest columns", ads_market_and_digest),
+    (3, "ads last seen time and archive table", ads_last_seen_and_archive),
+    (4, "incremental auto-vacuum", incremental_auto_vacuum),
+    (5, "notifications outbox", notifications_outbox),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Applies every migration newer than the database's schema version."""
+    cursor = conn.cursor()
+    version = schema_version(conn)
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Applied migration {number}: {description}")
+    return schema_version(conn)
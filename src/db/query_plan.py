@@ -0,0 +1,89 @@
+import sys
+import sqlite3
+import time
+from src.db.init import Database
+
+SAMPLE_AD = {
+    "advNo": "0", "price": "85", "surplusAmount": "100", "minSingleTransAmount": "500",
+    "maxSingleTransAmount": "5000", "tradeType": "BUY",
+}
+
+
+def upsert_ad(db, adv_no):
+    # Forgetting the digest makes the sample count as a changed ad
+    db.forget_digests([adv_no])
+    db.write_ads(db.stage_ads([{"adv": {**SAMPLE_AD, "advNo": adv_no}}], "USDT/INR/BUY")[1])
+
+
+# The writes the bot makes on the ads table every scan and order, run with
+# sample arguments. Loading the whole table on start-up is a scan by design.
+HOT_WRITES = [
+    ("upsert changed ads", upsert_ad),
+    ("store an order response", lambda db, adv_no: db.write_ads_response(adv_no, "83999", "sample")),
+    ("flush last-seen times", lambda db, adv_no: db.write_last_seen({adv_no: time.time()})),
+    ("archive expired ads", lambda db, adv_no: db.write_expired_ads([adv_no])),
+]
+
+
+def explain(conn, query, params=()):
+    """Returns the detail lines of `EXPLAIN QUERY PLAN` for a query."""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+
+
+def traced_statements(db, write, adv_no):
+    """The statements on the ads table that `write` runs, with their arguments inlined. Nothing is kept."""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        write(db, adv_no)
+    finally:
+        db.conn.set_trace_callback(None)
+        db.conn.rollback()
+    return [statement for statement in statements if " ads" in statement]
+
+
+def check_query_plans(db):
+    """Returns a list of (name, plan) for hot statements that scan or sort the ads table."""
+    row = db.conn.execute("SELECT advNo FROM ads LIMIT 1").fetchone()
+    adv_no = row[0] if row else SAMPLE_AD["advNo"]
+    regressions = []
+    for name, write in HOT_WRITES:
+        for statement in traced_statements(db, write, adv_no):
+            plan = explain(db.conn, statement)
+            full_scan = any(line.startswith("SCAN ads") and "INDEX" not in line for line in plan)
+            sorts = any("TEMP B-TREE" in line for line in plan)
+            if full_scan or sorts:
+                regressions.append((name, plan))
+    return regressions
+
+
+def open_copy(path):
+    """Loads the database at `path` into memory and migrates the copy; the file is left untouched."""
+    db = Database(":memory:")
+    if path != ":memory:":
+        source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            source.backup(db.conn)
+        finally:
+            source.close()
+        db.initialize_db()
+    return db
+
+
+if __name__ == "__main__":
+    # python -m src.db.query_plan [db/<user>.db]
+    # Exits non-zero when a hot ads statement falls back to a full scan or a sort.
+    db = open_copy(sys.argv[1] if len(sys.argv) > 1 else ":memory:")
+    try:
+        # Statistics for the planner, gathered on the copy
+        db.conn.execute("ANALYZE")
+        regressions = check_query_plans(db)
+        for name, plan in regressions:
+            print(f"REGRESSION {name}:")
+            for line in plan:
+                print(f"    {line}")
+        if not regressions:
+            print(f"All {len(HOT_WRITES)} hot ads writes use the primary key.")
+        sys.exit(1 if regressions else 0)
+    finally:
+        db.close()
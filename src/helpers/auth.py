@@ -1,7 +1,7 @@
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
-from setting import ALLOWED_USER, NOTIFY_USER_ID
+from setting import ALLOWED_USERS, NOTIFY_USER_ID
 from datetime import datetime
 from src.db.init import Database
 
@@ -10,7 +10,7 @@ from src.db.init import Database
 def restricted(func):
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-        if str(update.effective_user.id) != ALLOWED_USER:
+        if str(update.effective_user.id) not in ALLOWED_USERS:
             await update.message.reply_text(
                 "🚫 *Access Denied*\n\n"
                 "You are not authorized to use this bot. "
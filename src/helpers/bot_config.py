@@ -0,0 +1,192 @@
+import asyncio
+import copy
+from setting import DEFAULT_BOT_CONFIG
+from src.db.ad_book import AdFilter
+from src.db.async_db import AsyncDatabase
+
+TRADE_TYPES = ("BUY", "SELL")
+
+
+def _integer(config, key, minimum):
+    try:
+        value = int(config[key])
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a whole number")
+    if value < minimum:
+        raise ValueError(f"{key} must be at least {minimum}")
+    return value
+
+
+def _amount(config, key):
+    try:
+        value = float(config[key])
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number")
+    if value < 0:
+        raise ValueError(f"{key} can't be negative")
+    return value
+
+
+def _trade_type(value, key="TRADE_TYPE"):
+    value = str(value).upper()
+    if value not in TRADE_TYPES:
+        raise ValueError(f"{key} must be one of {', '.join(TRADE_TYPES)}")
+    return value
+
+
+class MarketSpec:
+    """One ASSET/FIAT/TRADE_TYPE market to scan, with its own ad filter."""
+
+    __slots__ = ("asset", "fiat", "trade_type", "extra_filter", "key")
+
+    def __init__(self, asset, fiat, trade_type, extra_filter: AdFilter):
+        self.asset = asset
+        self.fiat = fiat
+        self.trade_type = trade_type
+        self.extra_filter = extra_filter
+        # Partition key of the market's ads in the database, e.g. `USDT/INR/BUY`
+        self.key = f"{asset}/{fiat}/{trade_type}"
+
+
+class BotConfig:
+    """Validated, typed view of a user's `bot_config` JSON.
+
+    Instances are never mutated; an update builds a new one, so a running job
+    always sees either the old or the new configuration as a whole.
+    """
+
+    __slots__ = (
+        "asset", "fiat", "page", "pages", "rows", "trade_type", "markets",
+        "total_amount_to_invest", "no_of_orders", "extra_filter", "api_key", "secret_key", "_source",
+    )
+
+    @classmethod
+    def from_dict(cls, bot_config):
+        """Validates a `bot_config` dict. Missing keys fall back to DEFAULT_BOT_CONFIG."""
+        source = {**copy.deepcopy(DEFAULT_BOT_CONFIG), **copy.deepcopy(bot_config or {})}
+
+        config = cls()
+        config.asset = str(source["ASSET"]).upper()
+        config.fiat = str(source["FIAT"]).upper()
+        config.trade_type = _trade_type(source["TRADE_TYPE"])
+        config.page = _integer(source, "PAGE", 1)
+        config.pages = _integer(source, "PAGES", 1)
+        config.rows = _integer(source, "ROWS", 1)
+        config.total_amount_to_invest = _amount(source, "TOTAL_AMOUNT_TO_INVEST")
+        config.no_of_orders = _integer(source, "NO_OF_ORDERS", 0)
+        config.api_key = source.get("API_KEY") or ""
+        config.secret_key = source.get("SECRET_KEY") or ""
+
+        if not isinstance(source["EXTRA_FILTER"], dict):
+            raise ValueError("EXTRA_FILTER must be an object")
+        config.extra_filter = AdFilter.from_dict(source["EXTRA_FILTER"])
+
+        markets = source.get("MARKETS") or []
+        if not isinstance(markets, list) or not all(isinstance(market, dict) for market in markets):
+            raise ValueError("MARKETS must be a list of objects")
+        # The top-level market comes first and MARKETS adds to it; listing the
+        # top-level market in MARKETS again only gives it that entry's filter
+        specs = {}
+        for market in [{}, *markets]:
+            spec = MarketSpec(
+                asset=str(market.get("ASSET", config.asset)).upper(),
+                fiat=str(market.get("FIAT", config.fiat)).upper(),
+                trade_type=_trade_type(market.get("TRADE_TYPE", config.trade_type), "MARKETS.TRADE_TYPE"),
+                extra_filter=AdFilter.from_dict(market["EXTRA_FILTER"]) if "EXTRA_FILTER" in market else config.extra_filter,
+            )
+            specs[spec.key] = spec
+        config.markets = list(specs.values())
+
+        config._source = source
+        return config
+
+    def to_dict(self):
+        """The config as stored in the users table."""
+        return copy.deepcopy(self._source)
+
+
+class ConfigStore:
+    """Per-user `BotConfig` cache in front of the users table.
+
+    Updates are serialised per user, written to the database and swapped into
+    the cache in one step, then pushed to every subscriber of that user.
+    """
+
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+        self._configs = {}
+        self._locks = {}
+        self._subscribers = {}
+
+    def _lock(self, user_id):
+        if user_id not in self._locks:
+            self._locks[user_id] = asyncio.Lock()
+        return self._locks[user_id]
+
+    async def get(self, user_id):
+        """Cached config of a user, or None if the user hasn't run /start yet."""
+        if user_id not in self._configs:
+            user_data = await self.db.get_user(user_id)
+            if (not user_data) or (not user_data.get('bot_config')):
+                return None
+            self._configs[user_id] = BotConfig.from_dict(user_data['bot_config'])
+        return self._configs[user_id]
+
+    async def update(self, user_id, key, value):
+        """Sets a (dotted) config key. Returns False for an unknown key, raises ValueError for a bad value."""
+        async with self._lock(user_id):
+            config = await self.get(user_id)
+            if config is None:
+                return False
+
+            current_config = config.to_dict()
+
+            # Parse nested keys
+            keys = key.split('.')  # For nested keys like EXTRA_FILTER.price
+            config_section = current_config
+
+            # Traverse to the nested dictionary
+            for k in keys[:-1]:
+                if isinstance(config_section, dict) and k in config_section:
+                    config_section = config_section[k]
+                else:
+                    return False  # Invalid key path
+
+            last_key = keys[-1]
+            if not isinstance(config_section, dict) or last_key not in config_section:
+                return False  # Key not found
+
+            config_section[last_key] = value
+            new_config = BotConfig.from_dict(current_config)
+
+            await self.db.update_bot_config(user_id, new_config.to_dict())
+            self._configs[user_id] = new_config
+
+        self._notify(user_id, new_config)
+        return True
+
+    async def reload(self, user_id):
+        """Drops the cached config after the users table was written directly (/start, /reset)."""
+        async with self._lock(user_id):
+            self._configs.pop(user_id, None)
+            config = await self.get(user_id)
+        if config is not None:
+            self._notify(user_id, config)
+        return config
+
+    def subscribe(self, user_id, callback):
+        """Calls `callback(config)` on every change of the user's config. Returns an unsubscribe function."""
+        self._subscribers.setdefault(user_id, []).append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers.get(user_id, []):
+                self._subscribers[user_id].remove(callback)
+
+        return unsubscribe
+
+    def _notify(self, user_id, config):
+        for callback in list(self._subscribers.get(user_id, [])):
+            try:
+                callback(config)
+            except Exception as e:
+                print(f"An error occurred while applying a config change: {e}")
@@ -1,40 +1,47 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from src.helpers.auth import restricted
-from src.db.init import Database
+from src.db.async_db import AsyncDatabase
 from src.helpers.generate_message import generate_config_message
 from setting import DEFAULT_BOT_CONFIG
 from src.helpers.job_runer import JobRunner
+from src.helpers.bot_config import ConfigStore
+from src.db.ad_compactor import AdCompactor
+from src.helpers.notify import outbox
+from src.helpers.metrics import REGISTRY
+from src.helpers.tenant import get_tenant
 from datetime import datetime
+import json
 
 
 @restricted
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /start command."""
-    db: Database = context.application.db
+    db: AsyncDatabase = get_tenant(update, context).db
     user = update.effective_user
-    db.insert_user(user_id = user.id, first_name= user.first_name, last_name = user.last_name, extra_info = DEFAULT_BOT_CONFIG)
+    await db.insert_user(user_id = user.id, first_name= user.first_name, last_name = user.last_name, extra_info = DEFAULT_BOT_CONFIG)
+    config_store: ConfigStore = get_tenant(update, context).config_store
+    await config_store.reload(user.id)
     await update.message.reply_text("🤖 Welcome aboard! \nI'm your Binance C2C bot, \nhere to make trading smooth and easy. 🚀\nType /help to explore my features and get started! 🛠️\n\n🔒 (Access restricted to authorized users)")
 
 @restricted
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_runner: JobRunner = context.application.job_runner
+    job_runner: JobRunner = get_tenant(update, context).job_runner
     job_runner.stop()
     stop_reply = f"🚫 All background tasks have been stopped!\n You can check status using /status.\n⬅ Ready to roll again? \nUse /run to get the bot back in action! 🚀"
     await update.message.reply_text(stop_reply, parse_mode="Markdown")
 
 @restricted
 async def run(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_runner: JobRunner = context.application.job_runner
-    db: Database = context.application.db
-    user_data = db.get_user(update.effective_user.id)
-    
-    if (not user_data) or (not user_data.get('bot_config')):
-        await need_to_start (update)
+    job_runner: JobRunner = get_tenant(update, context).job_runner
+    db: AsyncDatabase = get_tenant(update, context).db
+    config_store: ConfigStore = get_tenant(update, context).config_store
+    bot_config = await get_bot_config(update, config_store)
+    if not bot_config:
         return
 
-    bot_config = user_data.get('bot_config') or {}
     job_runner.set_api_config(bot_config)
+    job_runner.watch_config(config_store, update.effective_user.id)
     run_reply = f"🤖 The bot is running in the background!\n\n✨ To stop it, use: /stop\n🔍 To check its status, use: /status"
     await update.message.reply_text(run_reply, parse_mode="Markdown")
 
@@ -42,39 +49,80 @@ async def run(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 @restricted
 async def clean_ads (update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    db: Database = context.application.db
-    db.delete_all_ads()
-    clean_ads_reply = "🚨 **ALL ADS CLEARED!** 🚨\n\n All ads have been successfully deleted from the system."
+    """Handle /clean_ads: archive stale ads now, or delete every ad with `/clean_ads all`."""
+    if context.args and context.args[0].lower() == "all":
+        db: AsyncDatabase = get_tenant(update, context).db
+        await db.delete_all_ads()
+        clean_ads_reply = "🚨 **ALL ADS CLEARED!** 🚨\n\n All ads have been successfully deleted from the system."
+        await update.message.reply_text(clean_ads_reply, parse_mode="Markdown")
+        return
+
+    ad_compactor: AdCompactor = get_tenant(update, context).ad_compactor
+    expired = await ad_compactor.compact()
+    clean_ads_reply = (
+        f"🧹 **Stale ads cleaned** 🧹\n\n"
+        f"{expired} ads not seen in the last {ad_compactor.retention // 60} minutes were archived.\n"
+        f"Use `/clean_ads all` to delete every ad."
+    )
     await update.message.reply_text(clean_ads_reply, parse_mode="Markdown")
     
 
 @restricted
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_runner: JobRunner = context.application.job_runner
+    job_runner: JobRunner = get_tenant(update, context).job_runner
     bot_status = job_runner.runner_status()
 
     if bot_status.get("running") and bot_status.get('job1') and bot_status.get('job2') :
         current_time = datetime.now()
         job1_last_time = (current_time - bot_status['job1']).total_seconds() if bot_status.get('job1') else None
         job2_last_time = (current_time - bot_status['job2']).total_seconds() if bot_status.get('job2') else None
-        message = f"✅ The bot is up and running! 🚀\n\n🔹 Job 1: Completed {job1_last_time} seconds ago.\n🔹 Job 2: Completed {job2_last_time} seconds ago.\n\nSit back and let the bot handle the tasks! 💼"
+        dispatcher = bot_status.get("dispatcher", {})
+        dispatcher_message = f"📬 Order queue: {dispatcher.get('queue_depth', 0)} waiting, {dispatcher.get('in_flight', 0)} in flight\n⏱ Order wait: last {dispatcher.get('last_wait', 0):.2f}s, avg {dispatcher.get('avg_wait', 0):.2f}s, max {dispatcher.get('max_wait', 0):.2f}s\n"
+        budget = bot_status.get("budget", {})
+        dispatcher_message += f"💵 Budget: {budget.get('spent', 0):g} of {budget.get('total', 0):g} spent, {budget.get('reserved', 0):g} reserved, {budget.get('orders', 0)}/{budget.get('max_orders', 0)} orders\n"
+        scanner = bot_status.get("scanner")
+        if scanner:
+            # Workers only hand out scans; the searches are counted by the supervisor's scanner
+            searches = f", {scanner['requests']} searches, {scanner['requests_saved']} saved" if "requests" in scanner else ""
+            dispatcher_message += f"🛰 Shared scanner: {scanner['subscribers']} users{searches}\n"
+        poll = bot_status.get("poll")
+        if poll:
+            dispatcher_message += f"📡 Scan interval: {poll['interval']:.1f}s, used weight {poll['used_weight']}" + (f", throttled for {poll['throttled_for']:.0f}s" if poll['throttled_for'] else "") + "\n"
+        breakers = bot_status.get("breakers")
+        if breakers:
+            dispatcher_message += "🔌 Binance: " + ", ".join(
+                f"{name} {breaker['state'].replace('_', '-')}" + (f" (retry in {breaker['retry_in']:.0f}s)" if breaker['retry_in'] else "")
+                for name, breaker in breakers.items()
+            ) + "\n"
+        notifications = outbox.stats()
+        dispatcher_message += f"🔔 Notifications: {notifications['pending']} pending, {notifications['sent']} sent, {notifications['dropped']} dropped\n"
+        message = f"✅ The bot is up and running! 🚀\n\n🔹 Job 1: Completed {job1_last_time} seconds ago.\n🔹 Job 2: Completed {job2_last_time} seconds ago.\n\n{dispatcher_message}\nSit back and let the bot handle the tasks! 💼"
     else:
         message = "🚨 Heads up! 🚨\n\nThe bot is currently taking a break \nand not running any background jobs. \nNeed to kick it back into action? \nUse the /run command! ⚡"
 
     await update.message.reply_text(message, parse_mode="Markdown")
 
+@restricted
+async def metrics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /metrics command: a short summary of the hot-path metrics."""
+    lines = REGISTRY.summary()
+    supervisor = getattr(context.application, 'supervisor', None)
+    if supervisor:
+        lines += supervisor.summary()
+    if not lines:
+        await update.message.reply_text("📊 No metrics recorded yet. Use /run to start the jobs.")
+        return
+    await update.message.reply_text("📊 Metrics\n\n" + "\n".join(lines))
+
 @restricted
 async def get_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /get_config command to view the current configuration."""
-    db: Database = context.application.db
-    user_data = db.get_user(update.effective_user.id)
-
-    if (not user_data) or (not user_data.get('bot_config')):
-        await need_to_start (update)
+    config_store: ConfigStore = get_tenant(update, context).config_store
+    bot_config = await get_bot_config(update, config_store)
+    if not bot_config:
         return
 
-    bot_config = user_data.get('bot_config') or {}
-    config_message = generate_config_message (bot_config)
+    config_message = generate_config_message (bot_config.to_dict())
     await update.message.reply_text(config_message, parse_mode="Markdown")
     await update.message.reply_text("use /set_config to set the config of bot")
 
@@ -88,7 +136,9 @@ async def set_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             "📌 **Example:**\n"
             "`/set_config TRADE_TYPE SELL`\n\n"
             "🔗 **For arrays:**\n"
-            "`/set_config EXTRA_FILTER.error_codes 83999,83685`",
+            "`/set_config EXTRA_FILTER.error_codes 83999,83685`\n\n"
+            "🌐 **For markets:**\n"
+            "`/set_config MARKETS USDT/INR/BUY,BTC/INR/BUY`",
             parse_mode="Markdown"
         )
 
@@ -107,6 +157,12 @@ async def set_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         except:
             await update.message.reply_text("❌ Invalid array format. Use: `83683,83682`", parse_mode="Markdown")
             return
+    elif key == "MARKETS":
+        try:
+            value = parse_markets(value)
+        except ValueError:
+            await update.message.reply_text("❌ Invalid markets format. Use: `USDT/INR/BUY,BTC/INR/BUY`", parse_mode="Markdown")
+            return
     else:
         # Convert value to int or float if needed
         try:
@@ -118,53 +174,70 @@ async def set_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             pass
 
     user_id = update.effective_user.id
-    db: Database = context.application.db
+    config_store: ConfigStore = get_tenant(update, context).config_store
+
+    try:
+        success = await update_config(user_id, key, value, config_store, update)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Invalid value for `{key}`: {e}", parse_mode="Markdown")
+        return
 
-    success = await update_config(user_id, key, value, db, update)
+    if success is None:
+        return
     if success:
         await update.message.reply_text(f"✅ Updated >> {key} : {value} \n\n To see the config run /get_config")
     else:
         await update.message.reply_text(f"❌ Failed to update configuration. Invalid key: `{key}`", parse_mode="Markdown")
 
-async def update_config(user_id, key, value, db: Database, update: Update) -> bool:
-    user_data = db.get_user(user_id)
-
-    if (not user_data) or (not user_data.get('bot_config')):
+def parse_markets(value):
+    """Parses `USDT/INR/BUY,BTC/INR` or a JSON list of market specs into a list of dicts."""
+    if value.lstrip().startswith('[{'):
+        markets = json.loads(value)
+        if not all(isinstance(market, dict) for market in markets):
+            raise ValueError("markets must be objects")
+        return markets
+
+    markets = []
+    for spec in value.strip('[]').replace(' ', '').split(','):
+        if not spec:
+            continue
+        parts = spec.split('/')
+        if len(parts) not in (2, 3):
+            raise ValueError(f"invalid market: {spec}")
+        market = {"ASSET": parts[0].upper(), "FIAT": parts[1].upper()}
+        if len(parts) == 3:
+            market["TRADE_TYPE"] = parts[2].upper()
+        markets.append(market)
+    return markets
+
+async def update_config(user_id, key, value, config_store: ConfigStore, update: Update) -> bool:
+    if not await get_bot_config(update, config_store):
+        return None
+
+    # Validated, written and pushed to the running jobs as one step
+    return await config_store.update(user_id, key, value)
+
+async def get_bot_config(update: Update, config_store: ConfigStore):
+    """Returns the user's BotConfig, or replies with what to do and returns None."""
+    try:
+        bot_config = await config_store.get(update.effective_user.id)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ The saved configuration is invalid: {e}\nUse /reset to restore the defaults.")
+        return None
+
+    if not bot_config:
         await need_to_start (update)
-        return
-
-    current_config = user_data.get('bot_config')
-
-    if not current_config:
-        return False  # User or config not found
-
-    # Parse nested keys
-    keys = key.split('.')  # For nested keys like EXTRA_FILTER.price
-    config_section = current_config
-
-    # Traverse to the nested dictionary
-    for k in keys[:-1]:
-        if k in config_section:
-            config_section = config_section[k]
-        else:
-            return False  # Invalid key path
-
-    # Update the last key
-    last_key = keys[-1]
-    if last_key in config_section:
-        config_section[last_key] = value
-        # Update the database with the new configuration
-        db.update_bot_config(user_id, current_config)
-        return True
-
-    return False  # Key not found
+        return None
+    return bot_config
 
 @restricted
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /reset command."""
-    db: Database = context.application.db
+    db: AsyncDatabase = get_tenant(update, context).db
     user = update.effective_user
-    db.insert_or_update_user(user_id = user.id, first_name= user.first_name, last_name = user.last_name, extra_info = DEFAULT_BOT_CONFIG)
+    await db.insert_or_update_user(user_id = user.id, first_name= user.first_name, last_name = user.last_name, extra_info = DEFAULT_BOT_CONFIG)
+    config_store: ConfigStore = get_tenant(update, context).config_store
+    await config_store.reload(user.id)
     await update.message.reply_text(
         "Your bot has been reset to the initial bot configuration.\n"
         "/get_config - Get Bot config\n"
@@ -180,8 +253,9 @@ async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "/start - Start the bot\n"
         "/run - Run the bot\n"
         "/stop - Stop the bot\n"
-        "/clean_ads - Used to clean all ads\n"
+        "/clean_ads - Archive stale ads (/clean_ads all deletes every ad)\n"
         "/status - check status of the jobs\n"
+        "/metrics - Latency and request metrics\n"
         "\n Config \n\n"
         "/get_config - Get Bot config\n"
         "/set_config - Set Bot config\n"
@@ -0,0 +1,107 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from telegram import Update
+
+# Lines listed per section before the rest is summarised as "... and N more"
+MAX_LINES_PER_SECTION = 15
+
+
+class CycleDigest:
+    """Collects the outcomes of one order cycle and reports them as a single message.
+
+    The order loop only calls the `record_*` methods, which never wait on
+    Telegram. `flush` ends the cycle and queues its summary. When a cycle's
+    summary equals the previous one (the same ads failing every sweep), that
+    message is edited instead of sending a new one. `send` is used for messages
+    that must go out right away, such as successful fills. Every message is
+    sent in order by a background task.
+    """
+
+    def __init__(self, update: Update):
+        self.update = update
+        self.outbox = deque()
+        self.sender = None
+        self.failed = []
+        self.skipped = []
+        self.last_summary = None
+        self.last_message = None
+        self.cycles = 0
+
+    def record_failed(self, market, adv, error_code, error_message):
+        self.failed.append(f"• {market} {adv.advNo} @ {adv.price:.2f}: {error_code} {str(error_message)[:100]}")
+
+    def record_skipped(self, market, adv, total_amount):
+        self.skipped.append(
+            f"• {market} {adv.advNo} @ {adv.price:.2f}: amount {total_amount}, limits {adv.minSingleTransAmount:.2f} - {adv.maxSingleTransAmount:.2f}"
+        )
+
+    def send(self, text, parse_mode=None):
+        """Queues a message outside the cycle summary."""
+        self._queue((self._send, text, parse_mode))
+
+    def flush(self):
+        """Ends the cycle and queues its summary, if anything happened."""
+        sections = []
+        if self.failed:
+            sections.append(self._section(f"🛑 Order Fail: {len(self.failed)}", self.failed))
+        if self.skipped:
+            sections.append(self._section(f"🛑 Inappropriate Amount: {len(self.skipped)}", self.skipped))
+        self.failed = []
+        self.skipped = []
+        if not sections:
+            return
+        summary = "\n\n".join(sections)
+        cycles = 1
+        # Still waiting behind a slow send: fold repeats into the queued summary
+        if self.outbox and self.outbox[-1][0] == self._send_summary and self.outbox[-1][1] == summary:
+            cycles += self.outbox.pop()[3]
+        self._queue((self._send_summary, summary, datetime.now(), cycles))
+
+    @staticmethod
+    def _section(title, lines):
+        shown = lines[:MAX_LINES_PER_SECTION]
+        if len(lines) > len(shown):
+            shown = shown + [f"... and {len(lines) - len(shown)} more"]
+        return "\n".join([title, *shown])
+
+    def _queue(self, job):
+        self.outbox.append(job)
+        if self.sender is None or self.sender.done():
+            self.sender = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self.outbox:
+            job, *args = self.outbox.popleft()
+            try:
+                await job(*args)
+            except Exception as e:
+                print(f"An error occurred while sending the cycle digest: {e}")
+
+    async def _send(self, text, parse_mode):
+        await self.update.message.reply_text(text, parse_mode=parse_mode)
+        # Anything sent in between means the next summary starts a new message
+        self.last_message = None
+
+    async def _send_summary(self, summary, at, cycles):
+        if summary == self.last_summary and self.last_message is not None:
+            self.cycles += cycles
+            text = f"🧾 Cycle summary (same for {self.cycles} cycles, last {at:%H:%M:%S})\n\n{summary}"
+            await self.last_message.edit_text(text)
+            return
+
+        if cycles > 1:
+            text = f"🧾 Cycle summary (same for {cycles} cycles, last {at:%H:%M:%S})\n\n{summary}"
+        else:
+            text = f"🧾 Cycle summary ({at:%H:%M:%S})\n\n{summary}"
+        self.last_message = await self.update.message.reply_text(text)
+        self.last_summary = summary
+        self.cycles = cycles
+
+    async def close(self):
+        """Stops sending; summaries still queued are dropped."""
+        self.outbox.clear()
+        if self.sender:
+            self.sender.cancel()
+            await asyncio.gather(self.sender, return_exceptions=True)
+            self.sender = None
@@ -2,71 +2,166 @@ import asyncio
 import time
 from telegram import Update
 from telegram.ext import ContextTypes
-from setting import LIST_ADS_SLEEP , CREATE_ORDER_SLEEP, BINANCE_API_URL
-from src.apis.binance_api_call import BinanceApiCall
-from src.db.init import Database
+from setting import CREATE_ORDER_SLEEP, BINANCE_API_URL, FEED_RECORD_PATH
+from src.apis.binance_api_call import BinanceApiCall, PLACE_ORDER_ENDPOINT
+from src.apis.feed_recorder import FeedRecorder
+from src.apis.market_scanner import ScanFanout
+from src.apis.poll_scheduler import PollScheduler
+from src.helpers.bot_config import BotConfig, ConfigStore
+from src.helpers.cycle_digest import CycleDigest
+from src.helpers.metrics import JOB_ITERATION_SECONDS
+from src.db.async_db import AsyncDatabase
 from datetime import datetime
 
 
 class JobRunner:
-    def __init__(self):
+    def __init__(self, scanner: ScanFanout = None, name="runner"):
         self.stop_threads = False
         self.fetch_task = None
         self.process_task = None
-        self.binance_api = BinanceApiCall(base_url=BINANCE_API_URL)
+        # With a shared scanner the ads come from its scans instead of our own searches
+        self.scanner = scanner
+        self.name = name
+        self.scan_feed = None
+        recorder = None
+        if FEED_RECORD_PATH and scanner is None:
+            recorder = FeedRecorder(FEED_RECORD_PATH)
+            recorder.start()
+        self.binance_api = BinanceApiCall(base_url=BINANCE_API_URL, recorder=recorder)
+        # Paces our own scans. With a scanner, its scheduler holds our orders back
+        # while Binance throttles the IP, whoever's request was answered with 429/418.
+        self.scheduler = scanner.scheduler if scanner else PollScheduler()
+        self.binance_api.scheduler = self.scheduler
         self.job_status = {}
+        self._unsubscribe_config = None
+        # (scan time, new or changed ads) handed from fetch_ads to process_ads
+        self.ad_queue = asyncio.Queue()
+        # Reports order outcomes to the chat without holding up the jobs
+        self.digest = None
+        # market key -> (code, message) of the search error last reported to the chat
+        self.search_errors = {}
 
     def runner_status (self):
-        return {**self.job_status, **{"running": not self.stop_threads}}
+        status = {**self.job_status, **{"running": not self.stop_threads, "dispatcher": self.binance_api.dispatcher.stats(), "budget": self.binance_api.budget.stats()}}
+        if self.scanner:
+            status["scanner"] = self.scanner.stats()
+            status["poll"] = status["scanner"].get("poll")
+            # Searches go through the scanner's client, and its breaker
+            status["breakers"] = {**status["scanner"].get("breakers", {}), **self.binance_api.breaker_stats([PLACE_ORDER_ENDPOINT])}
+        else:
+            status["poll"] = self.scheduler.stats()
+            status["breakers"] = self.binance_api.breaker_stats()
+        return status
 
     # Job 1: Fetch Ads
-    async def fetch_ads(self, db: Database, update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None):
+    async def fetch_ads(self, db: AsyncDatabase, update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None):
         while not self.stop_threads:
+            if self.scan_feed:
+                scanned_at, results = await self.scan_feed.get()
+            else:
+                await self.scheduler.wait()
+            started = time.perf_counter()
             try:
                 self.job_status = {**self.job_status,**{"job1": datetime.now()}}
-                ads = self.binance_api.search_ads_jobs()
-                if ads.get("error_code"):
-                    error_message = f"🛑 ERROR IN LIST ADS 🛑\n\nCODE: {ads.get('error_code')}\nMSG: {ads.get('error_message')}\n\n🙏 Plz stop the bot if you want /stop "
-                    await update.message.reply_text(error_message, parse_mode="Markdown")
-                else:
-                    db.insert_ad(ads.get("data") or [])
+                if not self.scan_feed:
+                    results = await self.binance_api.search_markets_jobs()
+                    scanned_at = time.monotonic()
+                for market, ads in results:
+                    if isinstance(ads, Exception):
+                        print(f"An error occurred while fetching ads for {market.key}: {ads}")
+                    elif ads.get("error_code"):
+                        # The same error every scan is reported once, until the market recovers or the error changes
+                        error = (ads.get("error_code"), ads.get("error_message"))
+                        if self.search_errors.get(market.key) == error:
+                            continue
+                        self.search_errors[market.key] = error
+                        error_message = f"🛑 ERROR IN LIST ADS 🛑\n\nMARKET: {market.key}\nCODE: {ads.get('error_code')}\nMSG: {ads.get('error_message')}\n\n🙏 Plz stop the bot if you want /stop "
+                        self.digest.send(error_message, parse_mode="Markdown")
+                    else:
+                        self.search_errors.pop(market.key, None)
+                        changed_ads = await db.insert_ad(ads.get("data") or [], market=market.key)
+                        if not self.scan_feed:
+                            self.scheduler.observe_changes(len(changed_ads), len(ads.get("data") or []))
+                        if changed_ads:
+                            self.ad_queue.put_nowait((scanned_at, changed_ads))
             except Exception as e:
                 print(f"An error occurred while creating order jobs: {e}")
-
-            await asyncio.sleep(LIST_ADS_SLEEP)  
+            JOB_ITERATION_SECONDS.observe(time.perf_counter() - started, job="fetch_ads")
             
 
     # Job 2: Process Ads
-    async def process_ads(self, db: Database, update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None):
+    async def process_ads(self, db: AsyncDatabase, update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None):
+        # New ads are evaluated as soon as fetch_ads publishes them. Every
+        # CREATE_ORDER_SLEEP seconds without news the database is swept as well,
+        # so ads that failed with a retryable error code are tried again.
+        next_sweep = time.monotonic()
         while not self.stop_threads:
+            try:
+                detected_at, new_ads = await asyncio.wait_for(self.ad_queue.get(), timeout=max(0, next_sweep - time.monotonic()))
+                if not self.ad_queue.empty():
+                    # An ad changed in several scans is evaluated once, as last scanned
+                    latest = {ad.advNo: ad for ad in new_ads}
+                    while not self.ad_queue.empty():
+                        latest.update((ad.advNo, ad) for ad in self.ad_queue.get_nowait()[1])
+                    new_ads = list(latest.values())
+            except asyncio.TimeoutError:
+                detected_at, new_ads = None, None
+                next_sweep = time.monotonic() + CREATE_ORDER_SLEEP
+
+            started = time.perf_counter()
             self.job_status = {**self.job_status,**{"job2": datetime.now()}}
             try:
-                await self.binance_api.create_orders_jobs(db,update)
+                await self.binance_api.create_orders_jobs(db, self.digest, new_ads=new_ads, detected_at=detected_at)
             except Exception as e:
                 print(f"An error occurred while creating order jobs: {e}")
-            # await update.message.reply_text('Processing ads with method...', disable_notification=True)
-            await asyncio.sleep(CREATE_ORDER_SLEEP)
+            JOB_ITERATION_SECONDS.observe(time.perf_counter() - started, job="process_ads")
 
     # Function to run both jobs in parallel with parameters and callback
     def run_parallel_jobs(self, db, update: Update, context: ContextTypes.DEFAULT_TYPE, callback=None):
         self.stop_threads = False  # Reset stop flag
+        self.ad_queue = asyncio.Queue()
+        self.digest = CycleDigest(update)
+        self.search_errors = {}
+        if self.scanner:
+            self.scan_feed = self.scanner.subscribe(self.name, self.binance_api)
 
         # Create and start asyncio tasks for both jobs
         loop = asyncio.get_event_loop()
         self.fetch_task = loop.create_task(self.fetch_ads(db, update, context, callback))
         self.process_task = loop.create_task(self.process_ads(db, update, context, callback))
 
-    def set_api_config(self, config):
+    def set_api_config(self, config: BotConfig):
         self.binance_api.set_config(config)
 
+    def watch_config(self, config_store: ConfigStore, user_id):
+        """Apply later changes of the user's config to the running jobs."""
+        if self._unsubscribe_config:
+            self._unsubscribe_config()
+        self._unsubscribe_config = config_store.subscribe(user_id, self.binance_api.apply_config)
+
     # Method to stop the tasks manually
     def stop(self):
         print("Stopping jobs manually...")
         self.stop_threads = True  # Set the flag to stop the jobs
 
+        if self.scan_feed:
+            self.scanner.unsubscribe(self.name)
+            self.scan_feed = None
+
+        if self._unsubscribe_config:
+            self._unsubscribe_config()
+            self._unsubscribe_config = None
+
         if self.fetch_task:
             self.fetch_task.cancel()
         if self.process_task:
             self.process_task.cancel()
 
         print("Jobs have been stopped.")
+
+    async def close(self):
+        """Stop the jobs and release the shared HTTP connection pool."""
+        self.stop()
+        if self.digest:
+            await self.digest.close()
+        await self.binance_api.close()
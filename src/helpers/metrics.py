@@ -0,0 +1,241 @@
+import asyncio
+import bisect
+import math
+import time
+from setting import METRICS_HOST, METRICS_PORT
+
+# Upper bounds in seconds, from a fast in-memory lookup to a slow HTTP call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def _value_text(value):
+    """Exact text of a sample; `:g` would round a counter past 999999 to 6 significant digits."""
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+    def summary(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_label_text(labels)}: {_value_text(value)}"
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # label set -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def merge(self, values):
+        for key, (counts, total, count) in values.items():
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0] = [mine + theirs for mine, theirs in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def time(self, **labels):
+        """Context manager that observes the seconds spent inside it."""
+        return _Timer(self, labels)
+
+    def quantile(self, q, **labels):
+        """Upper bound of the bucket holding the `q` quantile, or None without data."""
+        state = self.values.get(tuple(sorted(labels.items())))
+        return self._quantile(state, q) if state else None
+
+    def _quantile(self, state, q):
+        rank = q * state[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), state[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _value_text(bound)
+                yield f"{self.name}_bucket", labels + (("le", le),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+    def summary(self):
+        for labels, state in self.values.items():
+            counts, total, count = state
+            yield (
+                f"{self.name}{_label_text(labels)}: n={count}, avg={total / count * 1000:.1f}ms, "
+                f"p50<={self._quantile(state, 0.5) * 1000:g}ms, p95<={self._quantile(state, 0.95) * 1000:g}ms"
+            )
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        # source -> latest snapshot of another process, see `absorb`
+        self.remote = {}
+
+    def _register(self, metric):
+        existing = self.metrics.setdefault(metric.name, metric)
+        if type(existing) is not type(metric):
+            raise ValueError(f"Metric {metric.name} is already registered as a {existing.kind}")
+        return existing
+
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, buckets))
+
+    def snapshot(self):
+        """Values of every metric, for another process's registry to `absorb`."""
+        return {name: metric.values for name, metric in self.metrics.items()}
+
+    def absorb(self, source, snapshot):
+        """Keeps the latest snapshot sent by `source`; render and summary add it to the local values."""
+        self.remote[source] = snapshot
+
+    def _combined(self):
+        if not self.remote:
+            return list(self.metrics.values())
+        combined = []
+        for name, metric in self.metrics.items():
+            total = Histogram(name, metric.help, metric.buckets) if metric.kind == "histogram" else Counter(name, metric.help)
+            total.merge(metric.values)
+            for snapshot in self.remote.values():
+                total.merge(snapshot.get(name, {}))
+            combined.append(total)
+        return combined
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._combined():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {_value_text(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short human readable lines for the /metrics command."""
+        return [line for metric in self._combined() for line in metric.summary()]
+
+
+REGISTRY = MetricsRegistry()
+
+# Hot paths
+BINANCE_REQUEST_SECONDS = REGISTRY.histogram("binance_request_seconds", "Binance API request latency by endpoint.")
+BINANCE_REQUESTS = REGISTRY.counter("binance_requests_total", "Binance API requests by endpoint and outcome.")
+INSERT_AD_SECONDS = REGISTRY.histogram("insert_ad_seconds", "Time the scan loop spends staging a page of ads.")
+ADS_CHANGED = REGISTRY.counter("ads_changed_total", "New or changed ads found by scans.")
+FILTER_ADS_SECONDS = REGISTRY.histogram("get_filtered_ads_seconds", "Time to look up the ads matching a filter.")
+JOB_ITERATION_SECONDS = REGISTRY.histogram("job_iteration_seconds", "Duration of one iteration of a background job.")
+DETECTION_TO_ORDER_SECONDS = REGISTRY.histogram(
+    "detection_to_order_seconds", "Time from receiving an ad in a scan to sending its order."
+)
+
+
+class MetricsServer:
+    """Serves the registry at GET /metrics for Prometheus to scrape."""
+
+    def __init__(self, registry=REGISTRY, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        if self.port:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Skip the headers; the request has no body
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
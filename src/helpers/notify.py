@@ -1,8 +1,12 @@
 from telegram.ext import ContextTypes
 from datetime import datetime
-import requests
+import html
 import json
-from setting import TELEGRAM_TOKEN, NOTIFY_USER_ID
+from setting import NOTIFY_USER_ID
+from src.helpers.outbox import NotificationOutbox
+
+# Shared by everything that notifies the admin; started and closed by main.py
+outbox = NotificationOutbox()
 
 async def notify_admin(context: ContextTypes.DEFAULT_TYPE, error_type: str, details: str, **kwargs):
     """Send notification to admin for errors/important events"""
@@ -25,44 +29,6 @@ async def notify_admin(context: ContextTypes.DEFAULT_TYPE, error_type: str, deta
     )
 
 def direct_notify_admin(message, req_body={}, need_pin=False):
-    try:
-        json_message = json.dumps(req_body, indent=2)
-
-        # Prepare the payload for the Telegram API
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": NOTIFY_USER_ID,
-            "text": f"{message} \n\n<pre>{json_message}</pre>",
-            "parse_mode": "HTML",  # Use HTML to preserve JSON formatting
-            "disable_notification": True
-        }
-
-        # Send the message using a POST request
-        response = requests.post(url, json=payload)
-
-        # Check and log response
-        if response.status_code == 200:
-            print("Message sent successfully!")
-
-            if need_pin:
-                message_id = response.json().get("result", {}).get("message_id")
-                # Pin the message
-                pin_url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/pinChatMessage"
-                pin_payload = {
-                    "chat_id": NOTIFY_USER_ID,
-                    "message_id": message_id,
-                    "disable_notification": True
-                }
-                pin_response = requests.post(pin_url, json=pin_payload)
-
-                if pin_response.status_code == 200:
-                    print("Message pinned successfully!")
-                else:
-                    print("Failed to pin the message:")
-        else:
-            print("Failed to send message:", response.text)
-
-        return response.json()
-    except Exception as e:
-        print(f"Error occurred: {e}")
-        return {"error": str(e)}
+    """Queue a message for the admin chat. Delivery happens in the background via `outbox`."""
+    json_message = html.escape(json.dumps(req_body, indent=2))
+    return outbox.put(NOTIFY_USER_ID, f"{message} \n\n<pre>{json_message}</pre>", need_pin)
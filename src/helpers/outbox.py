@@ -0,0 +1,206 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+import httpx
+from setting import (
+    TELEGRAM_TOKEN, TELEGRAM_API_URL, NOTIFY_CHAT_RATE, NOTIFY_GLOBAL_RATE,
+    NOTIFY_BATCH_WINDOW, NOTIFY_MAX_ATTEMPTS,
+)
+from src.apis.http_client import create_http_client
+from src.apis.rate_limiter import TokenBucket
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+MAX_BACKOFF = 60
+
+
+class Notification:
+    __slots__ = ("id", "chat_id", "text", "need_pin", "attempts", "created_at")
+
+    def __init__(self, chat_id, text, need_pin=False, attempts=0, created_at=None, id=None):
+        self.id = id or uuid.uuid4().hex
+        self.chat_id = str(chat_id)
+        self.text = text
+        self.need_pin = bool(need_pin)
+        self.attempts = attempts
+        self.created_at = created_at or time.time()
+
+
+class NotificationOutbox:
+    """Delivers Telegram messages in the background so callers never wait on the Bot API.
+
+    `put` only queues the message. One worker per chat waits `batch_window`
+    seconds, joins everything queued for that chat into as few messages as
+    possible and sends them within the per-chat and global rate limits. Failed
+    sends are retried with exponential backoff (or Telegram's `retry_after`).
+    Once `start` is given a database, queued messages are stored there until
+    delivered and are picked up again after a restart.
+    """
+
+    def __init__(
+        self,
+        token=TELEGRAM_TOKEN,
+        base_url=TELEGRAM_API_URL,
+        chat_rate=NOTIFY_CHAT_RATE,
+        global_rate=NOTIFY_GLOBAL_RATE,
+        batch_window=NOTIFY_BATCH_WINDOW,
+        max_attempts=NOTIFY_MAX_ATTEMPTS,
+        client=None,
+    ):
+        self.token = token
+        self.base_url = base_url
+        self.chat_rate = chat_rate
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.client = client
+        self.db = None
+        self.running = False
+        self.pending = {}
+        self.workers = {}
+        self.chat_limiters = {}
+        self.global_limiter = TokenBucket(rate=global_rate, capacity=max(1, int(global_rate)))
+        self.sent = 0
+        self.dropped = 0
+        self.retries = 0
+
+    def put(self, chat_id, text, need_pin=False):
+        """Queues a message for `chat_id` and returns right away."""
+        notification = Notification(chat_id, text, need_pin)
+        self._enqueue(notification)
+        if self.db:
+            self.db.queue_notification(notification)
+        return notification
+
+    def _enqueue(self, notification):
+        self.pending.setdefault(notification.chat_id, deque()).append(notification)
+        if self.running and notification.chat_id not in self.workers:
+            self.workers[notification.chat_id] = asyncio.get_running_loop().create_task(self._chat_worker(notification.chat_id))
+
+    async def start(self, db=None):
+        """Loads undelivered messages from `db` and starts sending."""
+        if self.client is None:
+            self.client = create_http_client()
+        self.db = db
+        if db:
+            # Messages put before start were only held in memory
+            queued = set()
+            for chat in self.pending.values():
+                for notification in chat:
+                    queued.add(notification.id)
+                    db.queue_notification(notification)
+            for notification_id, chat_id, text, need_pin, attempts, created_at in await db.get_notifications():
+                if notification_id not in queued:
+                    self.pending.setdefault(chat_id, deque()).append(
+                        Notification(chat_id, text, need_pin, attempts, created_at, id=notification_id)
+                    )
+
+        self.running = True
+        loop = asyncio.get_running_loop()
+        for chat_id in self.pending:
+            if chat_id not in self.workers:
+                self.workers[chat_id] = loop.create_task(self._chat_worker(chat_id))
+
+    async def _chat_worker(self, chat_id):
+        queue = self.pending[chat_id]
+        try:
+            while queue:
+                # Give related messages a moment to arrive so they go out together
+                await asyncio.sleep(self.batch_window)
+                await self._deliver(chat_id, self._take_batch(queue))
+        finally:
+            self.workers.pop(chat_id, None)
+
+    def _take_batch(self, queue):
+        """Pops the next message to send: one pinned message, or a run of unpinned ones."""
+        batch = [queue.popleft()]
+        if batch[0].need_pin:
+            return batch
+        length = len(batch[0].text)
+        while queue and not queue[0].need_pin and length + 2 + len(queue[0].text) <= MAX_MESSAGE_LENGTH:
+            length += 2 + len(queue[0].text)
+            batch.append(queue.popleft())
+        return batch
+
+    def _chat_limiter(self, chat_id):
+        if chat_id not in self.chat_limiters:
+            self.chat_limiters[chat_id] = TokenBucket(rate=self.chat_rate, capacity=1)
+        return self.chat_limiters[chat_id]
+
+    async def _call(self, method, chat_id, payload):
+        """Calls a Bot API method within the rate limits. Returns the decoded response."""
+        await self.global_limiter.acquire()
+        await self._chat_limiter(chat_id).acquire()
+        try:
+            response = await self.client.post(f"{self.base_url}/bot{self.token}/{method}", json=payload)
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            return {"ok": False, "description": str(e)}
+
+    async def _deliver(self, chat_id, batch):
+        payload = {
+            "chat_id": chat_id,
+            "text": "\n\n".join(notification.text for notification in batch),
+            "parse_mode": "HTML",
+            "disable_notification": True,
+        }
+        while True:
+            result = await self._call("sendMessage", chat_id, payload)
+            if result.get("ok"):
+                self.sent += len(batch)
+                self._forget(batch)
+                if batch[0].need_pin:
+                    await self._pin(chat_id, result.get("result", {}).get("message_id"))
+                return
+
+            attempts = max(notification.attempts for notification in batch) + 1
+            error_code = result.get("error_code")
+            # Anything Telegram rejects outright (bad markup, blocked bot) won't succeed later
+            permanent = error_code is not None and 400 <= error_code < 500 and error_code != 429
+            if permanent or attempts >= self.max_attempts:
+                print(f"Dropping notification after {attempts} attempts: {result.get('description')}")
+                self.dropped += len(batch)
+                self._forget(batch)
+                return
+
+            for notification in batch:
+                notification.attempts = attempts
+            if self.db:
+                self.db.update_notification_attempts([notification.id for notification in batch], attempts)
+            self.retries += 1
+            retry_after = (result.get("parameters") or {}).get("retry_after")
+            delay = retry_after or min(MAX_BACKOFF, 2 ** (attempts - 1))
+            print(f"Failed to send notification ({result.get('description')}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+    async def _pin(self, chat_id, message_id):
+        result = await self._call("pinChatMessage", chat_id, {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "disable_notification": True,
+        })
+        if not result.get("ok"):
+            print("Failed to pin the message:", result.get("description"))
+
+    def _forget(self, batch):
+        if self.db:
+            self.db.delete_notifications([notification.id for notification in batch])
+
+    def stats(self):
+        return {
+            "pending": sum(len(queue) for queue in self.pending.values()),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "retries": self.retries,
+        }
+
+    async def close(self):
+        """Stops sending. Undelivered messages stay in the database for the next start."""
+        self.running = False
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if self.client:
+            await self.client.aclose()
+            self.client = None
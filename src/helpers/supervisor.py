@@ -0,0 +1,405 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from telegram import Update
+from telegram.ext import ContextTypes
+from setting import NOTIFY_GLOBAL_RATE
+from src.apis.market_scanner import MarketScanner, ScanFanout
+from src.apis.request_signer import RequestSigner
+from src.apis.rate_limiter import TokenBucket
+from src.helpers import commands
+from src.helpers.auth import restricted
+from src.helpers.bot_config import BotConfig
+from src.helpers.metrics import REGISTRY
+from src.helpers.notify import outbox, direct_notify_admin
+from src.helpers.tenant import Tenant
+
+# Seconds between worker heartbeats (subscriptions, health and metrics)
+HEARTBEAT_INTERVAL = 1
+# Bot messages per worker that can still be edited; the digest only edits its last summary
+MAX_TRACKED_MESSAGES = 256
+# Commands that work on the user's tenant, so they run in the worker that owns it
+TENANT_COMMANDS = ("start", "run", "stop", "status", "clean_ads", "get_config", "set_config", "reset")
+
+
+def _read(connection, loop, queue):
+    """Hands everything received on `connection` to `queue` on `loop`, then None once the other end is gone."""
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            message = None
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        except RuntimeError:
+            # The loop is closed
+            return
+        if message is None:
+            return
+
+
+# Worker side
+
+class _RemoteUser:
+    __slots__ = ("id", "first_name", "last_name", "is_bot")
+
+    def __init__(self, id, first_name, last_name, is_bot):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.is_bot = is_bot
+
+
+class _RemoteMessage:
+    """Stands in for a chat message in a worker; the supervisor's bot sends the replies and edits."""
+
+    def __init__(self, worker, chat_id, token=None):
+        self.worker = worker
+        self.chat_id = chat_id
+        self.token = token
+
+    async def reply_text(self, text, **kwargs):
+        token = next(self.worker.tokens)
+        self.worker.send(("send", self.chat_id, token, text, kwargs))
+        return _RemoteMessage(self.worker, self.chat_id, token)
+
+    async def edit_text(self, text, **kwargs):
+        self.worker.send(("edit", self.token, text, kwargs))
+
+
+class _RemoteUpdate:
+    def __init__(self, worker, user, chat_id):
+        self.effective_user = user
+        self.message = _RemoteMessage(worker, chat_id)
+
+
+class _RemoteContext:
+    def __init__(self, application, args):
+        self.application = application
+        self.args = args
+
+
+class _WorkerFeed(ScanFanout):
+    """Scans come from the supervisor; subscribing or leaving is reported back right away."""
+
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+
+    def subscribe(self, name, api):
+        queue = super().subscribe(name, api)
+        self.worker.heartbeat()
+        return queue
+
+    def unsubscribe(self, name):
+        super().unsubscribe(name)
+        self.worker.heartbeat()
+
+
+class Worker:
+    """One worker process: the tenants of a shard of users.
+
+    It is its own "application" for the command handlers, which find the
+    user's tenant in `tenants` as they do in the bot process.
+    """
+
+    def __init__(self, index, user_ids, inbox, events, processes):
+        self.index = index
+        self.inbox = inbox
+        self.events = events
+        self.processes = processes
+        self.tokens = itertools.count(1)
+        # Subscriptions sent in the last heartbeat
+        self.reported = {}
+        self.feed = _WorkerFeed(self)
+        # A 429/418 seen here pauses the supervisor's scanner and the other workers too
+        self.feed.scheduler.on_throttle = lambda seconds: self.send(("throttle", seconds))
+        # Handled one after the other, as the bot handles updates
+        self.commands = asyncio.Queue()
+        self.tenants = {user_id: Tenant(user_id, self.feed) for user_id in user_ids}
+
+    def send(self, message):
+        try:
+            self.events.send(message)
+        except (BrokenPipeError, OSError) as e:
+            print(f"Worker {self.index} could not reach the supervisor: {e}")
+
+    def _subscriptions(self):
+        return {name: api.config.to_dict() for name, (api, _) in self.feed.subscribers.items() if api.config}
+
+    def heartbeat(self):
+        self.reported = self._subscriptions()
+        self.send(("heartbeat", {
+            "pid": os.getpid(),
+            "subscriptions": self.reported,
+            "metrics": REGISTRY.snapshot(),
+        }))
+
+    async def _heartbeats(self):
+        while True:
+            self.heartbeat()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def _handle_commands(self):
+        while True:
+            await self._command(*await self.commands.get())
+
+    async def _command(self, name, user, chat_id, args):
+        update = _RemoteUpdate(self, _RemoteUser(*user), chat_id)
+        try:
+            await getattr(commands, name)(update, _RemoteContext(self, args))
+        except Exception as e:
+            print(f"An error occurred while handling /{name} in worker {self.index}: {e}")
+            await update.message.reply_text("Sorry, something went wrong. The administrator has been notified.")
+            direct_notify_admin(f"🚨 /{name} failed in worker {self.index}: {e}")
+        finally:
+            # A changed config (markets, pages, rows) reaches the scanner now, not at the next heartbeat
+            if self._subscriptions() != self.reported:
+                self.heartbeat()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        threading.Thread(target=_read, args=(self.inbox, loop, messages), name="supervisor-inbox", daemon=True).start()
+
+        for tenant in self.tenants.values():
+            tenant.ad_compactor.start()
+        # Every worker sends its own admin notifications; together they stay within Telegram's global limit
+        outbox.global_limiter = TokenBucket(rate=NOTIFY_GLOBAL_RATE / self.processes, capacity=max(1, int(NOTIFY_GLOBAL_RATE / self.processes)))
+        await outbox.start(next(iter(self.tenants.values())).db)
+        heartbeats = loop.create_task(self._heartbeats())
+        handler = loop.create_task(self._handle_commands())
+
+        try:
+            while True:
+                message = await messages.get()
+                if message is None or message[0] == "stop":
+                    break
+                try:
+                    if message[0] == "scan":
+                        self.feed.publish(message[1], message[2])
+                    elif message[0] == "command":
+                        self.commands.put_nowait(message[1:])
+                    elif message[0] == "throttle":
+                        self.feed.scheduler.pause(message[1])
+                except Exception as e:
+                    # Only "stop" or a lost supervisor ends the worker and its tenants
+                    print(f"An error occurred while handling a message in worker {self.index}: {e}")
+        finally:
+            heartbeats.cancel()
+            handler.cancel()
+            for tenant in self.tenants.values():
+                await tenant.job_runner.close()
+                await tenant.ad_compactor.stop()
+            await outbox.close()
+            for tenant in self.tenants.values():
+                await tenant.db.close()
+
+
+def run_worker(index, user_ids, inbox, events, processes):
+    """Entry point of a worker process."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(Worker(index, user_ids, inbox, events, processes).run())
+
+
+# Supervisor side
+
+class _Subscription:
+    """What the scanner needs of a runner in a worker: its config and a signer for its key."""
+
+    def __init__(self, config: BotConfig):
+        self.config = config
+        self.signer = RequestSigner(config.api_key, config.secret_key)
+
+
+class _WorkerHandle:
+    def __init__(self, index, user_ids):
+        self.index = index
+        self.user_ids = user_ids
+        self.process = None
+        self.inbox = None
+        self.pid = None
+        self.last_heartbeat = None
+        # user id -> config dict of the runners subscribed to scans
+        self.subscriptions = {}
+        # token -> Message sent for the worker, for later edits
+        self.messages = {}
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, message):
+        try:
+            self.inbox.send(message)
+        except (BrokenPipeError, OSError) as e:
+            print(f"Could not reach worker {self.index}: {e}")
+
+    def send_scan(self, scanned_at, pages):
+        # Exceptions from httpx don't always survive pickling; the message is all the worker prints
+        pages = {key: page if isinstance(page, dict) else RuntimeError(f"{type(page).__name__}: {page}") for key, page in pages.items()}
+        self.send(("scan", scanned_at, pages))
+
+
+class Supervisor:
+    """Runs the users' tenants in worker processes, sharded round-robin.
+
+    The bot process keeps Telegram and the shared market scanner. Tenant
+    commands are forwarded to the worker that owns the user, the pages of each
+    scan go to every worker once, and whatever the worker replies is sent with
+    the bot. Workers report their scan subscriptions, health and metrics in a
+    heartbeat; their metrics are merged into this process's registry. A worker
+    that exits is started again.
+    """
+
+    def __init__(self, user_ids, processes, scanner: MarketScanner):
+        self.scanner = scanner
+        self.context = multiprocessing.get_context("spawn")
+        processes = max(1, min(processes, len(user_ids)))
+        self.workers = [_WorkerHandle(index, user_ids[index::processes]) for index in range(processes)]
+        self.owners = {user_id: worker for worker in self.workers for user_id in worker.user_ids}
+        self.bot = None
+        self.closing = False
+        self.tasks = []
+        # Every process sends from the same IP, so a throttle seen by one holds back all
+        scanner.scheduler.on_throttle = self._throttled
+
+    async def start(self, bot):
+        self.bot = bot
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker: _WorkerHandle):
+        inbox_reader, inbox_writer = self.context.Pipe(duplex=False)
+        events_reader, events_writer = self.context.Pipe(duplex=False)
+        worker.process = self.context.Process(
+            target=run_worker,
+            args=(worker.index, worker.user_ids, inbox_reader, events_writer, len(self.workers)),
+            name=f"worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        # The worker's ends, so EOF shows up here once it is gone
+        inbox_reader.close()
+        events_writer.close()
+        worker.inbox = inbox_writer
+        worker.messages = {}
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        threading.Thread(target=_read, args=(events_reader, loop, events), name=f"worker-{worker.index}-events", daemon=True).start()
+        self.tasks.append(loop.create_task(self._handle_events(worker, events)))
+        print(f"Started worker {worker.index} (pid {worker.process.pid}) for {len(worker.user_ids)} users")
+
+    async def _handle_events(self, worker: _WorkerHandle, events):
+        # One at a time, so an edit never overtakes the send it refers to
+        while True:
+            message = await events.get()
+            if message is None:
+                await self._worker_exited(worker)
+                return
+            try:
+                if message[0] == "heartbeat":
+                    self._heartbeat(worker, message[1])
+                elif message[0] == "throttle":
+                    self.scanner.scheduler.pause(message[1])
+                    self._throttled(message[1], source=worker)
+                elif message[0] == "send":
+                    _, chat_id, token, text, kwargs = message
+                    worker.messages[token] = await self.bot.send_message(chat_id, text, **kwargs)
+                    if len(worker.messages) > MAX_TRACKED_MESSAGES:
+                        del worker.messages[next(iter(worker.messages))]
+                elif message[0] == "edit":
+                    _, token, text, kwargs = message
+                    sent = worker.messages.get(token)
+                    if sent is not None:
+                        await sent.edit_text(text, **kwargs)
+            except Exception as e:
+                print(f"An error occurred while handling a message from worker {worker.index}: {e}")
+
+    def _heartbeat(self, worker: _WorkerHandle, health):
+        worker.pid = health["pid"]
+        worker.last_heartbeat = time.monotonic()
+        REGISTRY.absorb(f"worker-{worker.index}", health["metrics"])
+
+        subscriptions = health["subscriptions"]
+        for user_id in worker.subscriptions.keys() - subscriptions.keys():
+            self.scanner.unsubscribe(user_id)
+        for user_id, config in subscriptions.items():
+            if worker.subscriptions.get(user_id) != config:
+                self.scanner.forward(user_id, _Subscription(BotConfig.from_dict(config)), worker.send_scan)
+        worker.subscriptions = subscriptions
+
+    def _throttled(self, seconds, source=None):
+        """Passes a 429/418 pause on to every worker but the one that reported it."""
+        for worker in self.workers:
+            if worker is not source and worker.alive:
+                worker.send(("throttle", seconds))
+
+    async def _worker_exited(self, worker: _WorkerHandle):
+        for user_id in worker.subscriptions:
+            self.scanner.unsubscribe(user_id)
+        worker.subscriptions = {}
+        await asyncio.get_running_loop().run_in_executor(None, worker.process.join, 5)
+        if self.closing:
+            return
+
+        print(f"Worker {worker.index} exited with code {worker.process.exitcode}, restarting it")
+        direct_notify_admin(
+            f"⚠️ Worker {worker.index} (users {', '.join(worker.user_ids)}) exited with code "
+            f"{worker.process.exitcode} and was restarted. Use /run to start its jobs again."
+        )
+        await asyncio.sleep(1)
+        if not self.closing:
+            self._spawn(worker)
+
+    async def forward(self, update: Update, context: ContextTypes.DEFAULT_TYPE, command):
+        """Runs `command` in the worker that owns the user who sent `update`."""
+        user = update.effective_user
+        worker = self.owners.get(str(user.id))
+        if worker is None or not worker.alive:
+            await update.message.reply_text("⚠️ Your bot is restarting. Please try again in a moment.")
+            return
+        worker.send(("command", command, (user.id, user.first_name, user.last_name, user.is_bot), update.effective_chat.id, list(context.args or [])))
+
+    def summary(self):
+        """One line per worker for the /metrics command."""
+        now = time.monotonic()
+        lines = []
+        for worker in self.workers:
+            heartbeat = f"{now - worker.last_heartbeat:.1f}s ago" if worker.last_heartbeat else "never"
+            lines.append(
+                f"worker {worker.index} (pid {worker.pid}): {'up' if worker.alive else 'down'}, "
+                f"{len(worker.user_ids)} users, {len(worker.subscriptions)} running, heartbeat {heartbeat}"
+            )
+        return lines
+
+    async def close(self):
+        """Stops every worker, letting it close its runners and databases first."""
+        self.closing = True
+        for worker in self.workers:
+            if worker.alive:
+                worker.send(("stop",))
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            await loop.run_in_executor(None, worker.process.join, 10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+@restricted
+async def forward_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles a tenant command in supervisor mode by passing it to the user's worker."""
+    command = update.message.text.split()[0][1:].split("@")[0]
+    if command in TENANT_COMMANDS:
+        await context.application.supervisor.forward(update, context, command)
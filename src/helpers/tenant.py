@@ -0,0 +1,28 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from src.apis.market_scanner import ScanFanout
+from src.db.ad_compactor import AdCompactor
+from src.db.async_db import AsyncDatabase
+from src.db.init import Database
+from src.helpers.bot_config import ConfigStore
+from src.helpers.job_runer import JobRunner
+
+
+class Tenant:
+    """What one allowed user runs on: their database, config, ad compactor and order runner.
+
+    Tenants share the market scanner, so a market watched by several users is
+    searched once per scan, while budgets, orders and ad history stay per user.
+    """
+
+    def __init__(self, user_id, scanner: ScanFanout):
+        self.user_id = user_id
+        self.db = AsyncDatabase(Database(f"db/{user_id}.db"))
+        self.config_store = ConfigStore(self.db)
+        self.ad_compactor = AdCompactor(self.db)
+        self.job_runner = JobRunner(scanner=scanner, name=user_id)
+
+
+def get_tenant(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tenant:
+    """The tenant of the user who sent `update`; `restricted` has already checked they are allowed."""
+    return context.application.tenants[str(update.effective_user.id)]
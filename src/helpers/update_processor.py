@@ -0,0 +1,40 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from setting import CONCURRENT_UPDATES
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Handles the updates of different users concurrently, and each user's in the order they came.
+
+    With PTB's default sequential processing one slow handler, such as a
+    /set_config waiting on the database, holds up every other user's /stop
+    and /status. Running all updates concurrently instead would let one
+    user's /set_config race their own /run.
+    """
+
+    def __init__(self, max_concurrent_updates=CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        # user id -> [lock, updates holding or waiting for it]
+        self.users = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        key = user.id if user else None
+        entry = self.users.get(key)
+        if entry is None:
+            entry = self.users[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.users[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
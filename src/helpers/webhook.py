@@ -0,0 +1,139 @@
+import asyncio
+import hmac
+import json
+import secrets
+import signal
+from urllib.parse import urlsplit
+from telegram import Update
+from telegram.ext import Application
+from setting import TELEGRAM_WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET
+
+# The only update types the handlers use; Telegram doesn't send the rest
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+# Largest update body accepted
+MAX_BODY_BYTES = 1 << 20
+
+
+class WebhookListener:
+    """Receives the updates Telegram posts to the webhook and queues them for the application.
+
+    Listens on `host`:`port` (the public `url` is expected to be forwarded
+    there by a reverse proxy or tunnel) and only accepts POSTs to the path of
+    `url` carrying `secret` in X-Telegram-Bot-Api-Secret-Token. An update is
+    answered as soon as it's queued, so Telegram never waits on a handler.
+    `start` registers the webhook with Telegram once the port is open.
+    """
+
+    def __init__(self, application: Application, url=TELEGRAM_WEBHOOK_URL, host=WEBHOOK_HOST, port=WEBHOOK_PORT, secret=WEBHOOK_SECRET):
+        self.application = application
+        self.url = url
+        self.path = urlsplit(url).path or "/"
+        self.host = host
+        self.port = port
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.server = None
+        self.connections = set()
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Listening for Telegram updates on http://{self.host}:{self.port}{self.path}")
+        await self.application.bot.set_webhook(url=self.url, allowed_updates=ALLOWED_UPDATES, secret_token=self.secret)
+
+    async def _handle(self, reader, writer):
+        # Telegram keeps connections open between updates
+        self.connections.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, "413 Payload Too Large", close=True)
+                    break
+                body = await reader.readexactly(length)
+                status = await self._receive(request_line, headers, body)
+                if status != "200 OK":
+                    self.rejected += 1
+                await self._respond(writer, status)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _receive(self, request_line, headers, body):
+        """Queues the update in one request. Returns the HTTP status to answer with."""
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2 or parts[1].split("?")[0] != self.path:
+            return "404 Not Found"
+        if parts[0] != "POST":
+            return "405 Method Not Allowed"
+        if not hmac.compare_digest(headers.get("x-telegram-bot-api-secret-token", ""), self.secret):
+            return "403 Forbidden"
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Ignoring a malformed update: {e}")
+            return "400 Bad Request"
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return "200 OK"
+
+    async def _respond(self, writer, status, close=False):
+        head = f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n"
+        if close:
+            head += "Connection: close\r\n"
+        writer.write((head + "\r\n").encode())
+        await writer.drain()
+
+    async def stop(self):
+        """Stops listening. The webhook stays registered, so Telegram holds updates until the next start."""
+        if self.server:
+            self.server.close()
+            for connection in list(self.connections):
+                connection.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    def stats(self):
+        return {"received": self.received, "rejected": self.rejected}
+
+
+def run_webhook(application: Application, listener: WebhookListener):
+    """Runs `application` on `listener` until SIGINT/SIGTERM, like `Application.run_polling` does with getUpdates.
+
+    `Application.run_webhook` would need the tornado extra; the listener only
+    needs asyncio.
+    """
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, loop.stop)
+    try:
+        loop.run_until_complete(application.initialize())
+        if application.post_init:
+            loop.run_until_complete(application.post_init(application))
+        loop.run_until_complete(application.start())
+        loop.run_until_complete(listener.start())
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(listener.stop())
+        if application.running:
+            loop.run_until_complete(application.stop())
+            if application.post_stop:
+                loop.run_until_complete(application.post_stop(application))
+        loop.run_until_complete(application.shutdown())
+        if application.post_shutdown:
+            loop.run_until_complete(application.post_shutdown(application))
+        loop.close()
@@ -0,0 +1,85 @@
+import random
+from src.db.ad_book import AdBook, AdFilter, match_extra_filter
+from src.db.ad_row import AdRow
+from src.db.init import Database
+
+
+def row(adv_no, price, max_amount=5000, market="USDT/INR/BUY", code=None):
+    return AdRow(adv_no, price, 100.0, 500.0, max_amount, market=market, apiResponseCode=code)
+
+
+def numbers(ads):
+    return [ad.advNo for ad in ads]
+
+
+def test_ads_come_back_cheapest_first_as_prices_change():
+    book = AdBook()
+    rng = random.Random(3)
+    for i in range(200):
+        book.upsert(row(str(i), round(rng.uniform(80, 90), 2)))
+    # Reprice some ads and drop others
+    for i in range(0, 200, 7):
+        book.upsert(row(str(i), round(rng.uniform(80, 90), 2)))
+    for i in range(0, 200, 11):
+        assert book.remove(str(i)).advNo == str(i)
+    assert book.remove("missing") is None
+
+    ads = book.filter({})
+    assert len(ads) == len(book) == 200 - len(range(0, 200, 11))
+    assert [(ad.price, ad.advNo) for ad in ads] == sorted((ad.price, ad.advNo) for ad in book.ads.values())
+
+
+def test_filter_applies_price_limit_codes_and_market():
+    book = AdBook()
+    for ad in (
+        row("cheap", 80),
+        row("at-limit", 85),
+        row("small", 81, max_amount=50),
+        row("failed", 82, code="83999"),
+        row("refused", 83, code="-2010"),
+        row("other-market", 80, market="BTC/INR/BUY"),
+    ):
+        book.upsert(ad)
+    extra_filter = {"price": 85, "minimum_limit": 100, "error_codes": ["83999"]}
+    # The price limit is strict, and only listed error codes are tried again
+    assert numbers(book.filter(extra_filter, market="USDT/INR/BUY")) == ["cheap", "failed"]
+    assert numbers(book.filter(extra_filter)) == ["cheap", "other-market", "failed"]
+    assert numbers(book.filter({"price": 85}, market="USDT/INR/BUY")) == ["cheap", "small", "failed", "refused"]
+
+
+def test_filter_and_match_extra_filter_agree():
+    book = AdBook()
+    rng = random.Random(5)
+    for i in range(300):
+        book.upsert(row(str(i), round(rng.uniform(80, 90), 2), rng.choice((50, 5000)), code=rng.choice((None, "83999", "-2010"))))
+    for extra_filter in ({}, {"price": 85}, {"minimum_limit": 100}, {"error_codes": "83999"}, {"price": 88, "minimum_limit": 100, "error_codes": ["83999"]}):
+        parsed = AdFilter.from_dict(extra_filter)
+        expected = sorted((ad.price, ad.advNo) for ad in book.ads.values() if match_extra_filter(ad, parsed))
+        assert [(ad.price, ad.advNo) for ad in book.filter(extra_filter)] == expected
+
+
+def test_responses_are_compared_as_text():
+    book = AdBook()
+    book.upsert(row("1", 80))
+    book.set_response("1", 83999, "failed")
+    assert numbers(book.filter({"error_codes": ["83999"]})) == ["1"]
+    assert numbers(book.filter({"error_codes": ["-2010"]})) == []
+
+
+def test_book_is_restored_from_sqlite_on_start(tmp_path):
+    path = str(tmp_path / "ads.db")
+    db = Database(path)
+    db.insert_ad([
+        {"adv": {"advNo": adv_no, "price": price, "surplusAmount": "10", "minSingleTransAmount": "500", "maxSingleTransAmount": "5000", "tradeType": "BUY"}}
+        for adv_no, price in (("1", "84"), ("2", "82"), ("3", "86"))
+    ], market="USDT/INR/BUY")
+    db.update_ads_response("2", "-2010", "refused")
+    extra_filter = {"price": 85, "error_codes": ["83999"]}
+    before = [(ad.advNo, ad.price, ad.market, ad.apiResponseCode) for ad in db.get_filtered_ads({})]
+    db.close()
+
+    db = Database(path)
+    assert [(ad.advNo, ad.price, ad.market, ad.apiResponseCode) for ad in db.get_filtered_ads({})] == before
+    assert before == [("2", 82.0, "USDT/INR/BUY", "-2010"), ("1", 84.0, "USDT/INR/BUY", None), ("3", 86.0, "USDT/INR/BUY", None)]
+    assert numbers(db.get_filtered_ads(extra_filter, market="USDT/INR/BUY")) == ["1"]
+    db.close()
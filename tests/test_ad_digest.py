@@ -0,0 +1,87 @@
+import asyncio
+from src.apis.market_scanner import ScanFanout
+from src.db.async_db import AsyncDatabase
+from src.db.init import Database
+from src.helpers.bot_config import BotConfig
+from src.helpers.job_runer import JobRunner
+
+
+def ad(adv_no, price=85, surplus=100):
+    return {"adv": {
+        "advNo": adv_no, "price": str(price), "surplusAmount": str(surplus), "tradeType": "BUY",
+        "minSingleTransAmount": "500", "maxSingleTransAmount": "5000",
+    }}
+
+
+def ads_writes(db, batch, market="USDT/INR/BUY"):
+    """The ads inserted by `insert_ad` and the SQL statements it ran on the ads table."""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        changed = db.insert_ad(batch, market=market)
+    finally:
+        db.conn.set_trace_callback(None)
+    return [row.advNo for row in changed], [statement for statement in statements if " ads" in statement]
+
+
+def test_unchanged_ads_are_not_written_again():
+    db = Database(":memory:")
+    assert ads_writes(db, [ad("1"), ad("2")])[0] == ["1", "2"]
+    assert ads_writes(db, [ad("1"), ad("2")]) == ([], [])
+    db.close()
+
+
+def test_only_changed_ads_are_written_and_lose_their_old_response():
+    db = Database(":memory:")
+    db.insert_ad([ad("1"), ad("2")], market="USDT/INR/BUY")
+    db.update_ads_response("2", "83999", "failed")
+
+    changed, statements = ads_writes(db, [ad("1"), ad("2", surplus=40)])
+    assert changed == ["2"]
+    assert len(statements) == 1
+    assert db.conn.execute("SELECT surplusAmount, apiResponseCode FROM ads WHERE advNo = '2'").fetchone() == (40.0, None)
+    assert db.ad_book.get("2").surplusAmount == 40.0
+    db.close()
+
+
+def test_the_same_ad_scanned_from_another_market_is_written():
+    db = Database(":memory:")
+    db.insert_ad([ad("1")], market="USDT/INR/BUY")
+    assert ads_writes(db, [ad("1")], market="USDT/INR/SELL")[0] == ["1"]
+    db.close()
+
+
+def test_digests_survive_a_restart(tmp_path):
+    path = str(tmp_path / "ads.db")
+    db = Database(path)
+    db.insert_ad([ad("1"), ad("2")], market="USDT/INR/BUY")
+    db.close()
+
+    db = Database(path)
+    assert ads_writes(db, [ad("1"), ad("2", price=84)])[0] == ["2"]
+    db.close()
+
+
+def test_a_repeated_scan_queues_nothing_for_the_order_job():
+    async def scenario():
+        fanout = ScanFanout()
+        runner = JobRunner(scanner=fanout)
+        runner.set_api_config(BotConfig.from_dict({"ROWS": 20}))
+        runner.scan_feed = fanout.subscribe(runner.name, runner.binance_api)
+        db = AsyncDatabase(Database(":memory:"))
+        fetch = asyncio.ensure_future(runner.fetch_ads(db, None, None))
+        pages = {("USDT", "INR", "BUY", 1, 20): {"code": "000000", "data": [ad("1"), ad("2")]}}
+        batches = []
+        for scanned_at in (1.0, 2.0, 3.0):
+            fanout.publish(scanned_at, pages)
+            await asyncio.sleep(0.05)
+            while not runner.ad_queue.empty():
+                detected_at, changed = runner.ad_queue.get_nowait()
+                batches.append((detected_at, [row.advNo for row in changed]))
+        fetch.cancel()
+        await asyncio.gather(fetch, return_exceptions=True)
+        await db.close()
+        await runner.binance_api.close()
+        return batches
+
+    assert asyncio.run(scenario()) == [(1.0, ["1", "2"])]
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from src.apis.binance_api_call import BinanceApiCall, PLACE_ORDER_ENDPOINT
+from src.apis.circuit_breaker import BinanceUnavailable, CircuitBreaker, RetryPolicy
+from src.db.ad_row import AdRow
+from src.helpers.bot_config import MarketSpec
+
+MARKET = MarketSpec("USDT", "INR", "BUY", None)
+
+
+class RecordingDigest:
+    def __init__(self):
+        self.skipped = []
+        self.failed = []
+
+    def record_skipped(self, market, adv, total_amount):
+        self.skipped.append(adv.advNo)
+
+    def record_failed(self, market, adv, code, message):
+        self.failed.append(adv.advNo)
+
+
+class Database:
+    async def update_ads_response(self, adv_no, response_code, response_message):
+        pass
+
+
+def test_ad_whose_reservation_fails_is_planned_again_after_a_failed_order():
+    api = BinanceApiCall(base_url=None)
+    api.budget.set_limits(10000, 5)
+    first, second = AdRow("1", 80.0, 50, 100, 100000), AdRow("2", 81.0, 50, 100, 100000)
+    placed = []
+    reservations = []
+
+    reserve = api.budget.reserve
+    def reserve_once_refused(amount, min_amount=0):
+        reservations.append(amount)
+        # Another job takes the budget the plan counted on for the first ad
+        return None if len(reservations) == 1 else reserve(amount, min_amount)
+    api.budget.reserve = reserve_once_refused
+
+    async def place(db, digest, market, adv, total_amount, detected_at=None):
+        placed.append(adv.advNo)
+        # The second ad's order fails, so the ads are planned again
+        return adv.advNo != "2"
+    api._place_planned_order = place
+
+    digest = RecordingDigest()
+    asyncio.run(api._create_market_orders(None, digest, MARKET, [first, second], presorted=True))
+    assert placed == ["2", "1"]
+    assert digest.skipped == []
+    assert api.budget.orders == 1
+
+
+def test_ad_whose_reservation_fails_is_reported_as_skipped():
+    api = BinanceApiCall(base_url=None)
+    api.budget.set_limits(10000, 5)
+    ad = AdRow("1", 80.0, 50, 100, 100000)
+    api.budget.reserve = lambda amount, min_amount=0: None
+
+    async def place(*args, **kwargs):
+        raise AssertionError("nothing was reserved")
+    api._place_planned_order = place
+
+    digest = RecordingDigest()
+    asyncio.run(api._create_market_orders(None, digest, MARKET, [ad]))
+    assert digest.skipped == ["1"]
+
+
+def test_orders_waiting_for_their_turn_are_called_off_once_the_breaker_opens():
+    async def scenario():
+        api = BinanceApiCall(base_url=None)
+        api.budget.set_limits(10 ** 6, 10)
+        api.breakers[PLACE_ORDER_ENDPOINT] = CircuitBreaker("placeOrder", failure_threshold=1, reset_timeout=60)
+        api.retry_policy = RetryPolicy(attempts=1)
+        api.dispatcher.set_limit(PLACE_ORDER_ENDPOINT, 0.5)
+        posted = []
+
+        async def post(endpoint, query_string, content):
+            posted.append(endpoint)
+            raise BinanceUnavailable(endpoint, 503)
+        api._post = post
+
+        ads = [AdRow(str(i), 80.0 + i, 50, 100, 100000) for i in range(5)]
+        started = time.monotonic()
+        await api._create_market_orders(Database(), RecordingDigest(), MARKET, ads, presorted=True)
+        elapsed = time.monotonic() - started
+        stats = api.dispatcher.stats()
+        await api.close()
+        return posted, elapsed, stats, api.budget
+
+    posted, elapsed, stats, budget = asyncio.run(scenario())
+    # Only the order that opened the breaker went out, and nobody waited for the next token
+    assert len(posted) == 1
+    assert elapsed < 0.4
+    assert stats["dispatched"] == 1
+    assert budget.reserved == 0 and budget.pending == 0
@@ -0,0 +1,24 @@
+from src.helpers.bot_config import BotConfig
+
+
+def keys(config):
+    return [market.key for market in config.markets]
+
+
+def test_markets_are_added_to_the_top_level_market():
+    config = BotConfig.from_dict({"ASSET": "USDT", "FIAT": "INR", "TRADE_TYPE": "BUY", "MARKETS": [{"ASSET": "BTC"}]})
+    assert keys(config) == ["USDT/INR/BUY", "BTC/INR/BUY"]
+
+
+def test_no_markets_means_only_the_top_level_market():
+    assert keys(BotConfig.from_dict({"MARKETS": []})) == ["USDT/INR/BUY"]
+
+
+def test_top_level_market_listed_again_is_scanned_once_with_its_own_filter():
+    config = BotConfig.from_dict({
+        "EXTRA_FILTER": {"price": 85},
+        "MARKETS": [{"ASSET": "USDT", "FIAT": "INR", "TRADE_TYPE": "BUY", "EXTRA_FILTER": {"price": 90}}, {"ASSET": "BTC"}],
+    })
+    assert keys(config) == ["USDT/INR/BUY", "BTC/INR/BUY"]
+    assert config.markets[0].extra_filter.price == 90
+    assert config.markets[1].extra_filter.price == 85
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from src.apis.budget_ledger import BudgetLedger
+
+
+def test_concurrent_orders_never_reserve_more_than_the_limits():
+    async def scenario():
+        ledger = BudgetLedger(total_amount=1000, max_orders=3)
+        high_water = []
+
+        async def order(amount, fills):
+            reservation = ledger.reserve(amount, min_amount=50)
+            if reservation is None:
+                return None
+            high_water.append(ledger.reserved + ledger.spent)
+            await asyncio.sleep(0.01)
+            if fills:
+                ledger.commit(reservation)
+            else:
+                ledger.release(reservation)
+            return reservation.amount
+
+        results = await asyncio.gather(*(order(400, fills=i != 1) for i in range(5)))
+        return ledger, results, high_water
+
+    ledger, results, high_water = asyncio.run(scenario())
+    # The third order only got what was left, the rest found no order slot
+    assert results == [400, 400, 200, None, None]
+    assert max(high_water) <= 1000
+    assert ledger.spent == 600
+    assert ledger.orders == 2
+    assert ledger.reserved == 0 and ledger.pending == 0
+    assert ledger.available == 400 and ledger.orders_available == 1
+
+
+def test_released_budget_can_be_reserved_again():
+    ledger = BudgetLedger(total_amount=500, max_orders=1)
+    first = ledger.reserve(500)
+    assert ledger.reserve(100) is None
+    ledger.release(first)
+    second = ledger.reserve(100)
+    assert second.amount == 100
+    ledger.commit(second)
+    assert ledger.exhausted and ledger.spent == 100
+
+
+def test_leftover_at_or_below_the_minimum_is_not_reserved():
+    ledger = BudgetLedger(total_amount=100, max_orders=5)
+    assert ledger.reserve(150, min_amount=100) is None
+    assert ledger.reserve(150, min_amount=99).amount == 100
+
+
+def test_a_reservation_settles_once():
+    ledger = BudgetLedger(total_amount=100, max_orders=5)
+    reservation = ledger.reserve(50)
+    ledger.commit(reservation)
+    with pytest.raises(ValueError):
+        ledger.release(reservation)
+    with pytest.raises(ValueError):
+        ledger.commit(reservation)
+    assert ledger.spent == 50 and ledger.orders == 1
@@ -0,0 +1,119 @@
+import httpx
+import pytest
+from src.apis import circuit_breaker
+from src.apis.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, FATAL, RETRY, UNKNOWN,
+    BinanceUnavailable, CircuitBreaker, RetryPolicy, classify,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def longest_jitter(monkeypatch):
+    # Jitter always picks the top of its range
+    monkeypatch.setattr(circuit_breaker.random, "uniform", lambda low, high: high)
+
+
+def test_breaker_opens_after_failures_in_a_row(longest_jitter):
+    clock = Clock()
+    changes = []
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10, on_change=lambda b, old, new, error: changes.append((old, new)), clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.blocked
+    assert breaker.retry_in == 10
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    assert changes == [(CLOSED, OPEN)]
+
+
+def test_half_open_lets_one_probe_through_and_its_success_closes(longest_jitter):
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow() and breaker.allow()
+
+
+def test_abandoned_probe_lets_the_next_call_probe():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+def test_failed_probes_double_the_pause_up_to_the_cap(longest_jitter):
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, max_reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    pauses = [breaker.retry_in]
+    for _ in range(3):
+        clock.now = breaker.open_until
+        assert breaker.allow()
+        breaker.record_failure()
+        pauses.append(breaker.retry_in)
+    assert pauses == [10, 20, 30, 30]
+    # Closing resets the backoff
+    clock.now = breaker.open_until
+    breaker.allow()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.retry_in == 10
+
+
+def test_pause_is_jittered_between_half_and_all_of_the_timeout():
+    clock = Clock()
+    for _ in range(50):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        assert 5 <= breaker.retry_in <= 10
+
+
+def test_retry_policy_backs_off_exponentially_up_to_the_cap(longest_jitter):
+    policy = RetryPolicy(attempts=4, base_delay=0.5, max_delay=3)
+    assert [policy.delay(attempt) for attempt in range(5)] == [0.5, 1, 2, 3, 3]
+
+
+def test_retry_policy_only_repeats_unknown_outcomes_when_idempotent():
+    policy = RetryPolicy(attempts=3)
+    assert policy.should_retry(0, RETRY, idempotent=False)
+    assert policy.should_retry(1, UNKNOWN, idempotent=True)
+    assert not policy.should_retry(0, UNKNOWN, idempotent=False)
+    assert not policy.should_retry(0, FATAL, idempotent=True)
+    # The third attempt is the last
+    assert not policy.should_retry(2, RETRY, idempotent=True)
+    assert not RetryPolicy(attempts=0).should_retry(0, RETRY, idempotent=True)
+
+
+@pytest.mark.parametrize("error, kind", [
+    (httpx.ConnectError("refused"), RETRY),
+    (httpx.ConnectTimeout("slow"), RETRY),
+    (httpx.PoolTimeout("busy"), RETRY),
+    (BinanceUnavailable("/search", 200, "-1001"), RETRY),
+    (BinanceUnavailable("/search", 200, "-1008"), RETRY),
+    (BinanceUnavailable("/search", 200, "-1007"), UNKNOWN),
+    (BinanceUnavailable("/search", 503), UNKNOWN),
+    (httpx.ReadTimeout("slow"), UNKNOWN),
+    (httpx.RemoteProtocolError("dropped"), UNKNOWN),
+    (ValueError("bad json"), FATAL),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
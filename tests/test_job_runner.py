@@ -0,0 +1,23 @@
+import asyncio
+from src.db.ad_row import AdRow
+from src.helpers.job_runer import JobRunner
+
+
+def test_queued_scans_are_merged_keeping_each_ads_latest_version():
+    async def scenario():
+        runner = JobRunner()
+        calls = []
+
+        async def create_orders_jobs(db, digest, callback=None, new_ads=None, detected_at=None):
+            calls.append((detected_at, [(ad.advNo, ad.price, ad.surplusAmount) for ad in new_ads]))
+            runner.stop_threads = True
+
+        runner.binance_api.create_orders_jobs = create_orders_jobs
+        runner.ad_queue.put_nowait((1.0, [AdRow("X", 80.0, 50.0, 100, 5000), AdRow("Y", 81.0, 10.0, 100, 5000)]))
+        runner.ad_queue.put_nowait((2.0, [AdRow("X", 80.0, 40.0, 100, 5000)]))
+        await runner.process_ads(None, None, None)
+        await runner.binance_api.close()
+        return calls
+
+    # The earliest detection time is kept for latency metrics
+    assert asyncio.run(scenario()) == [(1.0, [("X", 80.0, 40.0), ("Y", 81.0, 10.0)])]
@@ -0,0 +1,93 @@
+import asyncio
+import httpx
+from src.apis.market_scanner import MarketScanner, ScanFanout
+from src.apis.request_signer import RequestSigner
+from src.helpers.bot_config import BotConfig
+
+
+class Runner:
+    def __init__(self, config):
+        self.config = config
+
+
+def page(adv_no):
+    return {"code": "000000", "data": [{"adv": {"advNo": adv_no}}]}
+
+
+def test_markets_the_scan_did_not_cover_are_left_out():
+    fanout = ScanFanout()
+    # PAGES went from 1 to 2 after the scan was planned, and BTC was added
+    queue = fanout.subscribe("1", Runner(BotConfig.from_dict({"PAGES": 2, "ROWS": 20, "MARKETS": [{"ASSET": "BTC"}]})))
+    fanout.publish(5.0, {("USDT", "INR", "BUY", 1, 20): page("1")})
+    assert queue.empty()
+
+    fanout.publish(6.0, {("USDT", "INR", "BUY", 1, 20): page("1"), ("USDT", "INR", "BUY", 2, 20): page("2")})
+    scanned_at, results = queue.get_nowait()
+    assert scanned_at == 6.0
+    assert [(market.key, [ad["adv"]["advNo"] for ad in result["data"]]) for market, result in results] == [("USDT/INR/BUY", ["1", "2"])]
+
+
+def test_one_failing_subscriber_does_not_stop_the_others():
+    fanout = ScanFanout()
+    sent = []
+
+    def broken(scanned_at, pages):
+        raise BrokenPipeError("worker gone")
+
+    fanout.forward("1", Runner(BotConfig.from_dict({})), broken)
+    queue = fanout.subscribe("2", Runner(BotConfig.from_dict({"ROWS": 20})))
+    fanout.forward("3", Runner(BotConfig.from_dict({"ROWS": 20, "PAGES": 2})), lambda scanned_at, pages: sent.append(pages))
+    pages = {("USDT", "INR", "BUY", 1, 20): page("1")}
+    fanout.publish(5.0, pages)
+    assert not queue.empty()
+    # Forwarded pages are the scanned ones this subscriber needs
+    assert sent == [pages]
+
+
+class Account:
+    """A runner with a signer, as a tenant's BinanceApiCall or a worker's subscription has."""
+
+    def __init__(self, api_key, secret_key="secret", **config):
+        self.config = BotConfig.from_dict({"API_KEY": api_key, "SECRET_KEY": secret_key, "ROWS": 20, **config})
+        self.signer = RequestSigner(api_key, secret_key)
+
+
+def scanner_with_keys(accounts):
+    keys = []
+
+    def answer(request):
+        key = request.headers["X-MBX-APIKEY"]
+        keys.append(key)
+        if key.startswith("bad"):
+            return httpx.Response(401, json={"code": -2015, "msg": "Invalid API-key, IP, or permissions for action."})
+        return httpx.Response(200, json={"code": "000000", "data": [{"adv": {"advNo": "1", "price": "85", "surplusAmount": "1"}}]})
+
+    scanner = MarketScanner("http://binance.local", client=httpx.AsyncClient(transport=httpx.MockTransport(answer)))
+    queues = [ScanFanout.subscribe(scanner, str(index), account) for index, account in enumerate(accounts)]
+    return scanner, queues, keys
+
+
+def test_searches_are_signed_with_a_key_binance_accepts():
+    async def scenario():
+        scanner, queues, keys = scanner_with_keys([Account(""), Account("bad-key"), Account("good-key")])
+        await scanner.scan()
+        await scanner.scan()
+        results = [queue.get_nowait()[1][0][1] for queue in queues]
+        await scanner.close()
+        return keys, results
+
+    keys, results = asyncio.run(scenario())
+    # The account without keys is never used, and the refused one is not tried again
+    assert keys == ["bad-key", "good-key", "good-key"]
+    assert all(result["code"] == "000000" for result in results)
+
+
+def test_accounts_take_turns_signing_the_searches():
+    async def scenario():
+        scanner, _, keys = scanner_with_keys([Account("first"), Account("second"), Account("first")])
+        for _ in range(4):
+            await scanner.scan()
+        await scanner.close()
+        return keys
+
+    assert asyncio.run(scenario()) == ["first", "second", "first", "second"]
@@ -0,0 +1,20 @@
+from src.helpers.metrics import MetricsRegistry
+
+
+def test_samples_are_rendered_without_rounding():
+    registry = MetricsRegistry()
+    orders = registry.counter("orders_total", "Orders.")
+    orders.inc(1234567, outcome="filled")
+    spent = registry.counter("spent_total", "Spent.")
+    spent.inc(1234567.891)
+    latency = registry.histogram("latency_seconds", "Latency.")
+    latency.observe(0.1234567)
+
+    text = registry.render()
+    assert 'orders_total{outcome="filled"} 1234567\n' in text
+    assert "spent_total 1234567.891\n" in text
+    assert 'latency_seconds_bucket{le="0.25"} 1\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1\n' in text
+    assert "latency_seconds_sum 0.1234567\n" in text
+    assert "latency_seconds_count 1\n" in text
+    assert 'orders_total{outcome="filled"}: 1234567' in registry.summary()
@@ -0,0 +1,55 @@
+import random
+from src.apis.order_allocator import order_amount, plan_orders
+from src.db.ad_row import AdRow
+
+
+def make_ads(count, seed):
+    rng = random.Random(seed)
+    return [
+        AdRow(
+            advNo=str(i),
+            price=round(rng.uniform(80, 95), 2),
+            surplusAmount=round(rng.uniform(1, 500), 2),
+            minSingleTransAmount=rng.choice((500, 1000, 2000)),
+            maxSingleTransAmount=rng.choice((5000, 20000, 100000)),
+        )
+        for i in range(count)
+    ]
+
+
+def old_loop(ads, budget, max_orders):
+    """The per-ad loop `_create_market_orders` ran before `plan_orders`."""
+    remaining = budget
+    orders = []
+    skipped = []
+    for adv in sorted(ads, key=lambda ad: ad.price):
+        if len(orders) >= max_orders or remaining <= 0:
+            break
+        total_amount = order_amount(adv.price, adv.maxSingleTransAmount, adv.minSingleTransAmount, adv.surplusAmount)
+        if total_amount > remaining:
+            if remaining > adv.minSingleTransAmount:
+                total_amount = remaining
+            else:
+                skipped.append(adv)
+                continue
+        orders.append((adv, total_amount))
+        remaining -= total_amount
+    return orders, skipped
+
+
+def test_plan_matches_the_old_loop():
+    for seed in range(20):
+        ads = make_ads(300, seed)
+        for budget, max_orders in ((0, 5), (900, 10), (50000, 10), (10 ** 6, 50), (10 ** 9, 1000)):
+            expected = old_loop(ads, budget, max_orders)
+            assert plan_orders(ads, budget, max_orders) == expected
+            assert plan_orders(sorted(ads, key=lambda ad: ad.price), budget, max_orders, presorted=True) == expected
+
+
+def test_ad_that_does_not_fit_is_skipped_and_one_above_its_minimum_takes_the_rest():
+    cheap = AdRow("1", 80.0, 100, 1000, 100000)   # 8000 in full
+    middle = AdRow("2", 81.0, 100, 3000, 100000)  # 8100 in full, minimum above what is left
+    last = AdRow("3", 82.0, 100, 1000, 100000)    # 8200 in full, minimum below what is left
+    orders, skipped = plan_orders([last, middle, cheap], 10000, 5)
+    assert orders == [(cheap, 8000.0), (last, 2000.0)]
+    assert skipped == [middle]
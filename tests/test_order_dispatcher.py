@@ -0,0 +1,47 @@
+import asyncio
+from src.apis.order_dispatcher import OrderDispatcher
+
+
+def test_call_cancelled_while_waiting_for_its_token_is_not_sent():
+    async def scenario():
+        dispatcher = OrderDispatcher()
+        dispatcher.set_limit("/order", 0.2)
+        sent = []
+
+        def request(name):
+            async def call():
+                sent.append(name)
+                return name
+            return call
+
+        assert await dispatcher.submit("/order", request("first")) == "first"
+        # The bucket is empty now, so the second call waits about 0.2s for its token
+        waiting = asyncio.ensure_future(dispatcher.submit("/order", request("second")))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.sleep(0.3)
+        await dispatcher.close()
+        return sent, dispatcher.stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert sent == ["first"]
+    assert stats["dispatched"] == 1
+
+
+def test_calls_are_spaced_by_the_endpoint_limit():
+    async def scenario():
+        dispatcher = OrderDispatcher()
+        dispatcher.set_limit("/order", 0.1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def call():
+            return loop.time() - started
+
+        times = await asyncio.gather(*[dispatcher.submit("/order", call) for _ in range(3)])
+        await dispatcher.close()
+        return times
+
+    times = asyncio.run(scenario())
+    assert times[0] < 0.05
+    assert times[2] - times[0] >= 0.18
@@ -0,0 +1,29 @@
+from src.apis.poll_scheduler import PollScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_throttle_is_shared_through_on_throttle_and_pause():
+    clock = Clock()
+    seen, peer = PollScheduler(base=1, clock=clock), PollScheduler(base=1, clock=clock)
+    seen.on_throttle = peer.pause
+    seen.observe_response(429, {"retry-after": "30"})
+    assert seen.stats()["throttled_for"] == 30
+    assert peer.stats()["throttled_for"] == 30
+    # Forwarded pauses are not echoed back
+    peer.on_throttle = seen.pause
+    peer.pause(5)
+    assert seen.stats()["throttled_for"] == 30
+
+
+def test_weight_headers_slow_the_interval_down():
+    scheduler = PollScheduler(base=1, min_interval=0.5, max_interval=10, weight_limit=100, clock=Clock())
+    assert scheduler.interval == 1
+    scheduler.observe_response(200, {"x-mbx-used-weight-1m": "100"})
+    assert scheduler.interval == 10
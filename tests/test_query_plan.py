@@ -0,0 +1,30 @@
+import hashlib
+from src.db.init import Database
+from src.db.query_plan import HOT_WRITES, check_query_plans, open_copy, traced_statements
+
+
+def test_hot_ads_writes_use_the_primary_key():
+    db = open_copy(":memory:")
+    try:
+        for _, write in HOT_WRITES:
+            assert traced_statements(db, write, "1")
+        assert check_query_plans(db) == []
+    finally:
+        db.close()
+
+
+def test_checking_a_database_leaves_the_file_as_it_was(tmp_path):
+    path = str(tmp_path / "ads.db")
+    db = Database(path)
+    db.insert_ad([{"adv": {"advNo": "7", "price": "85", "tradeType": "BUY"}}], "USDT/INR/BUY")
+    db.close()
+    before = hashlib.sha256(open(path, "rb").read()).hexdigest()
+
+    copy = open_copy(path)
+    try:
+        copy.conn.execute("ANALYZE")
+        assert check_query_plans(copy) == []
+        assert copy.conn.execute("SELECT advNo FROM ads").fetchall() == [("7",)]
+    finally:
+        copy.close()
+    assert hashlib.sha256(open(path, "rb").read()).hexdigest() == before